@@ -1,25 +1,79 @@
 import os
+import time
 import logging
-from flask import Flask, request, send_file, render_template, jsonify
-from processors.video_processor import VideoProcessor
+from flask import Flask, request, render_template
 import config
-from utils import clean_directory, save_uploaded_file, validate_clips
+from jobs import JobQueue, QueueFullError, claim_segment_cache_warm, segment_cache_warm, warm_segment_cache
+from models import db
+from montage_index import MontageIndex
+from utils import save_uploaded_file, validate_clips
+from uploads import InvalidUploadError, StreamingUploadRequest
+from workspace import Workspace, QuotaExceededError, check_quota, maybe_collect_garbage
 from routes.share import share_bp
+from routes.jobs import jobs_bp
+from routes.uploads import uploads_bp, enqueue_montage, enqueue_preview
+from routes.previews import previews_bp
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = StreamingUploadRequest
 app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = config.MAX_CONTENT_LENGTH
+app.config['USE_X_SENDFILE'] = config.USE_X_SENDFILE
+app.config['SQLALCHEMY_DATABASE_URI'] = config.DATABASE_URL
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_recycle': 300,
+    'pool_pre_ping': True
+}
+
+# Initialize montage metadata index
+db.init_app(app)
+with app.app_context():
+    db.create_all()
+montage_index = MontageIndex(
+    app,
+    max_entries=config.MONTAGE_INDEX_CACHE_ENTRIES,
+    ttl=config.MONTAGE_INDEX_CACHE_TTL
+)
+app.extensions['montage_index'] = montage_index
 
 # Register blueprints
 app.register_blueprint(share_bp, url_prefix='/api/share')
-
-# Initialize video processor
-video_processor = VideoProcessor(config.__dict__)
+app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+app.register_blueprint(uploads_bp, url_prefix='/api/uploads')
+app.register_blueprint(previews_bp, url_prefix='/api/previews')
+
+# Initialize render job queue. Its records live in this process, so a
+# second app process would answer 404 for jobs and previews of the first
+# and start a render pool of its own
+if config.WEB_CONCURRENCY != 1:
+    raise RuntimeError(
+        f"WEB_CONCURRENCY is {config.WEB_CONCURRENCY}, but job state is kept in a single app process; "
+        "run one process and scale requests with threads"
+    )
+job_queue = JobQueue(
+    config.RENDER_WORKERS,
+    max_pending=config.RENDER_QUEUE_LIMIT,
+    result_ttl=config.JOB_RESULT_TTL
+)
+job_queue.add_listener(montage_index.on_job_update)
+app.extensions['job_queue'] = job_queue
+
+# Pre-render intro and outro for every art pack in the background, unless
+# an earlier start already did for the same assets and settings, or another
+# process, such as the reloader's parent, already queued it
+if (config.PRERENDER_WARM_ON_STARTUP and config.SEGMENT_CACHE_FOLDER
+        and os.path.exists(config.INTRO_FILE) and os.path.exists(config.OUTRO_FILE)
+        and not segment_cache_warm(config.INTRO_FILE, config.OUTRO_FILE)
+        and claim_segment_cache_warm()):
+    job_queue.submit(warm_segment_cache, {
+        'intro_file': config.INTRO_FILE,
+        'outro_file': config.OUTRO_FILE
+    })
 
 @app.route('/')
 def index():
@@ -28,79 +82,92 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload_files():
-    """Handle file uploads and create video montage."""
+    """Handle file uploads and enqueue a montage render job."""
+    workspace = None
     try:
+        # Generate unique montage ID
+        import uuid
+        montage_id = str(uuid.uuid4())
+
+        # Reserve an isolated workspace and stream uploads straight into it
+        maybe_collect_garbage(job_queue.pending_montages())
+        montage_index.maybe_collect_expired(config.MONTAGE_TTL)
+        check_quota(request.content_length or 0)
+        workspace = Workspace(montage_id).create()
+        request.upload_directory = workspace.incoming_dir
+        # Parts are received, validated and saved from the first access to request.files
+        save_start = time.perf_counter()
+
         # Validate clip uploads
         if 'clips[]' not in request.files:
             logger.error("No clips uploaded")
+            workspace.cleanup()
             return 'No clips uploaded', 400
 
         if 'music' not in request.files:
             logger.error("No music file uploaded")
+            workspace.cleanup()
             return 'No music file uploaded', 400
 
         # Validate art pack selection
         art_pack = request.form.get('art_pack')
         if not art_pack or art_pack not in config.ART_PACKS:
             logger.error("Invalid art pack selected")
+            workspace.cleanup()
             return 'Please select a valid Art Pack', 400
 
         # Get export quality setting
-        export_quality = request.form.get('export_quality', 'high')
-        if export_quality not in ['high', 'medium', 'low']:
-            export_quality = 'high'
+        export_quality = request.form.get('export_quality', config.DEFAULT_EXPORT_QUALITY)
+        if export_quality not in config.EXPORT_PRESETS:
+            export_quality = config.DEFAULT_EXPORT_QUALITY
+        renditions = [q for q in request.form.getlist('renditions[]') if q in config.EXPORT_PRESETS]
 
         clips = request.files.getlist('clips[]')
         if not validate_clips(clips):
             logger.error("Invalid clips provided")
+            workspace.cleanup()
             return 'Please upload between 3 and 6 valid video clips', 400
 
-        # Clean directories
-        for folder in [config.CLIPS_FOLDER, config.ASSETS_FOLDER]:
-            clean_directory(folder)
-
         # Save clips
         clip_paths = []
-        for clip in clips:
+        for index, clip in enumerate(clips):
             if clip:
-                path = save_uploaded_file(clip, config.CLIPS_FOLDER)
+                path = save_uploaded_file(clip, workspace.clips_dir, f'{index:02d}_{clip.filename}')
                 clip_paths.append(path)
 
         # Save music file
         music = request.files['music']
-        music_path = save_uploaded_file(music, config.ASSETS_FOLDER, 'background.mp3')
+        music_path = save_uploaded_file(music, workspace.assets_dir, 'background.mp3')
+        upload_seconds = time.perf_counter() - save_start
 
-        # Generate unique montage ID
-        import uuid
-        montage_id = str(uuid.uuid4())
-        output_path = f'output_montage_{montage_id}.mp4'
-
-        # Create montage with selected art pack and quality
-        duration = video_processor.create_montage(
-            config.CLIPS_FOLDER,
-            'assets/intro.mp4',
-            'assets/outro.mp4',
-            music_path,
-            output_path,
-            art_pack,
-            export_quality
+        logger.debug(f"Workspace {workspace.path} holds {workspace.usage()} bytes")
+
+        # Queue a quick preview, keeping the workspace until the full render is committed
+        if request.form.get('preview') == '1':
+            return enqueue_preview(montage_id, art_pack)
+
+        # Queue montage render with selected art pack and quality
+        return enqueue_montage(
+            montage_id, clip_paths, music_path, art_pack, export_quality, renditions, upload_seconds
         )
 
-        logger.info(f"Montage created successfully, duration: {duration}s")
+    except QueueFullError as e:
+        logger.warning(str(e))
+        workspace.cleanup()
+        return str(e), 503
 
-        # Generate share link
-        share_url = request.host_url.rstrip('/') + f'/api/share/montage/{montage_id}'
+    except QuotaExceededError as e:
+        logger.warning(str(e))
+        return 'Server storage is full, please try again later', 507
 
-        return jsonify({
-            'success': True,
-            'montage_id': montage_id,
-            'share_url': share_url,
-            'duration': duration,
-            'download_url': f'/api/share/export/{montage_id}'
-        })
+    except InvalidUploadError as e:
+        workspace.cleanup()
+        return str(e), 415
 
     except Exception as e:
         logger.error(f"Error processing upload: {str(e)}")
+        if workspace is not None:
+            workspace.cleanup()
         return str(e), 500
 
 if __name__ == '__main__':
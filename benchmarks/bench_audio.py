@@ -0,0 +1,179 @@
+"""Accuracy and speed of beat analysis on synthetic click tracks.
+
+Usage: python -m benchmarks.bench_audio [--duration 60] [--speed-duration 300]
+
+Click tracks are generated at known tempos with noise and a sustained bass
+tone; the "busy" scenario adds quieter off-beat hi-hats and more noise. The
+current AudioProcessor is compared against the original RMS-loop envelope
+with find_peaks picking, which is reproduced here as the baseline.
+"""
+import argparse
+import math
+import time
+import numpy as np
+from scipy import signal
+from typing import Dict, Tuple
+from processors.audio_processor import AudioProcessor, OnsetAccumulator, ANALYSIS_SAMPLE_RATE
+
+SAMPLE_RATE = 44100
+TEMPOS = (80.0, 100.0, 120.0, 128.0, 140.0, 174.0)
+TOLERANCE = 0.07  # Seconds a detected beat may be off and still count
+SCENARIOS = {
+    'clean': {'noise': 0.05, 'hats': 0.0},
+    'busy': {'noise': 0.15, 'hats': 0.6}
+}
+
+
+def click_track(
+    bpm: float,
+    duration: float,
+    sample_rate: int = SAMPLE_RATE,
+    noise: float = 0.05,
+    offset: float = 0.25,
+    hats: float = 0.0,
+    seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (audio, beat_times) for a click track with noise and a bass drone.
+
+    hats is the amplitude of off-beat hi-hat clicks relative to the beats.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    audio = 0.3 * np.sin(2 * np.pi * 55.0 * t)
+    audio += noise * rng.standard_normal(len(t))
+
+    beat_times = np.arange(offset, duration, 60.0 / bpm)
+    click_t = np.arange(int(0.03 * sample_rate)) / sample_rate
+    click = np.sin(2 * np.pi * 1500.0 * click_t) * np.exp(-click_t * 150.0)
+    for beat in beat_times:
+        start = int(beat * sample_rate)
+        end = min(len(audio), start + len(click))
+        audio[start:end] += click[:end - start]
+
+    if hats:
+        hat = hats * np.sin(2 * np.pi * 6000.0 * click_t) * np.exp(-click_t * 300.0)
+        for beat in beat_times + 30.0 / bpm:
+            start = int(beat * sample_rate)
+            end = min(len(audio), start + len(hat))
+            if start < end:
+                audio[start:end] += hat[:end - start]
+
+    return (audio / np.abs(audio).max()).astype(np.float32), beat_times
+
+
+def legacy_analyze(audio: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, float]:
+    """The original per-window RMS loop with find_peaks picking."""
+    window_size = int(0.05 * sample_rate)
+    hop_length = window_size // 2
+    onset_env = []
+    for i in range(0, len(audio) - window_size, hop_length):
+        window = audio[i:i + window_size]
+        onset_env.append(np.sqrt(np.mean(window ** 2)))
+    onset_env = np.array(onset_env)
+    if onset_env.max() > 0:
+        onset_env /= onset_env.max()
+
+    min_samples_between_beats = int(60 / 180 * sample_rate / len(onset_env) * 2)
+    peaks = signal.find_peaks(onset_env, distance=max(1, min_samples_between_beats), prominence=0.1)[0]
+    beat_times = peaks * (len(audio) / len(onset_env)) / sample_rate
+    tempo = 60 / np.median(np.diff(beat_times)) if len(beat_times) > 1 else 0.0
+    return beat_times, tempo
+
+
+def resample(audio: np.ndarray, sample_rate: int, target_rate: int) -> np.ndarray:
+    """Resample a synthetic track to the analysis rate.
+
+    The app has FFmpeg decode straight to the analysis rate; this stands in
+    for it on in-memory signals. Integer ratios average each group of
+    samples, other ratios use a polyphase filter.
+    """
+    if sample_rate == target_rate:
+        return audio
+    if sample_rate % target_rate == 0:
+        factor = sample_rate // target_rate
+        groups = audio[:len(audio) // factor * factor].reshape(-1, factor)
+        return groups.mean(axis=1, dtype=np.float32)
+    g = math.gcd(int(sample_rate), int(target_rate))
+    return signal.resample_poly(audio, target_rate // g, int(sample_rate) // g).astype(np.float32)
+
+
+def current_analyze(audio: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, float]:
+    """The current AudioProcessor pipeline on an in-memory signal."""
+    audio = resample(audio, sample_rate, ANALYSIS_SAMPLE_RATE)
+    accumulator = OnsetAccumulator(ANALYSIS_SAMPLE_RATE)
+    accumulator.push(audio)
+    processor = AudioProcessor()
+    beat_times = processor.analyze_envelope(
+        accumulator.finish(), ANALYSIS_SAMPLE_RATE, len(audio) / ANALYSIS_SAMPLE_RATE
+    )
+    return beat_times, processor.tempo
+
+
+def f_measure(detected: np.ndarray, reference: np.ndarray, tolerance: float = TOLERANCE) -> float:
+    """Beat F-measure with one-to-one matching inside the tolerance window."""
+    if len(detected) == 0 or len(reference) == 0:
+        return 0.0
+    used = np.zeros(len(detected), dtype=bool)
+    hits = 0
+    for beat in reference:
+        distance = np.abs(detected - beat)
+        distance[used] = np.inf
+        best = int(np.argmin(distance))
+        if distance[best] <= tolerance:
+            used[best] = True
+            hits += 1
+    precision = hits / len(detected)
+    recall = hits / len(reference)
+    return 2 * precision * recall / (precision + recall) if hits else 0.0
+
+
+def accuracy(duration: float, scenario: str = 'clean') -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Tempo error and beat F-measure per tempo for both implementations."""
+    results = {}
+    for bpm in TEMPOS:
+        audio, reference = click_track(bpm, duration, **SCENARIOS[scenario])
+        results[f'{bpm:g}'] = {}
+        for name, analyze in (('legacy', legacy_analyze), ('current', current_analyze)):
+            beats, tempo = analyze(audio, SAMPLE_RATE)
+            results[f'{bpm:g}'][name] = {
+                'tempo': float(tempo),
+                'tempo_error_pct': abs(tempo - bpm) / bpm * 100,
+                'f_measure': f_measure(beats, reference)
+            }
+    return results
+
+
+def speed(duration: float, repeat: int = 3) -> Dict[str, float]:
+    """Seconds to analyze a track of the given length, best of repeat runs."""
+    audio, _ = click_track(120.0, duration)
+    results = {}
+    for name, analyze in (('legacy', legacy_analyze), ('current', current_analyze)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            analyze(audio, SAMPLE_RATE)
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--speed-duration', type=float, default=300.0)
+    args = parser.parse_args()
+
+    for scenario in SCENARIOS:
+        print(f"{scenario}:")
+        print(f"{'bpm':>6}{'legacy tempo':>14}{'legacy F':>10}{'current tempo':>15}{'current F':>11}")
+        for bpm, r in accuracy(args.duration, scenario).items():
+            print(f"{bpm:>6}{r['legacy']['tempo']:>14.2f}{r['legacy']['f_measure']:>10.3f}"
+                  f"{r['current']['tempo']:>15.2f}{r['current']['f_measure']:>11.3f}")
+
+    timings = speed(args.speed_duration)
+    print(f"\n{args.speed_duration:g}s track: legacy {timings['legacy']:.3f}s, "
+          f"current {timings['current']:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compare the compiled filter engine against the per-frame reference filters.
+
+Usage: python -m benchmarks.bench_filters [--width 1920] [--height 1080] [--frames 200]
+
+Every filter in config.FILTERS is timed through the engine. Filters that the
+reference path implements (warm, cool, cinematic) are also timed and diffed
+against it.
+"""
+import argparse
+import time
+import numpy as np
+from typing import Callable, Dict
+import config
+from processors.filter_processor import FilterProcessor
+
+REFERENCE_FILTERS = ('warm', 'cool', 'cinematic')
+
+
+def time_filter(func: Callable[[np.ndarray], np.ndarray], frames: np.ndarray, repeat: int) -> float:
+    """Average milliseconds per frame for func over the frame set."""
+    func(frames[0])  # warm up caches and buffers
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(frames[i % len(frames)])
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def run(width: int, height: int, repeat: int, filters=None) -> Dict[str, Dict[str, float]]:
+    """Benchmark each filter and return timings and output differences."""
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size=(8, height, width, 3), dtype=np.uint8)
+    processor = FilterProcessor(config.__dict__)
+    filters = filters or list(config.FILTERS)
+
+    results = {}
+    for name in filters:
+        engine_ms = time_filter(lambda f: processor.process_frame(f, name), frames, repeat)
+        results[name] = {'engine_ms': engine_ms}
+        if name not in REFERENCE_FILTERS:
+            continue
+
+        reference_ms = time_filter(lambda f: processor.process_frame_reference(f, name), frames, repeat)
+        diff = np.abs(
+            processor.process_frame_reference(frames[0], name).astype(np.int16)
+            - processor.process_frame(frames[0], name).astype(np.int16)
+        )
+        results[name].update({
+            'reference_ms': reference_ms,
+            'speedup': reference_ms / engine_ms if engine_ms else float('inf'),
+            'max_abs_diff': int(diff.max()),
+            'mean_abs_diff': float(diff.mean())
+        })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--filters', nargs='*')
+    args = parser.parse_args()
+
+    results = run(args.width, args.height, args.frames, args.filters)
+    print(f"{'filter':<12}{'reference ms':>14}{'engine ms':>12}{'speedup':>10}{'max diff':>10}")
+    for name, r in results.items():
+        if 'reference_ms' in r:
+            print(f"{name:<12}{r['reference_ms']:>14.2f}{r['engine_ms']:>12.2f}"
+                  f"{r['speedup']:>9.1f}x{r['max_abs_diff']:>10}")
+        else:
+            print(f"{name:<12}{'-':>14}{r['engine_ms']:>12.2f}{'-':>10}{'-':>10}")
+
+
+if __name__ == '__main__':
+    main()
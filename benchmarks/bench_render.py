@@ -0,0 +1,289 @@
+"""End-to-end and per-stage rendering benchmarks on synthetic media.
+
+Usage: python -m benchmarks.bench_render [--scenarios sd hd] [--output results.json]
+                                         [--compare baseline.json] [--threshold 10]
+
+Test-pattern clips are written with OpenCV and click-track music with NumPy,
+so runs need no input files and are reproducible across machines. For each
+scenario create_montage is timed end to end in a fresh process (so peak RSS
+belongs to that render alone), then filters, onset envelope, decode and
+encode are timed on their own. Results are written as JSON; --compare
+prints the change against an earlier run and exits non-zero when a metric
+regressed by more than --threshold percent.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+import multiprocessing
+import cv2
+import numpy as np
+from scipy.io import wavfile
+from typing import Any, Dict, List, Tuple
+import config
+from benchmarks.bench_audio import SAMPLE_RATE, click_track
+from benchmarks.bench_filters import time_filter
+from processors.audio_processor import ANALYSIS_SAMPLE_RATE, OnsetAccumulator
+from processors.ffmpeg_writer import FFmpegWriter
+from processors.filter_processor import FilterProcessor
+from processors.frame_source import FrameSource
+
+# Clip size, frame rate and length, and music tempo per scenario
+SCENARIOS = {
+    'sd': {'width': 640, 'height': 360, 'fps': 30, 'clip_seconds': 4.0, 'bpm': 120.0},
+    'hd': {'width': 1280, 'height': 720, 'fps': 30, 'clip_seconds': 4.0, 'bpm': 128.0},
+    'fhd': {'width': 1920, 'height': 1080, 'fps': 30, 'clip_seconds': 3.0, 'bpm': 140.0}
+}
+CLIP_COUNT = 3
+ART_PACK = 'classic'
+EXPORT_QUALITY = 'high'
+# Metrics where larger is better; everything else is a time or size
+HIGHER_IS_BETTER = ('fps', 'realtime_factor')
+
+
+def synthetic_clip(path: str, width: int, height: int, fps: int, seconds: float, seed: int) -> None:
+    """Write a clip of moving colour bars, a gradient and a bouncing box."""
+    rng = np.random.default_rng(seed)
+    colours = rng.integers(0, 256, size=(8, 3), dtype=np.uint8)
+    bars = np.repeat(colours, -(-width // 8), axis=0)[:width]
+    gradient = np.linspace(0, 255, height, dtype=np.float32)[:, None, None]
+    box = max(16, height // 6)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    try:
+        for i in range(int(seconds * fps)):
+            frame = (np.roll(bars, i * 4, axis=0)[None, :, :] * 0.7 + gradient * 0.3).astype(np.uint8)
+            x = (i * 7) % (width - box)
+            y = int((height - box) * (0.5 + 0.5 * np.sin(i / fps * np.pi)))
+            frame[y:y + box, x:x + box] = colours[i % len(colours)]
+            cv2.putText(frame, str(i), (10, height - 10), cv2.FONT_HERSHEY_SIMPLEX,
+                        height / 360, (255, 255, 255), 2)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+
+def synthetic_music(path: str, bpm: float, seconds: float) -> None:
+    """Write a click track at a known tempo as 16-bit WAV."""
+    audio, _ = click_track(bpm, seconds)
+    wavfile.write(path, SAMPLE_RATE, (audio * 32767).astype(np.int16))
+
+
+def prepare_media(directory: str, name: str, scenario: Dict) -> Dict[str, Any]:
+    """Generate a scenario's clips and music once and reuse them on later runs."""
+    directory = os.path.join(directory, name)
+    os.makedirs(directory, exist_ok=True)
+    paths = {
+        'clips': [os.path.join(directory, f'clip_{i}.mp4') for i in range(CLIP_COUNT + 2)],
+        'music': os.path.join(directory, 'music.wav')
+    }
+    # Written under a temporary name, so an interrupted run never leaves a partial file
+    for i, path in enumerate(paths['clips']):
+        if not os.path.exists(path):
+            synthetic_clip(f'{path}.tmp.mp4', scenario['width'], scenario['height'], scenario['fps'],
+                           scenario['clip_seconds'], seed=i)
+            os.replace(f'{path}.tmp.mp4', path)
+    if not os.path.exists(paths['music']):
+        seconds = scenario['clip_seconds'] * len(paths['clips'])
+        synthetic_music(f"{paths['music']}.tmp.wav", scenario['bpm'], seconds)
+        os.replace(f"{paths['music']}.tmp.wav", paths['music'])
+    return paths
+
+
+def _render(media: Dict[str, Any], output_path: str) -> Dict[str, Any]:
+    """Run one montage render in this process and report its timings."""
+    from processors.video_processor import VideoProcessor
+    settings = dict(
+        config.__dict__,
+        SEGMENT_CACHE_FOLDER='',
+        BEAT_CACHE_FOLDER='',
+        CLIP_ANALYSIS_CACHE_FOLDER='',
+        RENDER_MODE='sequential'
+    )
+    processor = VideoProcessor(settings)
+    profiler = processor.start_profile()
+
+    start = time.perf_counter()
+    clips = media['clips']
+    processor.create_montage(clips[1:-1], clips[0], clips[-1], media['music'], output_path,
+                             ART_PACK, EXPORT_QUALITY)
+    seconds = time.perf_counter() - start
+
+    report = profiler.report()
+    frames = sum(clip['frames'] for clip in report['clips'])
+    return {
+        'seconds': seconds,
+        'frames': frames,
+        'fps': frames / seconds,
+        'cpu_seconds': report['cpu_seconds'],
+        'child_cpu_seconds': report['child_cpu_seconds'],
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'ffmpeg_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        'stages': {name: stage['wall_seconds'] for name, stage in report['stages'].items()}
+    }
+
+
+def bench_montage(media: Dict[str, Any], work_dir: str, repeat: int) -> Dict[str, Any]:
+    """Best of repeat end-to-end renders, each in a fresh process."""
+    ctx = multiprocessing.get_context('spawn')
+    runs = []
+    for i in range(repeat):
+        with ctx.Pool(1) as pool:
+            runs.append(pool.apply(_render, (media, os.path.join(work_dir, f'montage_{i}.mp4'))))
+    return min(runs, key=lambda run: run['seconds'])
+
+
+def bench_filters(width: int, height: int, repeat: int) -> Dict[str, float]:
+    """Milliseconds per frame of each filter in the benchmarked art pack."""
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size=(4, height, width, 3), dtype=np.uint8)
+    processor = FilterProcessor(config.__dict__)
+    return {
+        f'{name}_ms': time_filter(lambda f: processor.process_frame(f, name), frames, repeat)
+        for name in config.ART_PACKS[ART_PACK]['filters']
+    }
+
+
+def bench_onset(bpm: float, seconds: float = 60.0) -> Dict[str, float]:
+    """Onset envelope of a click track, fed in decoder-sized chunks."""
+    audio, _ = click_track(bpm, seconds, sample_rate=ANALYSIS_SAMPLE_RATE)
+    start = time.perf_counter()
+    accumulator = OnsetAccumulator(ANALYSIS_SAMPLE_RATE)
+    for offset in range(0, len(audio), 256 * 1024):
+        accumulator.push(audio[offset:offset + 256 * 1024])
+    accumulator.finish()
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'realtime_factor': seconds / elapsed}
+
+
+def bench_decode(path: str, width: int, height: int) -> Tuple[Dict[str, float], List[np.ndarray]]:
+    """Frames per second through FrameSource at the clip's own size, and the frames."""
+    frames = []
+    start = time.perf_counter()
+    with FrameSource(path, width, height) as source:
+        for frame in source:
+            frames.append(frame.copy())
+    return {'fps': len(frames) / (time.perf_counter() - start)}, frames
+
+
+def bench_encode(frames: List[np.ndarray], fps: int, work_dir: str) -> Dict[str, float]:
+    """Frames per second through the FFmpeg writer at the benchmarked export preset."""
+    preset = config.EXPORT_PRESETS[EXPORT_QUALITY]
+    height, width = frames[0].shape[:2]
+    start = time.perf_counter()
+    with FFmpegWriter(os.path.join(work_dir, 'encode.mp4'), width, height, fps,
+                      preset=preset['preset'], crf=preset['crf'], maxrate=preset['maxrate']) as writer:
+        for frame in frames:
+            writer.write(frame)
+    return {'fps': len(frames) / (time.perf_counter() - start)}
+
+
+def run(scenarios: List[str], media_dir: str, repeat: int) -> Dict[str, Any]:
+    """Benchmark every scenario and return results keyed by scenario."""
+    media = {name: prepare_media(media_dir, name, SCENARIOS[name]) for name in scenarios}
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Renders go first: a child's peak RSS starts at its parent's size when started
+        montages = {name: bench_montage(media[name], work_dir, repeat) for name in scenarios}
+        for name in scenarios:
+            scenario = SCENARIOS[name]
+            width, height, fps = scenario['width'], scenario['height'], scenario['fps']
+            decode, frames = bench_decode(media[name]['clips'][1], width, height)
+            results[name] = {
+                'montage': montages[name],
+                'filters': bench_filters(width, height, repeat=200),
+                'onset': bench_onset(scenario['bpm']),
+                'decode': decode,
+                # The test pattern encodes like real footage; noise would only measure x264's worst case
+                'encode': bench_encode(frames, fps, work_dir)
+            }
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    """Where and on which commit the benchmark ran."""
+    def command_output(cmd: List[str]) -> str:
+        try:
+            return subprocess.run(cmd, capture_output=True, text=True).stdout.strip().splitlines()[0]
+        except (OSError, IndexError):
+            return ''
+    return {
+        'commit': command_output(['git', 'rev-parse', 'HEAD']),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'ffmpeg': command_output(['ffmpeg', '-version']),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.time()
+    }
+
+
+def flatten(results: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    """Numeric metrics keyed by their dotted path."""
+    metrics = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)):
+            metrics[f'{prefix}{key}'] = float(value)
+    return metrics
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Print every metric's change against the baseline and return the regressions."""
+    old, new = flatten(baseline), flatten(current)
+    regressions = []
+    print(f"{'metric':<42}{'baseline':>12}{'current':>12}{'change':>10}")
+    for key in sorted(old.keys() & new.keys()):
+        if key.endswith('.frames') or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+        flag = ''
+        # Stage breakdowns explain a regression, they do not define one
+        if worse > threshold and '.stages.' not in key:
+            regressions.append(key)
+            flag = '  <- regression'
+        print(f"{key:<42}{old[key]:>12.3f}{new[key]:>12.3f}{change:>+9.1f}%{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='*', choices=list(SCENARIOS), default=['sd', 'hd'])
+    parser.add_argument('--repeat', type=int, default=1, help='End-to-end renders per scenario, best is kept')
+    parser.add_argument('--media-dir', default=os.path.join(tempfile.gettempdir(), 'montage-bench-media'))
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent')
+    args = parser.parse_args()
+
+    results = run(args.scenarios, args.media_dir, args.repeat)
+    print(f"{'scenario':<10}{'render s':>10}{'fps':>8}{'peak MB':>9}{'decode fps':>12}"
+          f"{'encode fps':>12}{'onset x':>9}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['montage']['seconds']:>10.2f}{r['montage']['fps']:>8.1f}"
+              f"{r['montage']['peak_rss_mb']:>9.0f}{r['decode']['fps']:>12.1f}"
+              f"{r['encode']['fps']:>12.1f}{r['onset']['realtime_factor']:>9.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'args': vars(args), 'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print()
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
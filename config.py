@@ -4,31 +4,36 @@ from typing import Dict, Any
 # Video settings
 CLIP_DURATION: float = 69.0  # Total duration in seconds
 MAIN_BODY_DURATION: float = 60.0  # Main content duration
-TRANSITION_DURATION: float = 0.5  # Crossfade duration
+TRANSITION_DURATION: float = 0.5  # Transition into each body clip; its frames are buffered per job
 INTRO_DURATION: float = 4.5
 OUTRO_DURATION: float = 4.5
+MIN_SHOT_DURATION: float = 1.0  # Shortest body clip once cuts are moved onto beats
 
 # Art Pack configurations
 ART_PACKS: Dict[str, Dict[str, Any]] = {
     'classic': {
         'name': 'Classic',
         'description': 'Standard color grading with subtle enhancements',
-        'filters': ['warm', 'cool', 'cinematic']
+        'filters': ['warm', 'cool', 'cinematic'],
+        'transition': 'crossfade'  # crossfade, dip_to_black or whip
     },
     'vintage': {
         'name': 'Vintage',
         'description': 'Retro look with warm tones and film grain',
-        'filters': ['sepia', 'grain', 'vignette']
+        'filters': ['sepia', 'grain', 'vignette'],
+        'transition': 'dip_to_black'
     },
     'neon': {
         'name': 'Neon',
         'description': 'Vibrant colors with high contrast',
-        'filters': ['vibrant', 'glow', 'contrast']
+        'filters': ['vibrant', 'glow', 'contrast'],
+        'transition': 'whip'
     },
     'minimal': {
         'name': 'Minimal',
         'description': 'Clean and simple look with subtle gradients',
-        'filters': ['clean', 'soft', 'gradient']
+        'filters': ['clean', 'soft', 'gradient'],
+        'transition': 'crossfade'
     }
 }
 
@@ -93,7 +98,8 @@ FILTERS: Dict[str, Dict[str, Any]] = {
     },
     'gradient': {
         'enabled': True,
-        'colors': [(255,200,100), (100,150,255)],
+        'colors': [(255,200,100), (100,150,255)],  # BGR, top to bottom
+        'intensity': 0.15,
         'description': 'Subtle color gradient overlay'
     }
 }
@@ -102,9 +108,75 @@ FILTERS: Dict[str, Dict[str, Any]] = {
 UPLOAD_FOLDER = 'uploads'
 CLIPS_FOLDER = 'clips'
 ASSETS_FOLDER = 'assets'
-MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+INTRO_FILE = os.path.join(ASSETS_FOLDER, 'intro.mp4')
+OUTRO_FILE = os.path.join(ASSETS_FOLDER, 'outro.mp4')
+WORKSPACE_FOLDER = os.environ.get('WORKSPACE_FOLDER', 'workspaces')  # Per-montage scratch space, may be shared storage
+WORKSPACE_TTL = 6 * 3600.0  # Seconds before an abandoned workspace is garbage collected
+WORKSPACE_QUOTA_BYTES = int(os.environ.get('WORKSPACE_QUOTA_BYTES', 20 * 1024**3))  # 0 for unlimited
+MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 2 * 1024**3))  # Max upload request size, streamed to disk
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024  # Suggested chunk size for resumable uploads
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mp3'}
 
+# Finished montage storage and delivery
+MONTAGE_FOLDER = os.environ.get('MONTAGE_FOLDER', 'montages')  # One canonical file per montage id and rendition
+MONTAGE_MAX_AGE = 3600  # Seconds clients may cache a montage before revalidating with its ETag
+USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '0') == '1'  # Let Apache/lighttpd send files via X-Sendfile
+MONTAGE_ACCEL_REDIRECT = os.environ.get('MONTAGE_ACCEL_REDIRECT', '')  # nginx internal location mapped to MONTAGE_FOLDER
+MONTAGE_TTL = float(os.environ.get('MONTAGE_TTL', 0))  # Seconds to keep finished montages, 0 to keep them forever
+
+# Montage metadata index, SQLite locally and Postgres in production
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///montages.db')  # Relative SQLite paths live in the instance folder
+MONTAGE_INDEX_CACHE_ENTRIES = 1024  # Rows cached per app process
+MONTAGE_INDEX_CACHE_TTL = 30.0  # Seconds a cached row may be served before rereading it
+
+# Beat analysis cache, keyed by music content hash
+BEAT_CACHE_FOLDER = os.environ.get('BEAT_CACHE_FOLDER', 'cache/beats')  # Empty to disable
+BEAT_CACHE_MEMORY_ENTRIES = 64  # In-process LRU entries per worker
+BEAT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Disk tier size before eviction
+
+# Intro/outro pre-render cache, keyed by asset, art pack and output settings
+SEGMENT_CACHE_FOLDER = os.environ.get('SEGMENT_CACHE_FOLDER', 'cache/segments')  # Empty to disable
+SEGMENT_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # Disk size before eviction
+PRERENDER_WARM_ON_STARTUP = os.environ.get('PRERENDER_WARM_ON_STARTUP', '1') == '1'  # Render every art pack at startup
+
+# Clip analysis: body clips play their most active stretch instead of their middle
+CLIP_ANALYSIS_ENABLED = True
+CLIP_ANALYSIS_SAMPLE_INTERVAL = 0.5  # Seconds dense keyframes are thinned to
+CLIP_ANALYSIS_MAX_KEYFRAME_GAP = 2.0  # Seconds between samples seeked into longer keyframe gaps
+CLIP_ANALYSIS_CACHE_FOLDER = os.environ.get('CLIP_ANALYSIS_CACHE_FOLDER', 'cache/clips')  # Empty to disable
+CLIP_ANALYSIS_CACHE_MEMORY_ENTRIES = 64  # In-process LRU entries per worker
+CLIP_ANALYSIS_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Disk tier size before eviction
+
+# Render job settings
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', os.cpu_count() or 1))  # Worker processes draining the queue
+# Job records, previews and the render pool live in one app process, so it must be the only one
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+RENDER_QUEUE_LIMIT = int(os.environ.get('RENDER_QUEUE_LIMIT', 32))  # Max queued + running jobs, 0 for unlimited
+JOB_RESULT_TTL = 3600.0  # Seconds to keep finished job records
+RENDER_MODE = os.environ.get('RENDER_MODE', 'sequential')  # 'sequential' or 'parallel' per-clip segments
+SEGMENT_WORKERS = int(os.environ.get('SEGMENT_WORKERS', 0))  # Processes per parallel render, 0 for one per core
+DECODE_PREFETCH = 8  # Frames decoded ahead of the filter stage per clip
+FRAME_PIPELINE_WORKERS = int(os.environ.get('FRAME_PIPELINE_WORKERS', 0))  # Filter processes per sequential render, 0 to filter in the render process
+FRAME_PIPELINE_SLOTS = 0  # Shared memory frames per pipeline, 0 for two per worker plus two
+
+# Logging and render profiling
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')  # DEBUG logging costs render throughput
+PROFILE_RENDERS = os.environ.get('PROFILE_RENDERS', '1') == '1'  # Time pipeline stages and report them with each job
+PROFILE_DUMP_FOLDER = os.environ.get('PROFILE_DUMP_FOLDER', '')  # Write each job's profile here, empty to disable
+PROFILE_DUMP_FORMAT = os.environ.get('PROFILE_DUMP_FORMAT', 'chrome')  # 'json' report or 'chrome' trace events
+
+# Export quality presets: output height and optional frame rate cap (never raised),
+# x264 preset, CRF and bitrate cap
+EXPORT_PRESETS = {
+    'high': {'height': 1080, 'preset': 'fast', 'crf': 20, 'maxrate': '8M'},
+    'medium': {'height': 720, 'preset': 'faster', 'crf': 23, 'maxrate': '4M'},
+    'low': {'height': 480, 'preset': 'veryfast', 'crf': 26, 'maxrate': '2M'},
+    'preview': {'height': 480, 'max_fps': 15, 'preset': 'ultrafast', 'crf': 30, 'maxrate': '1M'}  # Quick check before a full render
+}
+DEFAULT_EXPORT_QUALITY = 'high'
+PREVIEW_QUALITY = 'preview'  # Preset used by preview renders
+PREVIEW_SEGMENT_SECONDS = 2.0  # HLS segment length, and so the delay before playback starts
+
 # Create required directories
-for folder in [UPLOAD_FOLDER, CLIPS_FOLDER, ASSETS_FOLDER]:
+for folder in [UPLOAD_FOLDER, CLIPS_FOLDER, ASSETS_FOLDER, WORKSPACE_FOLDER, MONTAGE_FOLDER]:
     os.makedirs(folder, exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,18 @@
+"""Gunicorn settings, loaded automatically from the working directory.
+
+Render jobs, their status and previews are tracked inside the app
+process, so the app runs as a single process and serves concurrent
+requests with threads instead.
+"""
+import os
+
+workers = 1
+threads = int(os.environ.get('WEB_THREADS', 8))
+
+
+def on_starting(server):
+    if server.cfg.workers != 1:
+        raise RuntimeError(
+            f"MONTY keeps job state in one app process and cannot run {server.cfg.workers} workers; "
+            "raise WEB_THREADS instead"
+        )
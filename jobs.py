@@ -0,0 +1,430 @@
+import os
+import json
+import time
+import fcntl
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, Any, Callable, List, Optional, Set
+import config
+from storage import MontageStorage
+from workspace import Workspace
+
+logger = logging.getLogger(__name__)
+
+# Job states reported by the status endpoints
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Per-worker-process state, populated by _init_worker
+_worker_events = None
+_worker_video_processor = None
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the render queue has no room for another job."""
+
+
+class JobConflictError(RuntimeError):
+    """Raised when a job would run alongside a pending job of the same montage it conflicts with."""
+
+    def __init__(self, message: str, job_id: str):
+        super().__init__(message)
+        self.job_id = job_id
+
+
+def _init_worker(events) -> None:
+    """Initialize a render worker process."""
+    global _worker_events
+    _worker_events = events
+
+
+def _get_video_processor():
+    """Return the video processor owned by this worker process."""
+    global _worker_video_processor
+    if _worker_video_processor is None:
+        from processors.video_processor import VideoProcessor
+        _worker_video_processor = VideoProcessor(config.__dict__)
+    return _worker_video_processor
+
+
+def _run_job(job_id: str, func: Callable[[Dict], Dict], payload: Dict) -> Dict:
+    """Worker-side wrapper that reports when a job actually starts."""
+    if _worker_events is not None:
+        _worker_events.put((job_id, RUNNING, time.time()))
+    return func(payload)
+
+
+def _start_profile(processor, payload: Dict[str, Any]):
+    """Start timing the stages of a job, including the upload it was queued from."""
+    profiler = processor.start_profile(config.PROFILE_RENDERS)
+    if payload.get('upload_seconds') is not None:
+        profiler.record('upload_save', payload['upload_seconds'])
+    return profiler
+
+
+def _profile_report(profiler, name: str) -> Optional[Dict[str, Any]]:
+    """Report of a finished job's profile, dumped to PROFILE_DUMP_FOLDER if set."""
+    if not profiler.enabled:
+        return None
+    report = profiler.report()
+    if config.PROFILE_DUMP_FOLDER:
+        suffix = '.trace.json' if config.PROFILE_DUMP_FORMAT == 'chrome' else '.json'
+        path = os.path.join(config.PROFILE_DUMP_FOLDER, name + suffix)
+        profiler.dump(path, config.PROFILE_DUMP_FORMAT)
+        logger.info(f"Wrote profile to {path}")
+    return report
+
+
+def render_montage(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Render a montage inside a worker process."""
+    # Built first, so a payload with an invalid id fails before anything is removed
+    workspace = Workspace(payload['montage_id'])
+    # Time spent queued must not count against the workspace TTL
+    workspace.touch()
+    processor = _get_video_processor()
+    profiler = _start_profile(processor, payload)
+    storage = MontageStorage()
+    try:
+        duration = processor.create_montage(
+            payload['clip_files'],
+            payload['intro_file'],
+            payload['outro_file'],
+            payload['music_file'],
+            storage.staging_path(payload['montage_id']),
+            payload['art_pack'],
+            payload.get('export_quality'),
+            payload.get('renditions')
+        )
+        renditions = storage.publish(processor.outputs)
+    finally:
+        workspace.cleanup()
+    return {
+        'montage_id': payload['montage_id'],
+        'duration': duration,
+        'output_path': storage.path(payload['montage_id']),
+        'renditions': renditions,
+        'profile': _profile_report(profiler, f"render_{payload['montage_id']}")
+    }
+
+
+def render_preview(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Render a preview inside a worker process, keeping the workspace for the full render."""
+    processor = _get_video_processor()
+    profiler = _start_profile(processor, payload)
+    workspace = Workspace(payload['montage_id'])
+    workspace.touch()
+    playlist_path = os.path.abspath(payload['playlist_path'])
+    duration = processor.create_montage(
+        workspace.clip_files(),
+        payload['intro_file'],
+        payload['outro_file'],
+        workspace.music_file(),
+        playlist_path,
+        payload['art_pack'],
+        preview=True
+    )
+    return {
+        'montage_id': payload['montage_id'],
+        'duration': duration,
+        'output_path': playlist_path,
+        'preview_id': os.path.basename(os.path.dirname(playlist_path)),
+        'profile': _profile_report(profiler, f"preview_{payload['montage_id']}")
+    }
+
+
+def export_montage(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-encode a rendered montage at another export quality inside a worker process."""
+    from processors.ffmpeg_writer import rendition_path, transcode
+    processor = _get_video_processor()
+    profiler = _start_profile(processor, payload)
+    storage = MontageStorage()
+    quality = payload['export_quality']
+    staged_path = rendition_path(storage.staging_path(payload['montage_id']), quality)
+    source_path = storage.path(payload['montage_id'])
+    params = processor._get_output_params(source_path, quality)
+    # Capped by the preset's max_fps, like renditions made during the render
+    fps = params['fps'] if params['fps'] < processor.get_video_info(source_path)['fps'] else None
+    try:
+        with profiler.stage('transcode'):
+            transcode(
+                source_path,
+                staged_path,
+                params['width'],
+                params['height'],
+                fps=fps,
+                **params['encoder']
+            )
+    except Exception:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+        raise
+    return {
+        'montage_id': payload['montage_id'],
+        'export_quality': quality,
+        'output_path': storage.publish({quality: staged_path})[quality],
+        'profile': _profile_report(profiler, f"export_{payload['montage_id']}_{quality}")
+    }
+
+
+WARM_MARKER = 'warm.json'  # Records what the segment cache was last warmed for
+_warm_claim = None  # Lock file held by the process that queues the startup warm
+
+
+def _warm_state(intro_file: str, outro_file: str) -> Dict[str, Any]:
+    """Everything a full warm of the segment cache depends on."""
+    from processors.filter_engine import FILTER_ENGINE_VERSION
+    assets = []
+    for path in (intro_file, outro_file):
+        stat = os.stat(path)
+        assets.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return {
+        'assets': assets,
+        'art_packs': config.ART_PACKS,
+        'export_presets': config.EXPORT_PRESETS,
+        'filters': config.FILTERS,
+        'filter_engine': FILTER_ENGINE_VERSION
+    }
+
+
+def segment_cache_warm(intro_file: str, outro_file: str) -> bool:
+    """Whether the segment cache was already fully warmed for these assets and settings."""
+    try:
+        with open(os.path.join(config.SEGMENT_CACHE_FOLDER, WARM_MARKER)) as f:
+            warmed = json.load(f)
+    except (OSError, ValueError):
+        return False
+    current = json.loads(json.dumps(_warm_state(intro_file, outro_file)))
+    return warmed == current
+
+
+def claim_segment_cache_warm() -> bool:
+    """Whether this process should queue the startup warm.
+
+    The first process to ask holds a lock in the cache folder for as long
+    as it lives, so every other process started alongside it gets False.
+    """
+    global _warm_claim
+    if _warm_claim is not None:
+        return True
+    os.makedirs(config.SEGMENT_CACHE_FOLDER, exist_ok=True)
+    lock = open(os.path.join(config.SEGMENT_CACHE_FOLDER, 'warm.claim'), 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return False
+    _warm_claim = lock
+    return True
+
+
+def warm_segment_cache(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Pre-render the intro and outro for every art pack inside a worker process.
+
+    Every app process may queue this at startup; only one warms at a time
+    and the others return at once.
+    """
+    os.makedirs(config.SEGMENT_CACHE_FOLDER, exist_ok=True)
+    with open(os.path.join(config.SEGMENT_CACHE_FOLDER, 'warm.lock'), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info("Segment cache is already being warmed")
+            return {'rendered': 0}
+        if not payload.get('art_packs') and segment_cache_warm(payload['intro_file'], payload['outro_file']):
+            return {'rendered': 0}
+
+        processor = _get_video_processor()
+        rendered = processor.warm_segment_cache(
+            payload['intro_file'],
+            payload['outro_file'],
+            payload.get('art_packs')
+        )
+        if not payload.get('art_packs'):
+            state = _warm_state(payload['intro_file'], payload['outro_file'])
+            marker = os.path.join(config.SEGMENT_CACHE_FOLDER, WARM_MARKER)
+            with open(marker + '.tmp', 'w') as f:
+                json.dump(state, f)
+            os.replace(marker + '.tmp', marker)
+    return {'rendered': rendered}
+
+
+class JobQueue:
+    """Render job queue drained by a pool of worker processes.
+
+    Requests only enqueue work and return immediately, so HTTP throughput is
+    independent of how many renders can run at once. Listeners are called
+    with a snapshot of a job whenever it starts or finishes.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int = 0, result_ttl: float = 3600.0):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._events = None
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """Call callback with a job snapshot on every state change."""
+        self._listeners.append(callback)
+
+    def _notify(self, job: Optional[Dict[str, Any]]) -> None:
+        if job is None:
+            return
+        for callback in self._listeners:
+            try:
+                callback(job)
+            except Exception as e:
+                logger.error(f"Job listener failed for job {job['id']}: {str(e)}")
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        """Start the worker pool on first use."""
+        if self._executor is None:
+            ctx = multiprocessing.get_context()
+            self._events = ctx.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(self._events,)
+            )
+            listener = threading.Thread(target=self._listen, name='job-events', daemon=True)
+            listener.start()
+            logger.info(f"Started render pool with {self.max_workers} workers")
+        return self._executor
+
+    def _listen(self) -> None:
+        """Apply state changes reported by worker processes."""
+        while True:
+            try:
+                job_id, status, timestamp = self._events.get()
+            except (EOFError, OSError):
+                return
+            snapshot = None
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job and job['status'] == QUEUED:
+                    job['status'] = status
+                    job['started_at'] = timestamp
+                    snapshot = dict(job)
+            self._notify(snapshot)
+
+    def pending_count(self) -> int:
+        """Number of jobs that are queued or running."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job['status'] in (QUEUED, RUNNING))
+
+    def pending_montages(self) -> Set[str]:
+        """Ids of montages with a queued or running job."""
+        with self._lock:
+            return {job['montage_id'] for job in self._jobs.values()
+                    if job['status'] in (QUEUED, RUNNING) and job['montage_id']}
+
+    def conflicting_job(self, montage_id: Optional[str], exclusive: bool = False) -> Optional[Dict[str, Any]]:
+        """Snapshot of a pending job of montage_id that a new job would conflict with.
+
+        An exclusive job conflicts with every pending job of its montage, and
+        every job conflicts with a pending exclusive one.
+        """
+        with self._lock:
+            job = self._conflicting_job(montage_id, exclusive)
+            return dict(job) if job else None
+
+    def _conflicting_job(self, montage_id: Optional[str], exclusive: bool) -> Optional[Dict[str, Any]]:
+        if not montage_id:
+            return None
+        for job in self._jobs.values():
+            if (job['montage_id'] == montage_id and job['status'] in (QUEUED, RUNNING)
+                    and (exclusive or job['exclusive'])):
+                return job
+        return None
+
+    def submit(
+        self,
+        func: Callable[[Dict], Dict],
+        payload: Dict[str, Any],
+        job_id: Optional[str] = None,
+        exclusive: bool = False
+    ) -> str:
+        """Enqueue a job and return its id.
+
+        An exclusive job, such as a render that removes the montage's
+        workspace when it is done, is refused while any other job of the
+        same montage is pending, and blocks new ones until it finishes.
+        """
+        self._prune()
+        if self.max_pending and self.pending_count() >= self.max_pending:
+            raise QueueFullError("Render queue is full, please try again later")
+
+        job_id = job_id or str(uuid.uuid4())
+        montage_id = payload.get('montage_id')
+        with self._lock:
+            conflict = self._conflicting_job(montage_id, exclusive)
+            if conflict is not None:
+                raise JobConflictError(
+                    f"Montage {montage_id} already has a {conflict['status']} job", conflict['id']
+                )
+            self._jobs[job_id] = {
+                'id': job_id,
+                'kind': func.__name__,
+                'status': QUEUED,
+                'exclusive': exclusive,
+                'montage_id': montage_id,
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'error': None
+            }
+
+        future = self._ensure_executor().submit(_run_job, job_id, func, payload)
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+        logger.info(f"Queued job {job_id}")
+        return job_id
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        """Record the outcome of a finished job."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['finished_at'] = time.time()
+            error = future.exception()
+            if error is not None:
+                job['status'] = FAILED
+                job['error'] = str(error)
+                logger.error(f"Job {job_id} failed: {error}")
+            else:
+                job['status'] = DONE
+                job['result'] = future.result()
+                logger.info(f"Job {job_id} finished")
+            snapshot = dict(job)
+        self._notify(snapshot)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of a job record."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['finished_at'] and job['finished_at'] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -0,0 +1,55 @@
+from typing import Any, Dict
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class Montage(db.Model):
+    """Metadata of a rendered or rendering montage.
+
+    Timestamps are Unix times, like the job records they are copied from.
+    """
+
+    __tablename__ = 'montages'
+
+    id = db.Column(db.String(36), primary_key=True)
+    status = db.Column(db.String(16), nullable=False)
+    art_pack = db.Column(db.String(32), nullable=False)
+    export_quality = db.Column(db.String(16), nullable=False)
+    renditions = db.Column(db.JSON, nullable=False, default=list)  # Extra qualities stored beside the main file
+    music_hash = db.Column(db.String(64), index=True)
+    duration = db.Column(db.Float)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.Float, nullable=False, index=True)
+    started_at = db.Column(db.Float)
+    finished_at = db.Column(db.Float, index=True)
+
+    __table_args__ = (
+        # Listings and cleanup filter by status and order by age
+        db.Index('ix_montages_status_created_at', 'status', 'created_at'),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        render_seconds = None
+        if self.started_at and self.finished_at:
+            render_seconds = self.finished_at - self.started_at
+        return {
+            'id': self.id,
+            'status': self.status,
+            'art_pack': self.art_pack,
+            'export_quality': self.export_quality,
+            'renditions': list(self.renditions or []),
+            'music_hash': self.music_hash,
+            'duration': self.duration,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'render_seconds': render_seconds
+        }
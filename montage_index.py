@@ -0,0 +1,169 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from flask import Flask
+from jobs import QUEUED, RUNNING, DONE, FAILED
+from models import db, Montage
+from storage import MontageStorage
+
+logger = logging.getLogger(__name__)
+
+
+class MontageIndex:
+    """Montage metadata in the database, behind a small read-through cache.
+
+    Share and export requests are answered from here instead of probing the
+    montage storage. Rows are cached per process as plain dicts for ttl
+    seconds; writes made by this process drop their entry immediately.
+    Job updates arrive on the job queue's threads, so every method pushes its
+    own app context.
+    """
+
+    def __init__(self, app: Flask, max_entries: int = 1024, ttl: float = 30.0):
+        self.app = app
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_collect = 0.0
+
+    def _cached(self, montage_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(montage_id)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self._cache.move_to_end(montage_id)
+            return entry[1]
+
+    def _remember(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[row['id']] = (time.monotonic() + self.ttl, row)
+            self._cache.move_to_end(row['id'])
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _forget(self, montage_id: str) -> None:
+        with self._lock:
+            self._cache.pop(montage_id, None)
+
+    def add(
+        self,
+        montage_id: str,
+        art_pack: str,
+        export_quality: str,
+        music_hash: Optional[str] = None
+    ) -> None:
+        """Record a montage as queued, replacing any earlier render of it."""
+        with self.app.app_context():
+            db.session.merge(Montage(
+                id=montage_id,
+                status=QUEUED,
+                art_pack=art_pack,
+                export_quality=export_quality,
+                renditions=[],
+                music_hash=music_hash,
+                created_at=time.time()
+            ))
+            db.session.commit()
+        self._forget(montage_id)
+
+    def get(self, montage_id: str) -> Optional[Dict[str, Any]]:
+        """Metadata of a montage, or None."""
+        row = self._cached(montage_id)
+        if row is not None:
+            return row
+        with self.app.app_context():
+            montage = db.session.get(Montage, montage_id)
+            if montage is None:
+                return None
+            row = montage.to_dict()
+        self._remember(row)
+        return row
+
+    def list(
+        self,
+        status: Optional[str] = None,
+        before: Optional[float] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Most recent montages first, optionally by status and created before a time."""
+        with self.app.app_context():
+            query = db.select(Montage)
+            if status is not None:
+                query = query.where(Montage.status == status)
+            if before is not None:
+                query = query.where(Montage.created_at < before)
+            query = query.order_by(Montage.created_at.desc()).limit(limit)
+            return [montage.to_dict() for montage in db.session.scalars(query)]
+
+    def delete(self, montage_id: str) -> None:
+        """Remove the metadata of a montage."""
+        with self.app.app_context():
+            db.session.execute(db.delete(Montage).where(Montage.id == montage_id))
+            db.session.commit()
+        self._forget(montage_id)
+
+    def on_job_update(self, job: Dict[str, Any]) -> None:
+        """Job queue listener keeping montage status, timings and renditions current."""
+        if job['kind'] not in ('render_montage', 'export_montage') or not job['montage_id']:
+            return
+        with self.app.app_context():
+            montage = db.session.get(Montage, job['montage_id'])
+            if montage is None:
+                return
+            if job['kind'] == 'export_montage':
+                if job['status'] != DONE:
+                    return
+                quality = job['result']['export_quality']
+                if quality not in montage.renditions:
+                    montage.renditions = montage.renditions + [quality]
+            elif job['status'] == RUNNING and montage.status == QUEUED:
+                montage.status = RUNNING
+                montage.started_at = job['started_at']
+            elif job['status'] == DONE:
+                montage.status = DONE
+                montage.started_at = montage.started_at or job['started_at']
+                montage.finished_at = job['finished_at']
+                montage.duration = job['result']['duration']
+                montage.renditions = [
+                    quality for quality in job['result']['renditions']
+                    if quality != montage.export_quality
+                ]
+            elif job['status'] == FAILED:
+                montage.status = FAILED
+                montage.finished_at = job['finished_at']
+                montage.error = job['error']
+            db.session.commit()
+        self._forget(job['montage_id'])
+
+    def collect_expired(self, ttl: float, storage: Optional[MontageStorage] = None, limit: int = 100) -> int:
+        """Delete montages that finished more than ttl seconds ago, files first."""
+        storage = storage or MontageStorage()
+        with self.app.app_context():
+            query = (
+                db.select(Montage.id)
+                .where(Montage.status.in_([DONE, FAILED]))
+                .where(Montage.finished_at < time.time() - ttl)
+                .limit(limit)
+            )
+            expired = list(db.session.scalars(query))
+
+        for montage_id in expired:
+            storage.remove(montage_id)
+            self.delete(montage_id)
+        if expired:
+            logger.info(f"Collected {len(expired)} expired montages")
+        return len(expired)
+
+    def maybe_collect_expired(self, ttl: float, interval: float = 300.0) -> None:
+        """Run collect_expired at most once per interval seconds; ttl 0 keeps montages forever."""
+        now = time.time()
+        if not ttl or now - self._last_collect < interval:
+            return
+        self._last_collect = now
+        try:
+            self.collect_expired(ttl)
+        except Exception as e:
+            logger.error(f"Error collecting expired montages: {str(e)}")
@@ -1,36 +1,135 @@
-import os
 import numpy as np
 import logging
 import subprocess
-from typing import Optional, List
-from scipy.io import wavfile
+from typing import Iterator, Optional
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy import signal
+from scipy import fft
+from .content_cache import ContentCache, file_digest
+from .profiler import NullProfiler, StageProfiler
 
 logger = logging.getLogger(__name__)
 
+# Beat analysis settings
+ANALYSIS_SAMPLE_RATE = 11025  # Audio is resampled to this rate before analysis
+N_FFT = 512  # STFT window, ~46 ms at the analysis rate
+HOP_LENGTH = 256  # ~43 onset frames per second
+MIN_BPM = 60.0
+MAX_BPM = 200.0
+PRIOR_BPM = 120.0  # Center of the log-normal tempo prior
+PHASE_BEATS = 16  # Beats used to pick the beat grid phase
+STFT_BLOCK_FRAMES = 1024  # STFT frames transformed per batch, bounds scratch memory
+DECODE_CHUNK_SAMPLES = STFT_BLOCK_FRAMES * HOP_LENGTH  # Samples read from FFmpeg per chunk
+# Part of every cache key, so changing the analysis invalidates old entries
+ANALYSIS_VERSION = f'flux-{ANALYSIS_SAMPLE_RATE}-{N_FFT}-{HOP_LENGTH}-1'
+
+class OnsetAccumulator:
+    """Incremental spectral-flux onset envelope.
+
+    Samples can arrive in chunks of any size. Only the last N_FFT - HOP_LENGTH
+    samples and the previous magnitude frame are carried between chunks, so
+    the working set stays constant however long the input is. Frame k covers
+    samples [k * HOP_LENGTH, k * HOP_LENGTH + N_FFT).
+    """
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.samples_seen = 0
+        self._window = signal.get_window('hann', N_FFT).astype(np.float32)
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._previous: Optional[np.ndarray] = None
+        self._flux = []
+
+    def push(self, samples: np.ndarray) -> None:
+        """Add mono float samples at the accumulator's sample rate."""
+        self.samples_seen += len(samples)
+        buffer = np.concatenate((self._carry, samples.astype(np.float32, copy=False)))
+        if len(buffer) < N_FFT:
+            self._carry = buffer
+            return
+
+        frames = sliding_window_view(buffer, N_FFT)[::HOP_LENGTH]
+        for start in range(0, len(frames), STFT_BLOCK_FRAMES):
+            block = frames[start:start + STFT_BLOCK_FRAMES] * self._window
+            magnitude = np.abs(fft.rfft(block, axis=1, workers=-1))
+            np.multiply(magnitude, 1000.0, out=magnitude)
+            np.log1p(magnitude, out=magnitude)
+            self._flux.append(self._spectral_flux(magnitude))
+            self._previous = magnitude[-1]
+
+        self._carry = buffer[len(frames) * HOP_LENGTH:].copy()
+
+    def _spectral_flux(self, magnitude: np.ndarray) -> np.ndarray:
+        """Sum of positive magnitude increases for each frame of a block."""
+        previous = magnitude[0] if self._previous is None else self._previous
+        increase = np.diff(magnitude, axis=0, prepend=previous[None, :])
+        np.maximum(increase, 0, out=increase)
+        return increase.sum(axis=1)
+
+    def finish(self) -> np.ndarray:
+        """Detrend the raw flux and scale it to [0, 1]."""
+        if not self._flux:
+            return np.zeros(0, dtype=np.float32)
+        flux = np.concatenate(self._flux)
+
+        # Subtract a ~0.5 s moving average so sustained loudness does not count as onsets
+        trend_frames = max(1, int(0.5 * self.sample_rate / HOP_LENGTH))
+        trend = np.convolve(flux, np.ones(trend_frames) / trend_frames, mode='same')
+        flux = np.maximum(flux - trend, 0).astype(np.float32)
+
+        if flux.max() > 0:
+            flux /= flux.max()
+        return flux
+
+
+def decode_audio_chunks(
+    audio_file: str,
+    sample_rate: int = ANALYSIS_SAMPLE_RATE,
+    chunk_samples: int = DECODE_CHUNK_SAMPLES
+) -> Iterator[np.ndarray]:
+    """Yield mono float32 chunks decoded, downmixed and resampled by FFmpeg.
+
+    PCM is read from FFmpeg's stdout into one reused buffer; nothing is
+    written to disk.
+    """
+    cmd = [
+        'ffmpeg', '-loglevel', 'error',
+        '-i', audio_file,
+        '-vn',
+        '-ac', '1',
+        '-ar', str(sample_rate),
+        '-f', 's16le',
+        '-'
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    buffer = bytearray(chunk_samples * 2)
+    view = memoryview(buffer)
+    scale = np.float32(1.0 / 32768)
+
+    try:
+        while True:
+            received = process.stdout.readinto(view)
+            if not received:
+                break
+            pcm = np.frombuffer(buffer, dtype=np.int16, count=received // 2)
+            yield pcm.astype(np.float32) * scale
+        process.stdout.close()
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"FFmpeg decode failed: {stderr.decode(errors='replace').strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
 class AudioProcessor:
-    def __init__(self):
+    def __init__(self, cache: Optional[ContentCache] = None):
+        self.cache = cache
+        self.profiler: StageProfiler = NullProfiler()
         self.tempo: Optional[float] = None
         self.beat_frames: Optional[np.ndarray] = None
         self.beat_times: Optional[np.ndarray] = None
-
-    def convert_to_wav(self, audio_file: str) -> str:
-        """Convert audio file to WAV format for processing."""
-        wav_file = f"{audio_file}.wav"
-        cmd = [
-            'ffmpeg', '-y',
-            '-i', audio_file,
-            '-acodec', 'pcm_s16le',
-            '-ar', '44100',
-            wav_file
-        ]
-        try:
-            subprocess.run(cmd, capture_output=True, check=True)
-            logger.debug(f"Converted {audio_file} to WAV")
-            return wav_file
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg conversion failed: {str(e)}")
-            raise
+        self.onset_envelope: Optional[np.ndarray] = None
 
     def generate_default_beats(self, duration: float, bpm: float = 120) -> np.ndarray:
         """Generate evenly spaced beats at specified BPM."""
@@ -41,85 +140,160 @@ class AudioProcessor:
         return self.beat_times
 
     def analyze_beats(self, audio_file: str) -> np.ndarray:
-        """Analyze audio file for beats using scipy."""
+        """Analyze audio file for beats using spectral flux and tempo tracking.
+
+        Audio is streamed from FFmpeg at the analysis rate and folded into the
+        onset envelope chunk by chunk, so memory use does not depend on the
+        track length.
+        """
         logger.info(f"Analyzing beats in audio file: {audio_file}")
-        wav_file = None
 
         try:
-            wav_file = self.convert_to_wav(audio_file)
-            sample_rate, audio_data = wavfile.read(wav_file)
-
-            # Convert to mono if stereo
-            if len(audio_data.shape) > 1:
-                audio_data = np.mean(audio_data, axis=1)
-
-            # Normalize audio data
-            audio_data = self._normalize_audio(audio_data)
-
-            # Process onset envelope
-            onset_env = self._calculate_onset_envelope(audio_data, sample_rate)
-            
-            # Find peaks
-            peaks = self._find_beat_peaks(onset_env, sample_rate)
-            
-            self.beat_times = peaks * (len(audio_data) / len(onset_env)) / sample_rate
-
-            if len(self.beat_times) == 0:
-                logger.warning("No beats detected, using default beat generation")
-                duration = len(audio_data) / sample_rate
-                return self.generate_default_beats(duration)
-
-            # Calculate tempo
-            beat_intervals = np.diff(self.beat_times)
-            self.tempo = 60 / np.median(beat_intervals)
-            
-            logger.info(f"Detected tempo: {self.tempo:.2f} BPM")
-            logger.info(f"Found {len(self.beat_times)} beats")
-            
-            return self.beat_times
+            cache_key = None
+            if self.cache is not None:
+                with self.profiler.stage('beat_cache'):
+                    cache_key = f"{file_digest(audio_file)}-{ANALYSIS_VERSION}"
+                    cached = self._load_cached(cache_key)
+                if cached:
+                    logger.info(f"Using cached beats: {self.tempo:.2f} BPM, {len(self.beat_times)} beats")
+                    return self.beat_times
+
+            accumulator = OnsetAccumulator(ANALYSIS_SAMPLE_RATE)
+            chunks = decode_audio_chunks(audio_file, ANALYSIS_SAMPLE_RATE)
+            while True:
+                with self.profiler.stage('audio_decode'):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                with self.profiler.stage('beat_analysis'):
+                    accumulator.push(chunk)
+
+            duration = accumulator.samples_seen / ANALYSIS_SAMPLE_RATE
+            with self.profiler.stage('beat_analysis'):
+                beat_times = self.analyze_envelope(accumulator.finish(), ANALYSIS_SAMPLE_RATE, duration)
+            if cache_key is not None:
+                self._store_cached(cache_key)
+            return beat_times
 
         except Exception as e:
             logger.error(f"Error analyzing beats: {str(e)}")
             return self.generate_default_beats(69)
-        
-        finally:
-            if wav_file and os.path.exists(wav_file):
-                os.remove(wav_file)
-
-    def _normalize_audio(self, audio_data: np.ndarray) -> np.ndarray:
-        """Normalize audio data to float32 between -1 and 1."""
-        audio_data = audio_data.astype(np.float32)
-        if audio_data.dtype.kind in 'iu':
-            audio_data /= np.iinfo(audio_data.dtype).max
-        else:
-            audio_data /= np.abs(audio_data).max()
-        return audio_data
-
-    def _calculate_onset_envelope(self, audio_data: np.ndarray, sample_rate: int) -> np.ndarray:
-        """Calculate onset envelope from audio data."""
-        window_size = int(0.05 * sample_rate)
-        hop_length = window_size // 2
-
-        onset_env = []
-        for i in range(0, len(audio_data) - window_size, hop_length):
-            window = audio_data[i:i + window_size]
-            rms = np.sqrt(np.mean(window**2))
-            onset_env.append(rms)
-
-        onset_env = np.array(onset_env)
-        if onset_env.max() > 0:
-            onset_env /= onset_env.max()
-        
-        return onset_env
-
-    def _find_beat_peaks(self, onset_env: np.ndarray, sample_rate: int) -> np.ndarray:
-        """Find peaks in onset envelope that correspond to beats."""
-        min_samples_between_beats = int(60 / 180 * sample_rate / len(onset_env) * 2)
-        return signal.find_peaks(
-            onset_env,
-            distance=min_samples_between_beats,
-            prominence=0.1
-        )[0]
+
+    def _load_cached(self, key: str) -> bool:
+        """Restore analysis results from the cache, returning whether they were found."""
+        entry = self.cache.get(key)
+        if entry is None:
+            return False
+        self.beat_times = entry['beat_times']
+        self.tempo = float(entry['tempo'])
+        self.onset_envelope = entry['onset_envelope'].astype(np.float32)
+        self.beat_frames = None
+        return True
+
+    def _store_cached(self, key: str) -> None:
+        """Save the current analysis results in the cache."""
+        self.cache.put(key, {
+            'beat_times': np.asarray(self.beat_times, dtype=np.float64),
+            'tempo': np.float64(self.tempo),
+            'onset_envelope': np.asarray(self.onset_envelope, dtype=np.float16)
+        })
+
+    def analyze_envelope(self, onset_env: np.ndarray, sample_rate: int, duration: float) -> np.ndarray:
+        """Detect tempo and beats from an onset envelope.
+
+        onset_env is an OnsetAccumulator envelope of a signal at sample_rate,
+        and duration the signal's length in seconds, used for the default
+        beats when no onsets are found. Sets tempo and beat_times.
+        """
+        self.onset_envelope = onset_env
+        frame_rate = sample_rate / HOP_LENGTH
+
+        if len(onset_env) < 2 or onset_env.max() <= 0:
+            logger.warning("No onsets detected, using default beat generation")
+            return self.generate_default_beats(duration)
+
+        self.tempo = self._estimate_tempo(onset_env, frame_rate)
+        self.beat_frames = self._track_beats(onset_env, frame_rate, self.tempo)
+        self.beat_times = self._frames_to_time(self.beat_frames, sample_rate)
+
+        if len(self.beat_times) == 0:
+            logger.warning("No beats detected, using default beat generation")
+            return self.generate_default_beats(duration)
+
+        logger.info(f"Detected tempo: {self.tempo:.2f} BPM")
+        logger.info(f"Found {len(self.beat_times)} beats")
+        return self.beat_times
+
+    def _estimate_tempo(self, onset_env: np.ndarray, frame_rate: float) -> float:
+        """Estimate tempo from the autocorrelation of the onset envelope."""
+        # Light smoothing keeps onsets that straddle two frames from splitting
+        # their energy across neighbouring lags
+        env = np.convolve(onset_env, signal.get_window('hann', 7)[1:-1], mode='same')
+        env -= env.mean()
+        n = len(env)
+        size = 1 << int(2 * n - 1).bit_length()
+        spectrum = np.fft.rfft(env, size)
+        autocorr = np.fft.irfft(spectrum * np.conj(spectrum), size)[:n]
+
+        min_lag = max(1, int(np.floor(60.0 * frame_rate / MAX_BPM)))
+        max_lag = min(n - 2, int(np.ceil(60.0 * frame_rate / MIN_BPM)))
+        if max_lag <= min_lag:
+            return PRIOR_BPM
+
+        lags = np.arange(min_lag, max_lag + 1)
+        bpms = 60.0 * frame_rate / lags
+        # A one-octave log-normal prior settles half/double tempo ambiguity
+        score = autocorr[lags] * np.exp(-0.5 * np.log2(bpms / PRIOR_BPM) ** 2)
+
+        best = int(np.argmax(score))
+        lag = float(lags[best])
+        # Parabolic interpolation around the peak
+        if 0 < best < len(score) - 1:
+            left, center, right = score[best - 1], score[best], score[best + 1]
+            denominator = left - 2 * center + right
+            if denominator != 0:
+                lag += 0.5 * (left - right) / denominator
+        return 60.0 * frame_rate / lag
+
+    def _track_beats(self, onset_env: np.ndarray, frame_rate: float, tempo: float) -> np.ndarray:
+        """Place beats on the onset envelope at the estimated tempo.
+
+        The grid phase is chosen by a comb over all phases on the first
+        PHASE_BEATS periods, where a small tempo error cannot smear the comb.
+        Each beat is then snapped to the strongest onset near its predicted
+        position so the grid follows the music rather than the estimate.
+        """
+        n = len(onset_env)
+        period = 60.0 * frame_rate / tempo
+        if period >= n:
+            return np.array([], dtype=np.float64)
+
+        # Comb score for every integer phase within one period
+        phases = np.arange(int(np.ceil(period)))
+        span = min(n, int(period * PHASE_BEATS))
+        grid = np.rint(phases[:, None] + np.arange(0, span, period)[None, :]).astype(np.int64)
+        valid = grid < n
+        scores = np.where(valid, onset_env[np.minimum(grid, n - 1)], 0).sum(axis=1)
+        position = float(phases[int(np.argmax(scores))])
+
+        radius = max(1, int(round(period * 0.1)))
+        offsets = np.arange(-radius, radius + 1)
+        closeness = np.exp(-0.5 * (offsets / radius) ** 2)
+
+        beats = []
+        while position < n:
+            center = int(round(position))
+            window = np.clip(center + offsets, 0, n - 1)
+            weighted = onset_env[window] * closeness
+            if weighted.max() > 0:
+                center = int(window[int(np.argmax(weighted))])
+            beats.append(center)
+            position = center + period
+        return np.asarray(beats, dtype=np.float64)
+
+    def _frames_to_time(self, frames: np.ndarray, sample_rate: int) -> np.ndarray:
+        """Convert onset frame indices to seconds at the frame centers."""
+        return (frames * HOP_LENGTH + N_FFT / 2) / sample_rate
 
     def get_nearest_beat(self, time_point: float) -> Optional[float]:
         """Get the nearest beat to a given time point."""
@@ -0,0 +1,328 @@
+import collections
+import logging
+import math
+import re
+import subprocess
+import threading
+import cv2
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+from .audio_processor import decode_audio_chunks
+from .content_cache import ContentCache, file_digest
+from .profiler import NullProfiler, StageProfiler
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = (160, 90)  # Grayscale size frames are analyzed at
+HISTOGRAM_BINS = 32
+SCENE_CUT_THRESHOLD = 0.4  # Bhattacharyya distance between sample histograms that counts as a cut
+LOUDNESS_SAMPLE_RATE = 4000  # Audio is resampled to this rate for loudness only
+LOUDNESS_WINDOW = 0.5  # Seconds per loudness value
+LOUDNESS_FLOOR_DB = -90.0
+MOTION_WEIGHT = 0.7  # Share of motion in the activity score when the clip has audio
+# Part of every cache key, so changing the analysis invalidates old entries
+ANALYSIS_VERSION = f'clip-{SAMPLE_SIZE[0]}x{SAMPLE_SIZE[1]}-{HISTOGRAM_BINS}-{SCENE_CUT_THRESHOLD}-2'
+
+_PTS_TIME = re.compile(r'pts_time:\s*(-?[\d.]+(?:e-?\d+)?)')
+
+
+class ClipAnalysis:
+    """Compact activity index of one clip.
+
+    motion and activity are given per sample time, loudness per
+    LOUDNESS_WINDOW. Times are in seconds from the start of the clip.
+    """
+
+    def __init__(
+        self,
+        duration: float,
+        times: np.ndarray,
+        motion: np.ndarray,
+        scene_cuts: np.ndarray,
+        loudness: np.ndarray,
+        loudness_peaks: np.ndarray
+    ):
+        self.duration = duration
+        self.times = times
+        self.motion = motion
+        self.scene_cuts = scene_cuts
+        self.loudness = loudness
+        self.loudness_peaks = loudness_peaks
+        self.activity = self._activity()
+
+    def _activity(self) -> np.ndarray:
+        """Motion, and loudness where there is audio, scaled to [0, 1] at each sample time."""
+        if len(self.times) == 0:
+            return np.zeros(0, dtype=np.float32)
+        motion = self.motion.astype(np.float64)
+        # The difference across a cut is not motion
+        cut_samples = np.isin(self.times, self.scene_cuts)
+        if cut_samples.any() and not cut_samples.all():
+            motion[cut_samples] = np.median(motion[~cut_samples])
+        activity = _scale(motion)
+        if len(self.loudness):
+            window_times = (np.arange(len(self.loudness)) + 0.5) * LOUDNESS_WINDOW
+            loudness = _scale(self.loudness - np.percentile(self.loudness, 10))
+            activity = MOTION_WEIGHT * activity + (1 - MOTION_WEIGHT) * np.interp(self.times, window_times, loudness)
+        return activity.astype(np.float32)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'duration': np.float64(self.duration),
+            'times': self.times.astype(np.float32),
+            'motion': self.motion.astype(np.float32),
+            'scene_cuts': self.scene_cuts.astype(np.float32),
+            'loudness': self.loudness.astype(np.float32),
+            'loudness_peaks': self.loudness_peaks.astype(np.float32)
+        }
+
+    @classmethod
+    def from_arrays(cls, entry: Dict[str, np.ndarray]) -> 'ClipAnalysis':
+        return cls(
+            float(entry['duration']),
+            entry['times'],
+            entry['motion'],
+            entry['scene_cuts'],
+            entry['loudness'],
+            entry['loudness_peaks']
+        )
+
+    def summary(self) -> Dict:
+        """Human-readable overview, useful for logging and inspection."""
+        return {
+            'duration': self.duration,
+            'samples': len(self.times),
+            'scene_cuts': [round(float(t), 2) for t in self.scene_cuts],
+            'loudness_peaks': len(self.loudness_peaks),
+            'mean_activity': float(self.activity.mean()) if len(self.activity) else 0.0
+        }
+
+
+def _scale(values: np.ndarray) -> np.ndarray:
+    """Scale to [0, 1] by the 95th percentile, so a few outliers do not flatten the rest."""
+    top = np.percentile(values, 95) if len(values) else 0.0
+    if top <= 0:
+        return np.zeros(len(values), dtype=np.float64)
+    return np.clip(values / top, 0.0, 1.0)
+
+
+class ClipAnalyzer:
+    """Build ClipAnalysis indexes without decoding whole clips in Python.
+
+    Frames are sampled at keyframes only: FFmpeg skips decoding everything
+    in between, and encoders place keyframes at scene changes anyway. Where
+    keyframes are further apart than max_keyframe_gap, extra samples fill
+    the gap, each taken by seeking to its time, so only the frames from the
+    keyframe before it up to it are decoded. Python only ever sees small
+    grayscale frames. Results are cached by content hash.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[ContentCache] = None,
+        sample_interval: float = 0.5,
+        max_keyframe_gap: float = 2.0
+    ):
+        self.cache = cache
+        self.sample_interval = sample_interval
+        self.max_keyframe_gap = max_keyframe_gap
+        self.profiler: StageProfiler = NullProfiler()
+
+    def analyze(self, video_path: str) -> Optional[ClipAnalysis]:
+        """Analysis of a clip, or None when it could not be analyzed."""
+        try:
+            cache_key = None
+            if self.cache is not None:
+                cache_key = (f"{file_digest(video_path)}-{ANALYSIS_VERSION}-"
+                             f"{self.sample_interval:g}-{self.max_keyframe_gap:g}")
+                entry = self.cache.get(cache_key)
+                if entry is not None:
+                    return ClipAnalysis.from_arrays(entry)
+
+            with self.profiler.stage('clip_analysis'):
+                analysis = self._analyze(video_path)
+            logger.info(f"Analyzed {video_path}: {analysis.summary()}")
+            if cache_key is not None:
+                self.cache.put(cache_key, analysis.to_arrays())
+            return analysis
+
+        except Exception as e:
+            logger.error(f"Error analyzing clip {video_path}: {str(e)}")
+            return None
+
+    def _analyze(self, video_path: str) -> ClipAnalysis:
+        cap = cv2.VideoCapture(video_path)
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps if fps else 0.0
+        finally:
+            cap.release()
+
+        samples = [(time, frame.copy()) for time, frame in self._sample_keyframes(video_path)]
+        fills = self._fill_plan([time for time, _ in samples], duration)
+        if fills:
+            logger.debug(f"Keyframes of {video_path} too sparse, filling {len(fills)} gaps")
+            for start, first, count in fills:
+                samples.extend(self._sample_gap(video_path, start, first, count))
+            samples.sort(key=lambda sample: sample[0])
+        times, motion, cuts = self._analyze_frames(samples)
+
+        loudness = self._loudness(video_path)
+        peaks = np.zeros(0, dtype=np.float32)
+        if len(loudness) >= 3:
+            # Local maxima in the loudest tenth
+            inner = loudness[1:-1]
+            is_peak = (inner > loudness[:-2]) & (inner >= loudness[2:]) & (inner >= np.percentile(loudness, 90))
+            peaks = ((np.flatnonzero(is_peak) + 1.5) * LOUDNESS_WINDOW).astype(np.float32)
+
+        return ClipAnalysis(duration, times, motion, cuts, loudness, peaks)
+
+    def _fill_plan(self, keyframe_times: List[float], duration: float) -> List[Tuple[float, float, int]]:
+        """(keyframe time, offset of the first sample, sample count) of each keyframe gap to fill.
+
+        Samples follow a keyframe every max_keyframe_gap, up to half a gap
+        before the next one, so only the start of a long gap is decoded.
+        """
+        step = self.max_keyframe_gap
+        starts = [t for t in keyframe_times if t < duration]
+        first = step
+        # Without a keyframe at the start, its first frame is sampled too
+        if not starts or starts[0] > step / 2:
+            starts.insert(0, 0.0)
+            first = 0.0
+        plan = []
+        for i, (low, high) in enumerate(zip(starts, starts[1:] + [duration])):
+            offset = first if i == 0 else step
+            count = max(0, math.floor((high - low - offset - step / 2) / step) + 1)
+            if count:
+                plan.append((low, offset, count))
+        return plan
+
+    def _sample_gap(self, video_path: str, start: float, first: float, count: int) -> List[Tuple[float, np.ndarray]]:
+        """count grayscale samples max_keyframe_gap apart, the first one first seconds after start.
+
+        FFmpeg seeks to the keyframe at start and stops decoding after the
+        last sample.
+        """
+        width, height = SAMPLE_SIZE
+        step = self.max_keyframe_gap
+        select = (f"gte(t,{first - 1e-3:.3f})"
+                  f"*(isnan(prev_selected_t)+gte(t-prev_selected_t,{step - 1e-3:.3f}))")
+        result = subprocess.run([
+            'ffmpeg', '-loglevel', 'error', '-nostdin',
+            '-ss', f'{start:.3f}',
+            '-i', video_path,
+            '-map', '0:v:0',
+            '-vf', f"select='{select}',scale={width}:{height}:flags=area,format=gray",
+            '-fps_mode', 'passthrough',
+            '-frames:v', str(count),
+            '-f', 'rawvideo', '-'
+        ], stdin=subprocess.DEVNULL, capture_output=True, timeout=300)
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg sampling of {video_path} failed: {result.stderr.decode(errors='replace')}")
+        frames = np.frombuffer(result.stdout, dtype=np.uint8)
+        frames = frames[:len(frames) // (width * height) * width * height].reshape(-1, height, width)
+        return [(start + first + i * step, frame) for i, frame in enumerate(frames)]
+
+    def _analyze_frames(self, samples: List[Tuple[float, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(sample times, motion, scene cut times) from time-ordered grayscale samples."""
+        times: List[float] = []
+        motion: List[float] = []
+        cuts: List[float] = []
+        previous = previous_hist = None
+        for time, frame in samples:
+            # Keep dense keyframes, as in intra-only clips, to the sample interval
+            if times and time - times[-1] < self.sample_interval / 2:
+                continue
+            hist = cv2.calcHist([frame], [0], None, [HISTOGRAM_BINS], [0, 256])
+            cv2.normalize(hist, hist)
+            if previous is None:
+                motion.append(0.0)
+            else:
+                motion.append(float(cv2.absdiff(frame, previous).mean()) / 255.0)
+                if cv2.compareHist(previous_hist, hist, cv2.HISTCMP_BHATTACHARYYA) > SCENE_CUT_THRESHOLD:
+                    cuts.append(time)
+            times.append(time)
+            previous, previous_hist = frame, hist
+        return (
+            np.asarray(times, dtype=np.float32),
+            np.asarray(motion, dtype=np.float32),
+            np.asarray(cuts, dtype=np.float32)
+        )
+
+    def _sample_keyframes(self, video_path: str) -> Iterator[Tuple[float, np.ndarray]]:
+        """Yield (time, grayscale frame) for each keyframe, decoded and shrunk by FFmpeg.
+
+        Frame times come from the showinfo filter on stderr.
+        """
+        width, height = SAMPLE_SIZE
+        cmd = [
+            'ffmpeg', '-loglevel', 'info', '-nostdin',
+            '-skip_frame', 'nokey',
+            '-i', video_path,
+            '-map', '0:v:0',
+            '-vf', f'scale={width}:{height}:flags=area,format=gray,showinfo',
+            '-fps_mode', 'passthrough',
+            '-f', 'rawvideo', '-'
+        ]
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        pts_times: List[float] = []
+        stderr_tail = collections.deque(maxlen=20)
+        frame_times = threading.Condition()
+
+        def read_stderr() -> None:
+            for raw in process.stderr:
+                line = raw.decode(errors='replace')
+                match = _PTS_TIME.search(line) if 'showinfo' in line else None
+                with frame_times:
+                    if match:
+                        pts_times.append(float(match.group(1)))
+                    else:
+                        stderr_tail.append(line.rstrip())
+                    frame_times.notify_all()
+            with frame_times:
+                pts_times.append(None)
+                frame_times.notify_all()
+
+        reader = threading.Thread(target=read_stderr, daemon=True)
+        reader.start()
+        frame = np.empty((height, width), dtype=np.uint8)
+        try:
+            index = 0
+            while process.stdout.readinto(memoryview(frame).cast('B')) == frame.size:
+                with frame_times:
+                    # showinfo logs a frame before FFmpeg writes it out
+                    frame_times.wait_for(lambda: len(pts_times) > index)
+                    time = pts_times[index]
+                if time is None:
+                    break
+                yield time, frame
+                index += 1
+            if process.wait() != 0:
+                reader.join()
+                raise RuntimeError(f"FFmpeg sampling of {video_path} failed: {' '.join(stderr_tail)}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            reader.join()
+
+    @staticmethod
+    def _loudness(video_path: str) -> np.ndarray:
+        """RMS loudness in dB per LOUDNESS_WINDOW, empty for clips without audio."""
+        window = int(LOUDNESS_SAMPLE_RATE * LOUDNESS_WINDOW)
+        energy: List[float] = []
+        carry = np.zeros(0, dtype=np.float32)
+        try:
+            for chunk in decode_audio_chunks(video_path, LOUDNESS_SAMPLE_RATE):
+                samples = np.concatenate([carry, chunk])
+                whole = len(samples) // window * window
+                energy.extend(np.mean(np.square(samples[:whole].reshape(-1, window)), axis=1))
+                carry = samples[whole:]
+        except RuntimeError:
+            # Clips without an audio track have nothing to decode
+            return np.zeros(0, dtype=np.float32)
+        if not energy:
+            return np.zeros(0, dtype=np.float32)
+        loudness = 10 * np.log10(np.maximum(np.asarray(energy), 1e-12))
+        return np.maximum(loudness, LOUDNESS_FLOOR_DB).astype(np.float32)
@@ -0,0 +1,140 @@
+import os
+import io
+import hashlib
+import logging
+import tempfile
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+Arrays = Dict[str, np.ndarray]
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's content, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def evict_lru_files(directory: str, suffix: str, max_bytes: int) -> None:
+    """Delete least recently used files until those ending in suffix fit max_bytes."""
+    entries = []
+    total = 0
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(suffix):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        logger.debug(f"Evicted cache entry {path}")
+        if total <= max_bytes:
+            break
+
+
+class ContentCache:
+    """Two-tier cache of numpy arrays keyed by content hash.
+
+    An in-process LRU holds the most recent entries. Behind it, every entry
+    is stored on disk as an uncompressed .npz file, which can be shared by
+    worker processes. When the disk tier grows past max_bytes, the least
+    recently used files are evicted.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_entries: int = 64,
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: 'OrderedDict[str, Arrays]' = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key: str) -> Optional[Arrays]:
+        """Return the arrays stored under key, or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = {name: data[name] for name in data.files}
+            os.utime(path)  # mark as recently used for eviction
+        except (FileNotFoundError, OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: Arrays) -> None:
+        """Store arrays under key in both tiers."""
+        with self._lock:
+            self._remember(key, entry)
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **entry)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(buffer.getbuffer())
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {key}: {str(e)}")
+            return
+        self._evict_disk()
+
+    def _remember(self, key: str, entry: Arrays) -> None:
+        """Insert into the LRU tier; caller holds the lock."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        """Delete least recently used files until the disk tier fits max_bytes."""
+        evict_lru_files(self.directory, '.npz', self.max_bytes)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters."""
+        return {
+            'hits': self.hits,
+            'memory_hits': self.hits - self.disk_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_entries': len(self._memory)
+        }
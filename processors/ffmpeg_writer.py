@@ -0,0 +1,303 @@
+import collections
+import logging
+import os
+import subprocess
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+def rendition_path(path: str, quality: Optional[str]) -> str:
+    """Path of a rendition next to the main output; quality None is the main output."""
+    if quality is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}_{quality}{ext}'
+
+
+def hls_options(playlist_path: str, segment_seconds: float) -> List[str]:
+    """Options writing a growing HLS event playlist that players can open mid-render.
+
+    Keyframes are forced at every segment boundary so segments have the
+    requested length.
+    """
+    segment_pattern = os.path.join(os.path.dirname(playlist_path), 'segment_%04d.ts')
+    return [
+        '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+        '-f', 'hls',
+        '-hls_time', f'{segment_seconds}',
+        '-hls_list_size', '0',
+        '-hls_playlist_type', 'event',
+        '-hls_segment_filename', segment_pattern
+    ]
+
+
+def container_options(path: str) -> List[str]:
+    """Muxer options for an output file.
+
+    MP4 and MOV outputs are written with the moov atom first, so players can
+    start streaming them before the whole file has been downloaded.
+    """
+    if os.path.splitext(path)[1].lower() in ('.mp4', '.mov'):
+        return ['-movflags', '+faststart']
+    return []
+
+
+def encoder_options(crf: Optional[int] = None, maxrate: Optional[str] = None) -> List[str]:
+    """Rate control options: constant quality, optionally capped at maxrate."""
+    options = []
+    if crf is not None:
+        options += ['-crf', str(crf)]
+    if maxrate:
+        # One second of buffer keeps the cap close to the nominal bitrate
+        options += ['-maxrate', maxrate, '-bufsize', maxrate]
+    return options
+
+
+class FFmpegWriter:
+    """Stream raw BGR frames into a single FFmpeg encode/mux process.
+
+    Frames are written to FFmpeg's stdin as rawvideo. A blocking pipe write
+    provides backpressure when the encoder falls behind, and any FFmpeg
+    failure is raised from write() or release() with its stderr output.
+
+    output_options are extra FFmpeg options for the main output, such as a
+    muxer. renditions adds further outputs from the same frames, each a dict
+    with path, width, height, fps and encoder settings. FFmpeg splits the input
+    and scales or drops frames for each one, so frames are produced once.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        width: int,
+        height: int,
+        fps: float,
+        audio_path: Optional[str] = None,
+        codec: str = 'libx264',
+        preset: str = 'ultrafast',
+        crf: Optional[int] = None,
+        maxrate: Optional[str] = None,
+        renditions: Optional[List[Dict]] = None,
+        output_options: Optional[List[str]] = None
+    ):
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.audio_path = audio_path
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.maxrate = maxrate
+        self.renditions = renditions or []
+        self.output_options = output_options or []
+        self.frames_written = 0
+        self.ended = False
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr_tail = collections.deque(maxlen=50)
+        self._stderr_thread: Optional[threading.Thread] = None
+
+    def _build_command(self) -> List[str]:
+        """Build the FFmpeg command line."""
+        cmd = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'bgr24',
+            '-s', f'{self.width}x{self.height}',
+            '-r', f'{self.fps}',
+            '-i', '-'
+        ]
+        if self.audio_path:
+            cmd += ['-i', self.audio_path]
+
+        video_maps = ['0:v:0']
+        if self.renditions:
+            cmd += ['-filter_complex', self._rendition_graph()]
+            video_maps = ['[main]'] + [f'[out{i}]' for i in range(len(self.renditions))]
+
+        outputs = [{
+            'path': self.output_path,
+            'encoder': {'codec': self.codec, 'preset': self.preset, 'crf': self.crf, 'maxrate': self.maxrate},
+            'options': self.output_options
+        }] + self.renditions
+        for video_map, output in zip(video_maps, outputs):
+            encoder = output['encoder']
+            cmd += ['-map', video_map]
+            if self.audio_path:
+                cmd += ['-map', '1:a:0', '-c:a', 'aac', '-shortest']
+            cmd += ['-c:v', encoder['codec'], '-preset', encoder['preset'], '-pix_fmt', 'yuv420p']
+            cmd += encoder_options(encoder.get('crf'), encoder.get('maxrate'))
+            cmd += output.get('options', []) + container_options(output['path'])
+            cmd.append(output['path'])
+        return cmd
+
+    def _rendition_graph(self) -> str:
+        """Filter graph splitting the input into the main output and each rendition."""
+        labels = ''.join(f'[split{i}]' for i in range(len(self.renditions)))
+        graph = [f'[0:v]split={len(self.renditions) + 1}[main]{labels}']
+        for i, rendition in enumerate(self.renditions):
+            filters = []
+            if rendition['fps'] < self.fps:
+                filters.append(f"fps={rendition['fps']}")
+            if (rendition['width'], rendition['height']) != (self.width, self.height):
+                filters.append(f"scale={rendition['width']}:{rendition['height']}")
+            graph.append(f"[split{i}]{','.join(filters) or 'null'}[out{i}]")
+        return ';'.join(graph)
+
+    def open(self) -> 'FFmpegWriter':
+        """Start the FFmpeg process."""
+        cmd = self._build_command()
+        logger.debug(f"Starting encoder: {' '.join(cmd)}")
+        self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+        return self
+
+    def _drain_stderr(self) -> None:
+        """Keep the tail of FFmpeg's stderr so it can be reported on failure."""
+        for line in self._process.stderr:
+            self._stderr_tail.append(line.decode(errors='replace').rstrip())
+
+    def _error(self, message: str) -> RuntimeError:
+        """Build an exception carrying FFmpeg's last stderr lines."""
+        if self._stderr_thread is not None:
+            self._stderr_thread.join(timeout=1)
+        details = '\n'.join(self._stderr_tail)
+        return RuntimeError(f"{message}: {details}" if details else message)
+
+    def isOpened(self) -> bool:
+        """Check whether the encoder process is running."""
+        return self._process is not None and self._process.poll() is None
+
+    def write(self, frame: np.ndarray) -> None:
+        """Send one frame to the encoder, blocking while its pipe is full."""
+        if self._process is None:
+            raise RuntimeError("Writer has not been opened")
+        if frame.shape != (self.height, self.width, 3) or frame.dtype != np.uint8:
+            raise ValueError(
+                f"Expected {self.width}x{self.height} BGR frame, got {frame.shape} {frame.dtype}"
+            )
+        if self.ended:
+            return
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame).data)
+        except (BrokenPipeError, ValueError):
+            self._process.wait()
+            if self._process.returncode == 0 and self.audio_path:
+                # -shortest finished the file when the music ran out
+                logger.debug(f"Audio ended after {self.frames_written} frames, dropping the rest")
+                self.ended = True
+                return
+            raise self._error(f"FFmpeg exited with code {self._process.returncode}")
+        self.frames_written += 1
+
+    def release(self) -> None:
+        """Flush remaining frames and wait for FFmpeg to finish the file."""
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        try:
+            process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+        process.wait()
+        if process.returncode != 0:
+            raise self._error(f"FFmpeg exited with code {process.returncode}")
+        logger.debug(f"Encoded {self.frames_written} frames to {self.output_path}")
+
+    def abort(self) -> None:
+        """Stop FFmpeg without finishing the output file."""
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        process.kill()
+        try:
+            process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        process.wait()
+
+    def __enter__(self) -> 'FFmpegWriter':
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.release()
+        else:
+            self.abort()
+
+
+def concat_segments(
+    segment_paths: List[str],
+    output_path: str,
+    audio_path: Optional[str] = None
+) -> None:
+    """Join encoded segments with the concat demuxer, copying the video stream."""
+    list_path = f"{output_path}.concat.txt"
+    with open(list_path, 'w') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'concat', '-safe', '0',
+        '-i', list_path
+    ]
+    if audio_path:
+        cmd += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'aac', '-shortest']
+    cmd += ['-c:v', 'copy'] + container_options(output_path) + [output_path]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"FFmpeg concat failed: {result.stderr.decode(errors='replace').strip()}"
+            )
+        logger.debug(f"Joined {len(segment_paths)} segments into {output_path}")
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+
+def transcode(
+    input_path: str,
+    output_path: str,
+    width: int,
+    height: int,
+    codec: str = 'libx264',
+    preset: str = 'ultrafast',
+    crf: Optional[int] = None,
+    maxrate: Optional[str] = None,
+    fps: Optional[float] = None
+) -> None:
+    """Re-encode a finished video at a new size and rate, copying its audio.
+
+    fps, if given, is a lower frame rate to drop the video to.
+    """
+    filters = [f'fps={fps}'] if fps else []
+    filters.append(f'scale={width}:{height}')
+    cmd = [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-i', input_path,
+        '-map', '0:v:0', '-map', '0:a?',
+        '-vf', ','.join(filters),
+        '-c:v', codec, '-preset', preset, '-pix_fmt', 'yuv420p'
+    ]
+    cmd += encoder_options(crf, maxrate)
+    cmd += ['-c:a', 'copy'] + container_options(output_path) + [output_path]
+
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"FFmpeg transcode failed: {result.stderr.decode(errors='replace').strip()}"
+        )
+    logger.debug(f"Transcoded {input_path} to {output_path} at {width}x{height}"
+                 + (f" and {fps} fps" if fps else ""))
@@ -0,0 +1,433 @@
+import cv2
+import math
+import logging
+import numpy as np
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Part of the key of every cached filtered output, so bump it whenever a
+# change here alters what any filter renders
+FILTER_ENGINE_VERSION = 2
+
+Shape = Tuple[int, ...]
+
+class LutStage:
+    """Per-channel 256-entry lookup table applied with cv2.LUT."""
+
+    def __init__(self, table: np.ndarray):
+        # (256, 1, 3) uint8, one column per BGR channel
+        self.table = table
+
+    @classmethod
+    def from_function(cls, func: Callable[[np.ndarray], np.ndarray]) -> 'LutStage':
+        """Tabulate func over 0..255 for each channel.
+
+        func receives a (256, 3) float array and returns values of the same shape.
+        """
+        values = np.repeat(np.arange(256, dtype=np.float64)[:, None], 3, axis=1)
+        table = np.clip(np.rint(func(values)), 0, 255).astype(np.uint8)
+        return cls(table.reshape(256, 1, 3))
+
+    def is_identity(self) -> bool:
+        """Whether the table maps every value to itself."""
+        return bool(np.all(self.table == np.arange(256, dtype=np.uint8)[:, None, None]))
+
+    def then(self, other: 'LutStage') -> 'LutStage':
+        """Fuse with a following table so both run in a single lookup."""
+        fused = np.empty_like(self.table)
+        for channel in range(3):
+            fused[:, 0, channel] = other.table[self.table[:, 0, channel], 0, channel]
+        return LutStage(fused)
+
+    def apply(self, src: np.ndarray, dst: np.ndarray, buffers: Dict[str, np.ndarray]) -> None:
+        cv2.LUT(src, self.table, dst=dst)
+
+
+class SaturationStage:
+    """Scale HSV saturation without leaving BGR space.
+
+    With hue and value held fixed every channel is affine in saturation, so
+    scaling S by s is c' = s * c + (1 - s) * max(b, g, r).
+    """
+
+    def __init__(self, saturation: float):
+        self.saturation = saturation
+
+    def apply(self, src: np.ndarray, dst: np.ndarray, buffers: Dict[str, np.ndarray]) -> None:
+        value = buffers['gray']
+        value3 = buffers['bgr']
+        # Pairwise maximum over channel views; np.max(axis=2) is far slower on uint8
+        np.maximum(src[..., 0], src[..., 1], out=value)
+        np.maximum(value, src[..., 2], out=value)
+        cv2.cvtColor(value, cv2.COLOR_GRAY2BGR, dst=value3)
+        cv2.addWeighted(src, self.saturation, value3, 1.0 - self.saturation, 0, dst=dst)
+
+
+class ContrastSaturationStage:
+    """A gain and offset followed by SaturationStage, in one weighted sum.
+
+    For gain > 0 and offset >= 0 the gain is monotonic, so the brightest
+    channel stays the brightest, and the whole map is
+    c' = gain * (s * c + (1 - s) * max(b, g, r)) + offset. The gain clips
+    at 255 before the saturation is applied, so inputs are first clamped at
+    the first value that reaches 255, where clipping would start.
+    """
+
+    def __init__(self, gain: float, offset: float, saturation: float):
+        self.gain = gain
+        self.offset = offset
+        self.saturation = saturation
+        self.limit = min(255, math.ceil((255 - offset) / gain))
+
+    def apply(self, src: np.ndarray, dst: np.ndarray, buffers: Dict[str, np.ndarray]) -> None:
+        value = buffers['gray']
+        value3 = buffers['bgr']
+        if self.limit < 255:
+            cv2.min(src, (self.limit, self.limit, self.limit, 0), dst=dst)
+            src = dst
+        np.maximum(src[..., 0], src[..., 1], out=value)
+        np.maximum(value, src[..., 2], out=value)
+        cv2.cvtColor(value, cv2.COLOR_GRAY2BGR, dst=value3)
+        cv2.addWeighted(src, self.gain * self.saturation, value3, self.gain * (1.0 - self.saturation),
+                        self.offset, dst=dst)
+
+
+class ColorMatrixStage:
+    """3x3 BGR color matrix applied with cv2.transform."""
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = np.asarray(matrix, dtype=np.float32)
+
+    def apply(self, src: np.ndarray, dst: np.ndarray, buffers: Dict[str, np.ndarray]) -> None:
+        cv2.transform(src, self.matrix, dst=dst)
+
+
+class GrainStage:
+    """Film grain drawn from a pre-generated noise texture.
+
+    One signed noise texture slightly larger than the frame is generated per
+    resolution and split into positive and negative parts. Each frame adds a
+    crop at the next offset from a fixed offset pool, so no random numbers are
+    drawn per frame.
+    """
+
+    PADDING = 64
+    POOL_SIZE = 16
+
+    def __init__(self, amount: float, seed: int = 0):
+        self.amount = amount
+        self.seed = seed
+        self._textures: Dict[Shape, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._counter = 0
+
+    def _get_texture(self, shape: Shape) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        texture = self._textures.get(shape)
+        if texture is None:
+            rng = np.random.default_rng(self.seed)
+            height, width = shape[:2]
+            noise = rng.normal(0.0, 32.0 * self.amount,
+                               size=(height + self.PADDING, width + self.PADDING))
+            noise = np.clip(np.rint(noise), -255, 255)
+            positive = cv2.cvtColor(np.maximum(noise, 0).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+            negative = cv2.cvtColor(np.maximum(-noise, 0).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+            offsets = rng.integers(0, self.PADDING + 1, size=(self.POOL_SIZE, 2))
+            texture = (positive, negative, offsets)
+            self._textures[shape] = texture
+        return texture
+
+    def preview_stage(self) -> None:
+        """Grain is not visible at preview sizes, so previews skip it."""
+        return None
+
+    def apply(self, src: np.ndarray, dst: np.ndarray, buffers: Dict[str, np.ndarray]) -> None:
+        positive, negative, offsets = self._get_texture(src.shape)
+        height, width = src.shape[:2]
+        y, x = offsets[self._counter % len(offsets)]
+        self._counter += 1
+        cv2.add(src, positive[y:y + height, x:x + width], dst=dst)
+        cv2.subtract(dst, negative[y:y + height, x:x + width], dst=dst)
+
+
+class MaskStage:
+    """Multiply by a per-resolution mask that is built once and cached."""
+
+    def __init__(self, builder: Callable[[int, int], np.ndarray]):
+        # builder(height, width) returns a float mask in [0, 1]
+        self.builder = builder
+        self._masks: Dict[Shape, np.ndarray] = {}
+
+    def _get_mask(self, shape: Shape) -> np.ndarray:
+        mask = self._masks.get(shape)
+        if mask is None:
+            weights = self.builder(shape[0], shape[1])
+            mask = cv2.cvtColor(np.clip(np.rint(weights * 255), 0, 255).astype(np.uint8),
+                                cv2.COLOR_GRAY2BGR)
+            self._masks[shape] = mask
+        return mask
+
+    def apply(self, src: np.ndarray, dst: np.ndarray, buffers: Dict[str, np.ndarray]) -> None:
+        cv2.multiply(src, self._get_mask(src.shape), dst=dst, scale=1.0 / 255)
+
+
+class OverlayStage:
+    """Blend with a per-resolution overlay image that is built once and cached."""
+
+    def __init__(self, builder: Callable[[int, int], np.ndarray], opacity: float):
+        # builder(height, width) returns a uint8 BGR image
+        self.builder = builder
+        self.opacity = opacity
+        self._overlays: Dict[Shape, np.ndarray] = {}
+
+    def apply(self, src: np.ndarray, dst: np.ndarray, buffers: Dict[str, np.ndarray]) -> None:
+        overlay = self._overlays.get(src.shape)
+        if overlay is None:
+            overlay = self.builder(src.shape[0], src.shape[1])
+            self._overlays[src.shape] = overlay
+        cv2.addWeighted(src, 1.0 - self.opacity, overlay, self.opacity, 0, dst=dst)
+
+
+class PyramidBlurStage:
+    """Blend a frame with a blurred copy computed on a downscaled pyramid level.
+
+    The blur runs at 1/2**levels resolution and is scaled back up, which is far
+    cheaper than a wide Gaussian at full size. The result is
+    src_weight * src + blur_weight * blurred.
+    """
+
+    def __init__(self, levels: int, sigma: float, src_weight: float, blur_weight: float):
+        self.levels = levels
+        self.sigma = sigma
+        self.src_weight = src_weight
+        self.blur_weight = blur_weight
+        self._pyramids: Dict[Shape, List[np.ndarray]] = {}
+
+    def _get_pyramid(self, shape: Shape) -> List[np.ndarray]:
+        pyramid = self._pyramids.get(shape)
+        if pyramid is None:
+            pyramid = []
+            height, width = shape[:2]
+            for _ in range(self.levels):
+                height, width = (height + 1) // 2, (width + 1) // 2
+                pyramid.append(np.empty((height, width, 3), dtype=np.uint8))
+            self._pyramids[shape] = pyramid
+        return pyramid
+
+    def preview_stage(self) -> LutStage:
+        """Approximate the blend as if the blurred copy equalled the frame.
+
+        That keeps the overall brightness of glow and is an identity for the
+        sharpen and soften blends, which fuses away with neighbouring tables.
+        """
+        gain = self.src_weight + self.blur_weight
+        return LutStage.from_function(lambda x: x * gain)
+
+    def apply(self, src: np.ndarray, dst: np.ndarray, buffers: Dict[str, np.ndarray]) -> None:
+        pyramid = self._get_pyramid(src.shape)
+        level = src
+        for small in pyramid:
+            cv2.pyrDown(level, dst=small, dstsize=(small.shape[1], small.shape[0]))
+            level = small
+        if self.sigma > 0:
+            cv2.GaussianBlur(level, (0, 0), self.sigma, dst=level)
+        blurred = buffers['bgr']
+        cv2.resize(level, (src.shape[1], src.shape[0]), dst=blurred, interpolation=cv2.INTER_LINEAR)
+        cv2.addWeighted(src, self.src_weight, blurred, self.blur_weight, 0, dst=dst)
+
+
+def _channel_offset(offsets: Sequence[float], intensity: float) -> LutStage:
+    """Equivalent of cv2.addWeighted(frame, 1.0, constant_layer, intensity, 0)."""
+    shift = np.asarray(offsets, dtype=np.float64) * intensity
+    return LutStage.from_function(lambda x: x + shift)
+
+
+def _vignette_mask(amount: float) -> Callable[[int, int], np.ndarray]:
+    def build(height: int, width: int) -> np.ndarray:
+        y = np.linspace(-1.0, 1.0, height)[:, None]
+        x = np.linspace(-1.0, 1.0, width)[None, :]
+        radius = (x ** 2 + y ** 2) / 2.0
+        return 1.0 - amount * radius
+    return build
+
+
+def _gradient_overlay(colors: Sequence[Sequence[int]]) -> Callable[[int, int], np.ndarray]:
+    def build(height: int, width: int) -> np.ndarray:
+        top = np.asarray(colors[0], dtype=np.float32)
+        bottom = np.asarray(colors[-1], dtype=np.float32)
+        t = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None]
+        column = np.rint(top * (1.0 - t) + bottom * t).astype(np.uint8)
+        return np.ascontiguousarray(np.broadcast_to(column[:, None, :], (height, width, 3)))
+    return build
+
+
+def _build_warm(settings: Dict[str, Any]) -> List:
+    return [_channel_offset([20, 40, 115], settings.get('intensity', 0.4))]
+
+
+def _build_cool(settings: Dict[str, Any]) -> List:
+    return [_channel_offset([128, 60, 20], settings.get('intensity', 0.4))]
+
+
+def _build_cinematic(settings: Dict[str, Any]) -> List:
+    contrast = settings.get('contrast', 1.2)
+    if contrast > 0:
+        return [ContrastSaturationStage(contrast, 10, settings.get('saturation', 0.85))]
+    return [
+        # Same as cv2.convertScaleAbs(frame, alpha=contrast, beta=10)
+        LutStage.from_function(lambda x: np.abs(x * contrast + 10)),
+        SaturationStage(settings.get('saturation', 0.85))
+    ]
+
+
+# Classic sepia weights, rows and columns in BGR order
+SEPIA_MATRIX = np.array([
+    [0.131, 0.534, 0.272],
+    [0.168, 0.686, 0.349],
+    [0.189, 0.769, 0.393]
+])
+
+
+def _build_sepia(settings: Dict[str, Any]) -> List:
+    intensity = settings.get('intensity', 0.5)
+    return [ColorMatrixStage((1.0 - intensity) * np.eye(3) + intensity * SEPIA_MATRIX)]
+
+
+def _build_grain(settings: Dict[str, Any]) -> List:
+    return [GrainStage(settings.get('amount', 0.3))]
+
+
+def _build_vignette(settings: Dict[str, Any]) -> List:
+    return [MaskStage(_vignette_mask(settings.get('amount', 0.4)))]
+
+
+def _build_vibrant(settings: Dict[str, Any]) -> List:
+    return [SaturationStage(settings.get('saturation', 1.4))]
+
+
+def _build_glow(settings: Dict[str, Any]) -> List:
+    # Two pyramid levels shrink the blur radius by 4x
+    sigma = settings.get('radius', 10) / 4.0
+    return [PyramidBlurStage(2, sigma, 1.0, settings.get('intensity', 0.3))]
+
+
+def _build_contrast(settings: Dict[str, Any]) -> List:
+    amount = settings.get('amount', 1.3)
+    return [LutStage.from_function(lambda x: (x - 128.0) * amount + 128.0)]
+
+
+def _build_clean(settings: Dict[str, Any]) -> List:
+    # Unsharp mask: sharpness * src - (sharpness - 1) * blurred
+    sharpness = settings.get('sharpness', 1.1)
+    return [PyramidBlurStage(1, 0.0, sharpness, 1.0 - sharpness)]
+
+
+def _build_soft(settings: Dict[str, Any]) -> List:
+    blur = settings.get('blur', 0.2)
+    return [PyramidBlurStage(2, 1.0, 1.0 - blur, blur)]
+
+
+def _build_gradient(settings: Dict[str, Any]) -> List:
+    colors = settings.get('colors', [(255, 200, 100), (100, 150, 255)])
+    return [OverlayStage(_gradient_overlay(colors), settings.get('intensity', 0.15))]
+
+
+# Filter name -> builder returning the stages for its settings
+FILTER_BUILDERS: Dict[str, Callable[[Dict[str, Any]], List]] = {
+    'warm': _build_warm,
+    'cool': _build_cool,
+    'cinematic': _build_cinematic,
+    'sepia': _build_sepia,
+    'grain': _build_grain,
+    'vignette': _build_vignette,
+    'vibrant': _build_vibrant,
+    'glow': _build_glow,
+    'contrast': _build_contrast,
+    'clean': _build_clean,
+    'soft': _build_soft,
+    'gradient': _build_gradient
+}
+
+
+class CompiledFilter:
+    """A filter chain reduced to a short list of stages with reusable buffers."""
+
+    def __init__(self, chain: Tuple[str, ...], stages: List):
+        self.chain = chain
+        self.stages = stages
+        self._buffers: Dict[Shape, Dict[str, np.ndarray]] = {}
+
+    def _get_buffers(self, shape: Shape) -> Dict[str, np.ndarray]:
+        """Scratch and output buffers for a frame shape, allocated once."""
+        buffers = self._buffers.get(shape)
+        if buffers is None:
+            buffers = {
+                'out': np.empty(shape, dtype=np.uint8),
+                'bgr': np.empty(shape, dtype=np.uint8),
+                'gray': np.empty(shape[:2], dtype=np.uint8)
+            }
+            self._buffers[shape] = buffers
+        return buffers
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """Run the chain over a frame.
+
+        The returned array is owned by this filter and is overwritten by the
+        next call with a frame of the same shape.
+        """
+        if not self.stages:
+            return frame
+        buffers = self._get_buffers(frame.shape)
+        out = buffers['out']
+        src = frame
+        for stage in self.stages:
+            stage.apply(src, out, buffers)
+            src = out
+        return out
+
+
+class FilterEngine:
+    """Compile named filter chains from config.FILTERS into fused stages once.
+
+    With preview set, stages that provide a preview_stage() are replaced by
+    that cheaper approximation, or dropped when it returns None.
+    """
+
+    def __init__(self, filters_config: Optional[Dict[str, Dict[str, Any]]] = None, preview: bool = False):
+        self.filters_config = filters_config or {}
+        self.preview = preview
+        self._compiled: Dict[Tuple[str, ...], CompiledFilter] = {}
+
+    def compile(self, chain: Sequence[str]) -> CompiledFilter:
+        """Return the compiled form of a chain, building it on first use."""
+        key = tuple(chain)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = CompiledFilter(key, self._build_stages(key))
+            self._compiled[key] = compiled
+            logger.debug(f"Compiled filter chain {key} into {len(compiled.stages)} stages")
+        return compiled
+
+    def _build_stages(self, chain: Tuple[str, ...]) -> List:
+        stages = []
+        for name in chain:
+            builder = FILTER_BUILDERS.get(name)
+            settings = self.filters_config.get(name, {})
+            if builder is None or not settings.get('enabled', True):
+                logger.debug(f"Filter {name} is not available, skipping")
+                continue
+            for stage in builder(settings):
+                if self.preview and hasattr(stage, 'preview_stage'):
+                    stage = stage.preview_stage()
+                    if stage is None:
+                        continue
+                # Consecutive lookup tables collapse into one
+                if stages and isinstance(stage, LutStage) and isinstance(stages[-1], LutStage):
+                    stages[-1] = stages[-1].then(stage)
+                else:
+                    stages.append(stage)
+        return [stage for stage in stages
+                if not (isinstance(stage, LutStage) and stage.is_identity())]
+
+    def process(self, frame: np.ndarray, chain: Sequence[str]) -> np.ndarray:
+        """Apply a chain to a frame."""
+        return self.compile(chain).apply(frame)
@@ -2,13 +2,15 @@ import cv2
 import numpy as np
 from typing import Dict, Any, Optional
 import logging
+from .filter_engine import FilterEngine
 
 logger = logging.getLogger(__name__)
 
 class FilterProcessor:
-    def __init__(self, config: Optional[Dict] = None):
+    def __init__(self, config: Optional[Dict] = None, preview: bool = False):
         self.config = config or {}
         self.current_filter = None
+        self.engine = FilterEngine(self.config.get('FILTERS', {}), preview=preview)
 
     def apply_warm_filter(self, frame: np.ndarray, intensity: float = 0.4) -> np.ndarray:
         """Apply warm color filter to frame."""
@@ -49,7 +51,28 @@ class FilterProcessor:
         frame: np.ndarray, 
         filter_name: Optional[str] = None
     ) -> np.ndarray:
-        """Process frame with specified filter."""
+        """Process frame with specified filter using the compiled lookup tables.
+
+        The returned frame is a buffer reused by the next call.
+        """
+        if filter_name is None:
+            return frame
+
+        try:
+            return self.engine.process(frame, (filter_name,))
+        except Exception as e:
+            logger.error(f"Error processing frame with filter {filter_name}: {str(e)}")
+            return frame
+
+    def process_frame_reference(
+        self, 
+        frame: np.ndarray, 
+        filter_name: Optional[str] = None
+    ) -> np.ndarray:
+        """Process frame with the per-frame apply_* implementations.
+
+        Kept as the reference the compiled engine is checked and benchmarked against.
+        """
         if filter_name is None:
             return frame
 
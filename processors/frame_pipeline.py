@@ -0,0 +1,290 @@
+import logging
+import multiprocessing
+import queue
+import time
+import traceback
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, Optional, Tuple
+from .filter_processor import FilterProcessor
+from .frame_source import FrameSource
+from .profiler import NullProfiler, StageProfiler
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 1.0  # How often a waiting consumer checks that the pipeline processes are alive
+
+
+class SharedFramePool:
+    """Fixed number of frame slots in one shared memory block.
+
+    The creating process owns the block and unlinks it on close; other
+    processes attach to it by name. Slots are addressed by index, so only
+    indices ever travel between processes.
+    """
+
+    def __init__(self, slots: int, width: int, height: int, name: Optional[str] = None):
+        self.shape = (slots, height, width, 3)
+        self.owner = name is None
+        size = int(np.prod(self.shape))
+        if self.owner:
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray(self.shape, dtype=np.uint8, buffer=self._memory.buf)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def close(self) -> None:
+        """Detach from the block, removing it when this process created it."""
+        # The array must be gone before the mapping can be closed
+        self.frames = None
+        self._memory.close()
+        if self.owner:
+            self._memory.unlink()
+
+
+def _decode_main(pool_name: str, shape: Tuple[int, ...], commands, free, work, done) -> None:
+    """Decoder process: decode each requested clip straight into free slots."""
+    pool = SharedFramePool(shape[0], shape[2], shape[1], name=pool_name)
+    try:
+        for command in iter(commands.get, None):
+            clip_id = command['clip_id']
+            count = 0
+            try:
+                source = FrameSource(
+                    command['path'],
+                    shape[2],
+                    shape[1],
+                    fps=command['fps'],
+                    start=command['start'],
+                    max_frames=command['max_frames']
+                ).open(threaded=False)
+                try:
+                    while True:
+                        slot = free.get()
+                        if not source.read_into(pool.frames[slot]):
+                            free.put(slot)
+                            break
+                        work.put((clip_id, count, slot, command['filter_name']))
+                        count += 1
+                finally:
+                    source.close()
+                done.put(('end', clip_id, count))
+            except Exception:
+                done.put(('error', clip_id, traceback.format_exc()))
+    finally:
+        pool.close()
+
+
+def _filter_main(pool_name: str, shape: Tuple[int, ...], config: Dict, preview: bool, work, done) -> None:
+    """Filter worker process: filter frames in place in their slots."""
+    pool = SharedFramePool(shape[0], shape[2], shape[1], name=pool_name)
+    filter_processor = FilterProcessor(config, preview=preview)
+    try:
+        for clip_id, index, slot, filter_name in iter(work.get, None):
+            try:
+                wall = time.perf_counter()
+                cpu = time.thread_time()
+                frame = pool.frames[slot]
+                filtered = filter_processor.process_frame(frame, filter_name)
+                if filtered is not frame:
+                    np.copyto(frame, filtered)
+                done.put(('frame', clip_id, index, slot,
+                          time.perf_counter() - wall, time.thread_time() - cpu))
+            except Exception:
+                done.put(('error', clip_id, traceback.format_exc()))
+    finally:
+        pool.close()
+
+
+class FramePipeline:
+    """Decode and filter clips across processes, sharing frames through shared memory.
+
+    A decoder process writes frames into a SharedFramePool and a set of
+    filter worker processes filters them in place, so frames are never
+    pickled or copied between stages; the queues only carry slot indices.
+    The render process gets each clip's frames back in order through clip()
+    and stays the encoder stage, feeding the FFmpeg writer. Filtering a
+    clip scales with the number of workers.
+    """
+
+    def __init__(
+        self,
+        config: Dict,
+        width: int,
+        height: int,
+        workers: int,
+        slots: Optional[int] = None,
+        preview: bool = False,
+        profiler: Optional[StageProfiler] = None
+    ):
+        self.profiler = profiler or NullProfiler()
+        self.broken = False
+        self._next_clip = 0
+        # Enough slots for every worker to hold a frame while others wait reordering
+        self.pool = SharedFramePool(slots or 2 * workers + 2, width, height)
+        # Forked like the render pool's own workers; start the pipeline before
+        # any decoder or writer threads of the render
+        context = multiprocessing.get_context()
+        self._commands = context.Queue()
+        self._free = context.Queue()
+        self._work = context.Queue()
+        self._done = context.Queue()
+        for slot in range(len(self.pool)):
+            self._free.put(slot)
+
+        settings = {key: value for key, value in config.items() if key.isupper()}
+        self._processes = [context.Process(
+            target=_decode_main,
+            args=(self.pool.name, self.pool.shape, self._commands, self._free, self._work, self._done),
+            name='frame-decoder',
+            daemon=True
+        )]
+        for i in range(workers):
+            self._processes.append(context.Process(
+                target=_filter_main,
+                args=(self.pool.name, self.pool.shape, settings, preview, self._work, self._done),
+                name=f'frame-filter-{i}',
+                daemon=True
+            ))
+        try:
+            for process in self._processes:
+                process.start()
+        except Exception:
+            self.close()
+            raise
+        logger.info(f"Started frame pipeline with {workers} filter workers and {len(self.pool)} "
+                    f"{width}x{height} slots")
+
+    def clip(
+        self,
+        path: str,
+        fps: float,
+        filter_name: Optional[str],
+        start: float = 0.0,
+        max_frames: Optional[int] = None
+    ) -> 'PipelineClip':
+        """Frames of one clip, decoded and filtered, as a FrameSource-like context."""
+        if self.broken:
+            raise RuntimeError("Frame pipeline is no longer usable after an earlier failure")
+        self._next_clip += 1
+        return PipelineClip(self, {
+            'clip_id': self._next_clip,
+            'path': path,
+            'fps': fps,
+            'filter_name': filter_name,
+            'start': start,
+            'max_frames': max_frames
+        })
+
+    def _receive(self) -> tuple:
+        """Next message from the decoder or a worker, failing if any of them died."""
+        while True:
+            try:
+                return self._done.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                dead = [process.name for process in self._processes if not process.is_alive()]
+                if dead:
+                    self.broken = True
+                    raise RuntimeError(f"Frame pipeline process exited: {', '.join(dead)}")
+
+    def close(self) -> None:
+        """Stop the pipeline processes and release the shared frames."""
+        self._commands.put(None)
+        for _ in self._processes[1:]:
+            self._work.put(None)
+        for process in self._processes:
+            if process.pid is None:
+                continue
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for q in (self._commands, self._free, self._work, self._done):
+            q.close()
+            q.cancel_join_thread()
+        self.pool.close()
+
+    def __enter__(self) -> 'FramePipeline':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class PipelineClip:
+    """One clip's frames from a FramePipeline, yielded in decode order.
+
+    Like FrameSource, iterating yields views into the shared slots, valid
+    only until the next frame is requested.
+    """
+
+    def __init__(self, pipeline: FramePipeline, command: Dict):
+        self.pipeline = pipeline
+        self.command = command
+        self._pending: Dict[int, int] = {}
+        self._total: Optional[int] = None
+        self._next = 0
+
+    def open(self) -> 'PipelineClip':
+        self.pipeline._commands.put(self.command)
+        return self
+
+    def _take(self) -> Optional[int]:
+        """Slot of the next frame in order, or None after the last one."""
+        pipeline = self.pipeline
+        while self._next not in self._pending:
+            if self._total is not None and self._next >= self._total:
+                return None
+            message = pipeline._receive()
+            if message[1] != self.command['clip_id']:
+                continue
+            if message[0] == 'error':
+                pipeline.broken = True
+                raise RuntimeError(f"Frame pipeline failed on {self.command['path']}: {message[2]}")
+            if message[0] == 'end':
+                self._total = message[2]
+            else:
+                _, _, index, slot, wall, cpu = message
+                self._pending[index] = slot
+                pipeline.profiler.record('filter', wall, cpu)
+        return self._pending.pop(self._next)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while True:
+            slot = self._take()
+            if slot is None:
+                return
+            self._next += 1
+            try:
+                yield self.pipeline.pool.frames[slot]
+            finally:
+                # The consumer is done with this frame once it asks for the next
+                self.pipeline._free.put(slot)
+
+    def close(self) -> None:
+        """Hand every frame of the clip back to the pool, waiting for any still in flight."""
+        if self.pipeline.broken:
+            return
+        try:
+            while True:
+                slot = self._take()
+                if slot is None:
+                    return
+                self._next += 1
+                self.pipeline._free.put(slot)
+        except Exception:
+            self.pipeline.broken = True
+            raise
+
+    def __enter__(self) -> 'PipelineClip':
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
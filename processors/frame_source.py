@@ -0,0 +1,196 @@
+import collections
+import logging
+import queue
+import subprocess
+import threading
+import cv2
+import numpy as np
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class FrameSource:
+    """Decode a clip on a background thread into a ring of preallocated frames.
+
+    Frames are produced at the requested output size and, when fps is given,
+    frame rate. When the clip already matches it is read with OpenCV;
+    otherwise FFmpeg decodes, resamples and scales it in one step, so
+    full-size frames are never materialized in Python.
+
+    start seeks to that many seconds into the clip before decoding, and at
+    most max_frames frames are produced, so a clip cut to a short window
+    only costs that window.
+
+    Iterating yields views into the ring. A frame stays valid only until the
+    next one is requested, so consumers that keep frames must copy them.
+    Opened with threaded=False, no ring or thread is set up and the caller
+    decodes into its own buffers with read_into().
+    """
+
+    def __init__(
+        self,
+        path: str,
+        width: int,
+        height: int,
+        fps: Optional[float] = None,
+        prefetch: int = 8,
+        start: float = 0.0,
+        max_frames: Optional[int] = None
+    ):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.prefetch = max(2, prefetch)
+        self.start = start
+        self.max_frames = max_frames
+        self.scaled = False
+        self._cap: Optional[cv2.VideoCapture] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr_tail = collections.deque(maxlen=50)
+        self._slots: List[np.ndarray] = []
+        self._free: queue.Queue = queue.Queue()
+        self._ready: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[Exception] = None
+        self._decoded = 0
+
+    def open(self, threaded: bool = True) -> 'FrameSource':
+        """Start decoding."""
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open video: {self.path}")
+        source_size = (
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        )
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+        resample = self.fps is not None and abs(source_fps - self.fps) > 0.01
+
+        if source_size == (self.width, self.height) and not resample:
+            self._cap = cap
+            if self.start > 0:
+                # OpenCV decodes forward from the preceding keyframe, so the seek is exact
+                cap.set(cv2.CAP_PROP_POS_FRAMES, round(self.start * source_fps))
+        else:
+            cap.release()
+            self.scaled = True
+            self._start_ffmpeg(resample)
+            logger.debug(f"Decoding {self.path} scaled from {source_size[0]}x{source_size[1]} "
+                         f"@ {source_fps:g} to {self.width}x{self.height} @ {self.fps or source_fps:g}")
+
+        if not threaded:
+            return self
+        self._slots = [np.empty((self.height, self.width, 3), dtype=np.uint8)
+                       for _ in range(self.prefetch)]
+        for slot in range(self.prefetch):
+            self._free.put(slot)
+        self._thread = threading.Thread(target=self._decode_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _start_ffmpeg(self, resample: bool) -> None:
+        filters = [f'scale={self.width}:{self.height}:flags=bilinear']
+        if resample:
+            # Drop frames before scaling them
+            filters.insert(0, f'fps={self.fps}')
+        cmd = ['ffmpeg', '-loglevel', 'error', '-nostdin']
+        if self.start > 0:
+            # Input seeking jumps to the keyframe before start and discards up to it
+            cmd += ['-ss', f'{self.start:.6f}']
+        cmd += [
+            '-i', self.path,
+            '-map', '0:v:0',
+            '-vf', ','.join(filters),
+            '-fps_mode', 'passthrough'
+        ]
+        if self.max_frames is not None:
+            cmd += ['-frames:v', str(self.max_frames)]
+        cmd += ['-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+        self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+
+    def _drain_stderr(self) -> None:
+        """Keep the tail of FFmpeg's stderr for error reporting."""
+        for line in self._process.stderr:
+            self._stderr_tail.append(line.decode(errors='replace').rstrip())
+
+    def _read_into(self, frame: np.ndarray) -> bool:
+        """Decode the next frame into frame, returning False at the end of the clip."""
+        if self._cap is not None:
+            ret, decoded = self._cap.read(frame)
+            if ret and decoded is not frame:
+                np.copyto(frame, decoded)
+            return ret
+
+        view = memoryview(frame).cast('B')
+        filled = 0
+        while filled < len(view):
+            count = self._process.stdout.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        if filled == len(view):
+            return True
+
+        if self._process.wait() != 0 and not self._stop.is_set():
+            stderr = '\n'.join(self._stderr_tail)
+            raise RuntimeError(f"FFmpeg decode of {self.path} failed: {stderr}")
+        return False
+
+    def read_into(self, frame: np.ndarray) -> bool:
+        """Decode the next frame into frame, returning False after the last one."""
+        if self.max_frames is not None and self._decoded >= self.max_frames:
+            return False
+        if not self._read_into(frame):
+            return False
+        self._decoded += 1
+        return True
+
+    def _decode_loop(self) -> None:
+        try:
+            while not self._stop.is_set():
+                slot = self._free.get()
+                if slot is None or not self.read_into(self._slots[slot]):
+                    break
+                self._ready.put(slot)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._ready.put(None)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while True:
+            slot = self._ready.get()
+            if slot is None:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield self._slots[slot]
+            # The consumer is done with this frame once it asks for the next
+            self._free.put(slot)
+
+    def close(self) -> None:
+        """Stop decoding and release the decoder."""
+        self._stop.set()
+        self._free.put(None)
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+        if self._thread is not None:
+            self._thread.join()
+        if self._process is not None:
+            self._process.wait()
+        if self._cap is not None:
+            self._cap.release()
+
+    def __enter__(self) -> 'FrameSource':
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
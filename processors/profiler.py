@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+
+MAX_TRACE_EVENTS = 200000  # Trace events kept per profile; stage totals are always kept
+
+
+class StageProfiler:
+    """Wall and CPU time per pipeline stage of a render.
+
+    Stages are timed with stage(), which may be nested and called per frame.
+    Totals are kept per stage name, and each call is also recorded as a trace
+    event for offline analysis. CPU time is that of the calling thread;
+    time spent in FFmpeg shows up as child CPU time in the report.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.clips: List[Dict[str, Any]] = []
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._start_children = self._children_cpu()
+
+    @staticmethod
+    def _children_cpu() -> float:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one call of stage name."""
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - wall, time.thread_time() - cpu, start=wall)
+
+    def record(self, name: str, wall: float, cpu: float = 0.0, start: Optional[float] = None) -> None:
+        """Add one call of stage name measured elsewhere."""
+        with self._lock:
+            totals = self.stages.get(name)
+            if totals is None:
+                totals = self.stages[name] = {'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0}
+            totals['count'] += 1
+            totals['wall_seconds'] += wall
+            totals['cpu_seconds'] += cpu
+            if start is not None and len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append({
+                    'name': name,
+                    'ph': 'X',
+                    'ts': (start - self._start_wall) * 1e6,
+                    'dur': wall * 1e6,
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident()
+                })
+
+    def record_clip(self, video_file: str, index: int, frames: int, wall: float) -> None:
+        """Add the frame count and wall time of one rendered clip."""
+        with self._lock:
+            self.clips.append({
+                'file': os.path.basename(video_file),
+                'index': index,
+                'frames': frames,
+                'wall_seconds': wall,
+                'fps': frames / wall if wall > 0 else 0.0
+            })
+
+    def merge(self, report: Dict[str, Any]) -> None:
+        """Fold in the report of work done by another process."""
+        with self._lock:
+            for name, other in report['stages'].items():
+                totals = self.stages.setdefault(name, {'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+                for key in totals:
+                    totals[key] += other[key]
+            self.clips.extend(report['clips'])
+
+    def report(self) -> Dict[str, Any]:
+        """Stage totals, per-clip throughput and overall times."""
+        with self._lock:
+            return {
+                'stages': {name: dict(totals) for name, totals in self.stages.items()},
+                'clips': sorted(self.clips, key=lambda clip: clip['index']),
+                'wall_seconds': time.perf_counter() - self._start_wall,
+                'cpu_seconds': time.process_time() - self._start_cpu,
+                'child_cpu_seconds': self._children_cpu() - self._start_children
+            }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Trace events in Chrome trace format, for chrome://tracing or Perfetto."""
+        with self._lock:
+            return {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+
+    def dump(self, path: str, format: str = 'json') -> None:
+        """Write the report ('json') or the trace ('chrome') to path."""
+        data = self.chrome_trace() if format == 'chrome' else self.report()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+
+class NullProfiler(StageProfiler):
+    """Profiler that records nothing, used when profiling is off."""
+
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+        self._null = nullcontext()
+
+    def stage(self, name: str):
+        return self._null
+
+    def record(self, name: str, wall: float, cpu: float = 0.0, start: Optional[float] = None) -> None:
+        pass
+
+    def record_clip(self, video_file: str, index: int, frames: int, wall: float) -> None:
+        pass
+
+    def merge(self, report: Dict[str, Any]) -> None:
+        pass
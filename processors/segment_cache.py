@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from typing import Any, Callable, Dict, Optional
+from .content_cache import evict_lru_files
+from .filter_engine import FILTER_ENGINE_VERSION
+
+logger = logging.getLogger(__name__)
+
+class SegmentCache:
+    """Encoded intro/outro segments reused across montages.
+
+    Segments are keyed by the source asset (path, size and mtime), the art
+    pack, the filter applied with its settings and the filter engine
+    version, and the output resolution, fps and encoder settings. Any segment with the same output parameters can be joined to
+    them with stream copy. Renders go to a temp file and are moved into place
+    atomically, so concurrent workers never see a partial segment.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # In-progress renders live in a subdirectory so eviction never sees them
+        self._tmp_dir = os.path.join(directory, 'tmp')
+        os.makedirs(self._tmp_dir, exist_ok=True)
+
+    def key(
+        self,
+        source: str,
+        art_pack: str,
+        filter_name: Optional[str],
+        output_params: Dict,
+        filter_settings: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Cache key for a rendered segment; filter_settings is the filter's entry in FILTERS."""
+        stat = os.stat(source)
+        description = json.dumps([
+            os.path.abspath(source), stat.st_size, stat.st_mtime_ns,
+            art_pack, filter_name, filter_settings or {}, FILTER_ENGINE_VERSION,
+            output_params['width'], output_params['height'], output_params['fps'],
+            output_params.get('encoder', {})
+        ], sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.mp4')
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of a cached segment, or None."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(path)  # mark as recently used for eviction
+        except OSError:
+            return None
+        return path
+
+    def get_or_render(self, key: str, render: Callable[[str], None]) -> str:
+        """Return the cached segment for key, calling render(path) on a miss."""
+        path = self.get(key)
+        if path is not None:
+            self.hits += 1
+            return path
+
+        self.misses += 1
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir, suffix='.mp4')
+        os.close(fd)
+        try:
+            render(tmp_path)
+            os.replace(tmp_path, self._path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        logger.info(f"Cached pre-rendered segment {key}")
+        evict_lru_files(self.directory, '.mp4', self.max_bytes)
+        return self._path(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters."""
+        return {'hits': self.hits, 'misses': self.misses}
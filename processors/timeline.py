@@ -0,0 +1,289 @@
+import logging
+import numpy as np
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+from .clip_analysis import ClipAnalysis
+
+logger = logging.getLogger(__name__)
+
+class TransitionSchedule:
+    """Per-frame render plan for a montage, stored as flat arrays.
+
+    Entry ``i`` describes output frame ``i``: which clip it comes from, the
+    frame of that clip's source it shows, the filter to apply and, for the
+    first frames of a clip that transitions in, the blend alpha. Clips play
+    from their in-point, ``clip_in`` frames into the source; a clip followed
+    by a transition is also decoded for ``clip_tail`` frames past its cut,
+    which the next clip blends over.
+    """
+
+    def __init__(
+        self,
+        fps: float,
+        filters: List[str],
+        clip_starts: np.ndarray,
+        clip_index: np.ndarray,
+        clip_frame: np.ndarray,
+        filter_index: np.ndarray,
+        alpha: np.ndarray,
+        transition: np.ndarray,
+        clip_in: Optional[np.ndarray] = None,
+        clip_tail: Optional[np.ndarray] = None,
+        transition_type: str = 'crossfade',
+        transition_frames: int = 0
+    ):
+        self.fps = fps
+        self.filters = filters
+        self.clip_starts = clip_starts
+        self.clip_index = clip_index
+        self.clip_frame = clip_frame
+        self.filter_index = filter_index
+        self.alpha = alpha
+        self.transition = transition
+        self.clip_in = clip_in if clip_in is not None else np.zeros(len(clip_starts) - 1, dtype=np.int64)
+        self.clip_tail = clip_tail if clip_tail is not None else np.zeros(len(clip_starts) - 1, dtype=np.int64)
+        self.transition_type = transition_type
+        self.transition_frames = transition_frames
+
+    def __len__(self) -> int:
+        return len(self.clip_index)
+
+    @property
+    def num_clips(self) -> int:
+        return len(self.clip_starts) - 1
+
+    def clip_range(self, clip: int) -> Tuple[int, int]:
+        """Global [start, end) frame range of a clip."""
+        return int(self.clip_starts[clip]), int(self.clip_starts[clip + 1])
+
+    def clip_in_point(self, clip: int) -> int:
+        """Source frame a clip starts playing from."""
+        return int(self.clip_in[clip])
+
+    def clip_frames(self, clip: int) -> int:
+        """Number of frames a clip plays for."""
+        start, end = self.clip_range(clip)
+        return end - start
+
+    def clip_tail_frames(self, clip: int) -> int:
+        """Source frames decoded past a clip's cut for the transition after it."""
+        return int(self.clip_tail[clip])
+
+    def transitions_in(self, clip: int) -> bool:
+        """Whether a clip's first frames blend over the clip before it."""
+        start, end = self.clip_range(clip)
+        return start < end and bool(self.transition[start])
+
+    def clip_filter(self, clip: int) -> Optional[str]:
+        """Filter applied to a clip."""
+        start, end = self.clip_range(clip)
+        if start == end:
+            return None
+        return self.filters[self.filter_index[start]]
+
+    def lookup(self, frame: int) -> Tuple[int, Optional[str], Optional[float]]:
+        """Return (clip, filter name, blend alpha or None) for a global frame."""
+        if not 0 <= frame < len(self):
+            return -1, None, None
+        alpha = float(self.alpha[frame]) if self.transition[frame] else None
+        return int(self.clip_index[frame]), self.filters[self.filter_index[frame]], alpha
+
+    def transition_alpha(self, clip: int, clip_frame: int) -> Optional[float]:
+        """Blend alpha for a frame addressed by clip and offset, or None."""
+        start, end = self.clip_range(clip)
+        frame = start + clip_frame
+        if frame >= end or not self.transition[frame]:
+            return None
+        return float(self.alpha[frame])
+
+    def summary(self) -> Dict[str, Any]:
+        """Human-readable overview, useful for logging and inspection."""
+        return {
+            'fps': self.fps,
+            'frames': len(self),
+            'duration': len(self) / self.fps if self.fps else 0.0,
+            'transition_type': self.transition_type,
+            'transition_frames': int(self.transition.sum()),
+            'clips': [
+                {
+                    'start': self.clip_range(i)[0],
+                    'in': self.clip_in_point(i),
+                    'frames': self.clip_frames(i),
+                    'tail': self.clip_tail_frames(i),
+                    'filter': self.clip_filter(i)
+                }
+                for i in range(self.num_clips)
+            ]
+        }
+
+
+SCENE_CUT_PENALTY = 0.5  # Activity a highlight window loses per scene cut inside it
+
+
+class TimelinePlanner:
+    """Build a TransitionSchedule once per montage from beats and clip lengths."""
+
+    def __init__(self, transition_duration: float, min_shot_duration: float = 1.0):
+        self.transition_duration = transition_duration
+        self.min_shot_duration = min_shot_duration
+
+    def plan_cuts(
+        self,
+        beat_times: np.ndarray,
+        clip_frame_counts: Sequence[int],
+        fps: float,
+        body_duration: float,
+        analyze_clip: Optional[Callable[[int], Optional[ClipAnalysis]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Choose (in-points, lengths) in frames so the body fills body_duration with cuts on beats.
+
+        The first and last clips, intro and outro, play whole. The body clips
+        share the body evenly as far as their sources allow; each cut then
+        moves to the nearest beat that keeps the clip within its source and
+        at least min_shot_duration long. A clip plays the middle of its source,
+        or, when analyze_clip(index) returns an analysis of it, its most active
+        stretch of that length, so only those frames need to be decoded.
+        analyze_clip is only called for clips with a choice of stretch.
+        """
+        counts = np.asarray(clip_frame_counts, dtype=np.int64)
+        in_points = np.zeros_like(counts)
+        lengths = counts.copy()
+        available = counts[1:-1]
+        if len(available) == 0:
+            return in_points, lengths
+
+        shares = self._fair_shares(available, body_duration * fps)
+        beat_frames = np.unique(np.round(np.asarray(beat_times, dtype=np.float64) * fps).astype(np.int64))
+        min_frames = max(1, int(round(self.min_shot_duration * fps)))
+
+        cut = target = float(counts[0])
+        for i, (frames, share) in enumerate(zip(available, shares), start=1):
+            # Targets accumulate unsnapped, so snapping errors do not add up
+            target += share
+            low = cut + min(min_frames, frames)
+            high = cut + frames
+            candidates = beat_frames[(beat_frames >= low) & (beat_frames <= high)]
+            if len(candidates):
+                end = candidates[np.argmin(np.abs(candidates - target))]
+            else:
+                end = int(round(min(max(target, low), high)))
+            lengths[i] = max(1, int(end - cut))
+            in_point = None
+            if analyze_clip is not None and self._highlight_slack(int(frames), int(lengths[i]), fps) > 0:
+                analysis = analyze_clip(i)
+                if analysis is not None:
+                    in_point = self._highlight_in_point(analysis, int(frames), int(lengths[i]), fps)
+            in_points[i] = in_point if in_point is not None else (frames - lengths[i]) // 2
+            cut += lengths[i]
+
+        logger.debug(f"Cut body to {int(lengths[1:-1].sum())} of {int(available.sum())} frames")
+        return in_points, lengths
+
+    def _highlight_in_point(
+        self,
+        analysis: ClipAnalysis,
+        frames: int,
+        length: int,
+        fps: float
+    ) -> Optional[int]:
+        """In-point of the window of length frames with the most activity and fewest scene cuts.
+
+        Windows may start at any sample or scene cut and leave room for the
+        transition tail after them where the source allows. None when the
+        analysis has too little to choose from.
+        """
+        latest = self._highlight_slack(frames, length, fps)
+        if latest <= 0 or len(analysis.times) < 2:
+            return None
+
+        starts = np.unique(np.concatenate([[0.0], analysis.times, analysis.scene_cuts]).astype(np.float64))
+        starts = starts[(starts >= 0) & (starts <= latest)]
+        window = length / fps
+        times = analysis.times.astype(np.float64)
+        activity = np.concatenate([[0.0], np.cumsum(analysis.activity, dtype=np.float64)])
+        low = np.searchsorted(times, starts)
+        high = np.searchsorted(times, starts + window)
+        counts = high - low
+        # Windows shorter than the sample spacing take the activity around them
+        mean = np.where(
+            counts > 0,
+            (activity[high] - activity[low]) / np.maximum(counts, 1),
+            np.interp(starts + window / 2, times, analysis.activity)
+        )
+        # A window starting on a cut is a clean shot, one crossing it is not
+        cuts = analysis.scene_cuts.astype(np.float64)
+        inside = np.searchsorted(cuts, starts + window) - np.searchsorted(cuts, starts, side='right')
+        score = mean - SCENE_CUT_PENALTY * inside
+        return int(round(starts[np.argmax(score)] * fps))
+
+    def _highlight_slack(self, frames: int, length: int, fps: float) -> float:
+        """Latest start in seconds of a window of length frames that leaves room for a transition tail."""
+        reserve = min(int(round(self.transition_duration * fps)), frames - length)
+        return (frames - length - reserve) / fps
+
+    @staticmethod
+    def _fair_shares(available: np.ndarray, total: float) -> np.ndarray:
+        """Split total frames evenly between clips, giving what short clips cannot use to the rest."""
+        shares = np.zeros(len(available), dtype=np.float64)
+        remaining = min(float(total), float(available.sum()))
+        open_clips = shares < available
+        while remaining > 1e-6 and open_clips.any():
+            grant = np.minimum(available - shares, remaining / open_clips.sum()) * open_clips
+            shares += grant
+            remaining -= grant.sum()
+            open_clips &= shares < available
+        return shares
+
+    def plan(
+        self,
+        clip_frame_counts: Sequence[int],
+        fps: float,
+        clip_filters: Sequence[str],
+        clip_in_frames: Optional[Sequence[int]] = None,
+        clip_source_frames: Optional[Sequence[int]] = None,
+        transition_type: str = 'crossfade'
+    ) -> TransitionSchedule:
+        """Plan every output frame of the montage.
+
+        clip_frame_counts are the frames each clip plays for, starting at
+        clip_in_frames into its source (0 by default). Each body clip fades in
+        over the transition_duration after its cut, against the clip before it
+        played on past that cut as far as clip_source_frames allow. The outro
+        cuts in hard, so its cached segment does not depend on the body.
+        """
+        counts = np.asarray(clip_frame_counts, dtype=np.int64)
+        clip_in = np.zeros(len(counts), dtype=np.int64)
+        if clip_in_frames is not None:
+            clip_in = np.asarray(clip_in_frames, dtype=np.int64)
+        clip_starts = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=clip_starts[1:])
+        total = int(clip_starts[-1])
+
+        filters = list(dict.fromkeys(clip_filters))
+        clip_filter_ids = np.array([filters.index(f) for f in clip_filters], dtype=np.int8)
+
+        clip_index = np.repeat(np.arange(len(counts), dtype=np.int16), counts)
+        clip_frame = (np.arange(total, dtype=np.int64) - np.repeat(clip_starts[:-1] - clip_in, counts)).astype(np.int32)
+        filter_index = clip_filter_ids[clip_index]
+
+        transition_frames = int(round(self.transition_duration * fps))
+        transition = np.zeros(total, dtype=bool)
+        alpha = np.zeros(total, dtype=np.float32)
+        clip_tail = np.zeros(len(counts), dtype=np.int64)
+        ramp = np.arange(1, transition_frames + 1, dtype=np.float32) / (transition_frames + 1)
+        for clip in range(1, len(counts) - 1):
+            head = min(transition_frames, int(counts[clip]))
+            if head == 0:
+                continue
+            start = int(clip_starts[clip])
+            transition[start:start + head] = True
+            alpha[start:start + head] = ramp[:head]
+            if clip_source_frames is not None:
+                spare = int(clip_source_frames[clip - 1]) - int(clip_in[clip - 1] + counts[clip - 1])
+                clip_tail[clip - 1] = min(head, max(0, spare))
+
+        schedule = TransitionSchedule(
+            fps, filters, clip_starts, clip_index, clip_frame, filter_index, alpha, transition,
+            clip_in, clip_tail, transition_type, transition_frames
+        )
+        logger.debug(f"Planned {total} frames with {int(transition.sum())} transition frames")
+        return schedule
@@ -0,0 +1,73 @@
+import logging
+import cv2
+import numpy as np
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+TRANSITION_TYPES = ('crossfade', 'dip_to_black', 'whip')
+WHIP_MAX_BLUR = 0.08  # Motion blur length at the middle of a whip, as a fraction of the width
+
+
+class TransitionEngine:
+    """Blend the head of each clip over the tail of the clip before it.
+
+    The outgoing clip's last shown frame and the frames that follow it in
+    its source are kept in a ring of preallocated frames, one transition
+    long. The incoming clip's first frames are then blended against them
+    into a single output buffer. Memory stays at transition length + 2 frames
+    whatever the clip length or resolution of the montage.
+    """
+
+    def __init__(self, width: int, height: int, frames: int, kind: str = 'crossfade'):
+        if kind not in TRANSITION_TYPES:
+            raise ValueError(f"Unknown transition type: {kind}")
+        self.kind = kind
+        self.frames = frames
+        # Slot 0 is the last shown frame, the rest the source frames after it
+        self._ring = np.empty((frames + 1, height, width, 3), dtype=np.uint8) if frames else None
+        self._out = np.empty((height, width, 3), dtype=np.uint8)
+        self.clip: Optional[int] = None
+        self.count = 0
+
+    def begin_tail(self, clip: int) -> None:
+        """Start holding the tail of clip, dropping any earlier one."""
+        self.clip = clip
+        self.count = 0
+
+    def store(self, frame: np.ndarray) -> None:
+        """Copy the next tail frame into the ring; frames past its size are ignored."""
+        if self._ring is not None and self.count < len(self._ring):
+            np.copyto(self._ring[self.count], frame)
+            self.count += 1
+
+    def has_tail(self, clip: int) -> bool:
+        """Whether the ring holds the tail of clip."""
+        return self.clip == clip and self.count > 0
+
+    def blend(self, frame: np.ndarray, offset: int, alpha: float) -> np.ndarray:
+        """Blend the incoming frame offset frames into the transition.
+
+        alpha runs from 0 (all outgoing) to 1 (all incoming). Once the held
+        tail runs out, its last frame is held still.
+        """
+        tail = self._ring[min(offset + 1, self.count - 1)]
+        if self.kind == 'crossfade':
+            return cv2.addWeighted(tail, 1.0 - alpha, frame, alpha, 0, dst=self._out)
+        if self.kind == 'dip_to_black':
+            # Out to black over the first half, in from black over the second
+            if alpha < 0.5:
+                return cv2.addWeighted(tail, 1.0 - 2 * alpha, tail, 0, 0, dst=self._out)
+            return cv2.addWeighted(frame, 2 * alpha - 1.0, frame, 0, 0, dst=self._out)
+        return self._whip(tail, frame, alpha)
+
+    def _whip(self, tail: np.ndarray, frame: np.ndarray, alpha: float) -> np.ndarray:
+        """Slide the outgoing frame out to the left and the incoming one in, blurred along the motion."""
+        width = frame.shape[1]
+        shift = int(round(alpha * width))
+        self._out[:, :width - shift] = tail[:, shift:]
+        self._out[:, width - shift:] = frame[:, :shift]
+        blur = 1 + int(WHIP_MAX_BLUR * width * np.sin(np.pi * alpha))
+        if blur > 1:
+            cv2.blur(self._out, (blur, 1), dst=self._out)
+        return self._out
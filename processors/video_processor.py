@@ -1,19 +1,113 @@
 import cv2
 import logging
 import os
-import subprocess
+import shutil
+import time
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Tuple, Optional
 from .filter_processor import FilterProcessor
 from .audio_processor import AudioProcessor
+from .clip_analysis import ClipAnalyzer
+from .content_cache import ContentCache
+from .segment_cache import SegmentCache
+from .ffmpeg_writer import FFmpegWriter, concat_segments, hls_options, rendition_path
+from .frame_pipeline import FramePipeline
+from .frame_source import FrameSource
+from .profiler import NullProfiler, StageProfiler
+from .timeline import TimelinePlanner, TransitionSchedule
+from .transitions import TransitionEngine
 
 logger = logging.getLogger(__name__)
 
+# Video processor reused by segment tasks within a pool worker process
+_segment_processor = None
+
+def _render_segment(task: Dict) -> Optional[Dict]:
+    """Render one clip to its own video-only segment inside a pool worker.
+
+    Returns the worker's profile report when task['profile'] is set.
+    """
+    global _segment_processor
+    if _segment_processor is None:
+        _segment_processor = VideoProcessor(task['config'])
+    processor = _segment_processor
+    profiler = processor.start_profile(task.get('profile', False))
+
+    params = processor._setup_video_writer(task['output_params'], task['segment_path'])
+    try:
+        processor._process_clip(
+            task['clips'],
+            task['index'],
+            task['schedule'],
+            params,
+            processor._transition_engine(task['schedule'], params)
+        )
+        with profiler.stage('encode'):
+            params['writer'].release()
+    except Exception:
+        params['writer'].abort()
+        raise
+    return profiler.report() if profiler.enabled else None
+
 class VideoProcessor:
     def __init__(self, config: Dict):
         self.config = config
         self.filter_processor = FilterProcessor(config)
-        self.audio_processor = AudioProcessor()
+        self.preview_filter_processor = FilterProcessor(config, preview=True)
+        self.audio_processor = AudioProcessor(self._create_beat_cache())
+        self.clip_analyzer = self._create_clip_analyzer()
+        self.segment_cache = self._create_segment_cache()
+        self.schedule: Optional[TransitionSchedule] = None
+        self.outputs: Dict[str, str] = {}
+        self.profiler: StageProfiler = NullProfiler()
+
+    def start_profile(self, enabled: bool = True) -> StageProfiler:
+        """Start timing pipeline stages for the next render and return the profiler."""
+        self.profiler = StageProfiler() if enabled else NullProfiler()
+        self.audio_processor.profiler = self.profiler
+        if self.clip_analyzer is not None:
+            self.clip_analyzer.profiler = self.profiler
+        return self.profiler
+
+    def _create_beat_cache(self) -> Optional[ContentCache]:
+        """Build the beat analysis cache if one is configured."""
+        folder = self.config.get('BEAT_CACHE_FOLDER')
+        if not folder:
+            return None
+        return ContentCache(
+            folder,
+            max_entries=self.config.get('BEAT_CACHE_MEMORY_ENTRIES', 64),
+            max_bytes=self.config.get('BEAT_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        )
+
+    def _create_clip_analyzer(self) -> Optional[ClipAnalyzer]:
+        """Build the clip analyzer and its cache if clip analysis is enabled."""
+        if not self.config.get('CLIP_ANALYSIS_ENABLED', True):
+            return None
+        cache = None
+        folder = self.config.get('CLIP_ANALYSIS_CACHE_FOLDER')
+        if folder:
+            cache = ContentCache(
+                folder,
+                max_entries=self.config.get('CLIP_ANALYSIS_CACHE_MEMORY_ENTRIES', 64),
+                max_bytes=self.config.get('CLIP_ANALYSIS_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+            )
+        return ClipAnalyzer(
+            cache,
+            sample_interval=self.config.get('CLIP_ANALYSIS_SAMPLE_INTERVAL', 0.5),
+            max_keyframe_gap=self.config.get('CLIP_ANALYSIS_MAX_KEYFRAME_GAP', 2.0)
+        )
+
+    def _create_segment_cache(self) -> Optional[SegmentCache]:
+        """Build the intro/outro pre-render cache if one is configured."""
+        folder = self.config.get('SEGMENT_CACHE_FOLDER')
+        if not folder:
+            return None
+        return SegmentCache(
+            folder,
+            max_bytes=self.config.get('SEGMENT_CACHE_MAX_BYTES', 1024 * 1024 * 1024)
+        )
 
     def get_video_info(self, video_path: str) -> Dict:
         """Get basic video metadata."""
@@ -35,62 +129,142 @@ class VideoProcessor:
 
     def create_montage(
         self,
-        clip_folder: str,
+        clip_files: List[str],
         intro_file: str,
         outro_file: str,
         music_file: str,
-        output_path: str
+        output_path: str,
+        art_pack: str = 'classic',
+        export_quality: Optional[str] = None,
+        renditions: Optional[List[str]] = None,
+        preview: bool = False
     ) -> float:
-        """Create video montage with beat-synchronized transitions."""
-        video_files = [f for f in os.listdir(clip_folder)
+        """Create video montage with beat-synchronized transitions.
+
+        renditions lists further export qualities rendered from the same
+        frames, next to output_path with the quality as suffix. All written
+        files end up in self.outputs, keyed by quality.
+
+        preview renders quickly at the PREVIEW_QUALITY preset with cheaper
+        filter approximations. output_path is then an HLS playlist that grows
+        while rendering, so playback can start after the first segment.
+        """
+        video_files = [f for f in clip_files
                       if f.endswith(('.mp4', '.avi', '.mov'))]
         
         if not (3 <= len(video_files) <= 6):
             raise ValueError("Please provide 3 to 6 clips")
         
-        video_files = [os.path.join(clip_folder, f) for f in video_files]
         all_clips = [intro_file] + video_files + [outro_file]
         
         # Analyze audio beats
         beat_times = self.audio_processor.analyze_beats(music_file)
         logger.info(f"Detected {len(beat_times)} beats in the music")
+        if self.audio_processor.cache is not None:
+            logger.debug(f"Beat cache: {self.audio_processor.cache.stats()}")
         
-        return self._process_videos(all_clips, beat_times, music_file, output_path)
+        if preview:
+            return self._process_preview(all_clips, beat_times, music_file, output_path, art_pack)
+
+        return self._process_videos(
+            all_clips, beat_times, music_file, output_path, art_pack, export_quality, renditions
+        )
+
+    def _output_frame_count(self, video_path: str, fps: float) -> int:
+        """Number of frames a clip yields once decoded at the output frame rate."""
+        info = self.get_video_info(video_path)
+        if abs(info['fps'] - fps) <= 0.01:
+            return info['frame_count']
+        return int(round(info['duration'] * fps))
+
+    def plan_timeline(
+        self,
+        clips: List[str],
+        beat_times: np.ndarray,
+        fps: float,
+        art_pack: str = 'classic'
+    ) -> TransitionSchedule:
+        """Build the per-frame filter and transition schedule for a montage.
+
+        Body clips are cut on beats to fill MAIN_BODY_DURATION between the
+        intro and the outro, so render time no longer grows with clip length.
+        With clip analysis enabled, each body clip cut shorter than its
+        source plays its most active stretch; clips that play whole are not
+        analyzed. Each body clip transitions in with the art pack's transition type.
+        """
+        frame_counts = [self._output_frame_count(clip, fps) for clip in clips]
+        analyze_clip = None
+        if self.clip_analyzer is not None:
+            def analyze_clip(index: int):
+                # Called only for body clips cut shorter than their source
+                return self.clip_analyzer.analyze(clips[index])
+        pack = self.config['ART_PACKS'][art_pack]
+        pack_filters = pack['filters']
+        clip_filters = [pack_filters[i % len(pack_filters)] for i in range(len(clips))]
+        planner = TimelinePlanner(
+            self.config['TRANSITION_DURATION'],
+            self.config.get('MIN_SHOT_DURATION', 1.0)
+        )
+        with self.profiler.stage('plan'):
+            in_points, lengths = planner.plan_cuts(
+                beat_times, frame_counts, fps, self.config['MAIN_BODY_DURATION'], analyze_clip
+            )
+            return planner.plan(
+                lengths, fps, clip_filters, in_points, frame_counts, pack.get('transition', 'crossfade')
+            )
 
     def _process_videos(
         self,
         clips: List[str],
         beat_times: np.ndarray,
         music_file: str,
-        output_path: str
+        output_path: str,
+        art_pack: str = 'classic',
+        export_quality: Optional[str] = None,
+        renditions: Optional[List[str]] = None
     ) -> float:
-        """Process and combine video clips."""
-        temp_output = f"{output_path}.temp.avi"
+        """Process and combine video clips in a single encode pass."""
+        output_params = self._get_output_params(clips[0], export_quality)
+        output_params['renditions'] = self._rendition_params(clips[0], output_params, renditions)
+        logger.info(f"Rendering at {output_params['width']}x{output_params['height']} "
+                    f"with {output_params['encoder']}")
+        self.outputs = {
+            quality or output_params['quality']: rendition_path(output_path, quality)
+            for quality, _ in self._output_variants(output_params)
+        }
+        self.schedule = self.plan_timeline(clips, beat_times, output_params['fps'], art_pack)
+        logger.debug(f"Timeline: {self.schedule.summary()}")
+
+        if self.segment_cache is not None or self.config.get('RENDER_MODE') == 'parallel':
+            return self._process_videos_segmented(
+                clips, self.schedule, output_params, music_file, output_path, art_pack
+            )
+
+        writer_params = None
+        # Started before the writer so its processes are not forked from a running render
+        pipeline = self._start_pipeline(output_params)
         
         try:
-            # Setup video writer based on first clip
-            writer_params = self._setup_video_writer(clips[0], temp_output)
+            # Setup video writer, muxing music in the same pass
+            writer_params = self._setup_video_writer(output_params, output_path, music_file)
             if not writer_params['writer'].isOpened():
                 raise RuntimeError("Failed to create video writer")
+            writer_params['pipeline'] = pipeline
 
-            current_time = 0.0
-            prev_frames = []
+            transitions = self._transition_engine(self.schedule, writer_params)
 
             # Process each clip
-            for i, video_file in enumerate(clips):
+            for i in range(len(clips)):
                 self._process_clip(
-                    video_file,
+                    clips,
                     i,
-                    current_time,
+                    self.schedule,
                     writer_params,
-                    prev_frames
+                    transitions
                 )
-                current_time += writer_params['clip_duration']
-
-            writer_params['writer'].release()
 
-            # Add audio
-            self._add_audio(temp_output, music_file, output_path)
+            with self.profiler.stage('encode'):
+                writer_params['writer'].release()
             
             final_info = self.get_video_info(output_path)
             logger.info(f"Montage created successfully! Duration: {final_info['duration']:.2f}s")
@@ -98,141 +272,514 @@ class VideoProcessor:
 
         except Exception as e:
             logger.error(f"Error creating montage: {str(e)}")
+            if writer_params is not None:
+                writer_params['writer'].abort()
+            self._remove_outputs()
             raise
         finally:
-            if os.path.exists(temp_output):
-                os.remove(temp_output)
+            self._stop_pipeline(pipeline)
 
-    def _setup_video_writer(
+    def _process_preview(
+        self,
+        clips: List[str],
+        beat_times: np.ndarray,
+        music_file: str,
+        playlist_path: str,
+        art_pack: str = 'classic'
+    ) -> float:
+        """Render a quick preview in a single pass straight to an HLS playlist."""
+        output_params = self._get_output_params(clips[0], self.config.get('PREVIEW_QUALITY', 'preview'))
+        output_params['preview'] = True
+        self.schedule = self.plan_timeline(clips, beat_times, output_params['fps'], art_pack)
+        self.outputs = {'preview': playlist_path}
+        logger.info(f"Rendering preview at {output_params['width']}x{output_params['height']} "
+                    f"@ {output_params['fps']:g} fps to {playlist_path}")
+
+        pipeline = self._start_pipeline(output_params)
+        try:
+            writer_params = self._setup_video_writer(output_params, playlist_path, music_file)
+        except Exception:
+            self._stop_pipeline(pipeline)
+            raise
+        try:
+            writer_params['pipeline'] = pipeline
+            transitions = self._transition_engine(self.schedule, writer_params)
+            for i in range(len(clips)):
+                self._process_clip(clips, i, self.schedule, writer_params, transitions)
+            with self.profiler.stage('encode'):
+                writer_params['writer'].release()
+        except Exception as e:
+            logger.error(f"Error creating preview: {str(e)}")
+            writer_params['writer'].abort()
+            raise
+        finally:
+            self._stop_pipeline(pipeline)
+
+        duration = writer_params['writer'].frames_written / output_params['fps']
+        logger.info(f"Preview created successfully! Duration: {duration:.2f}s")
+        return duration
+
+    def _process_videos_segmented(
+        self,
+        clips: List[str],
+        schedule: TransitionSchedule,
+        output_params: Dict,
+        music_file: str,
+        output_path: str,
+        art_pack: str = 'classic'
+    ) -> float:
+        """Render the montage as separate segments and join them with stream copy.
+
+        Intro and outro come from the segment cache when it is enabled. The
+        remaining clips are rendered one segment per clip in a process pool in
+        parallel mode, or as a single body segment otherwise.
+        """
+        segment_dir = f"{output_path}.segments"
+        os.makedirs(segment_dir, exist_ok=True)
+        last = len(clips) - 1
+        variants = self._output_variants(output_params)
+        segment_paths = {quality: {} for quality, _ in variants}
+        body = list(range(len(clips)))
+
+        try:
+            if self.segment_cache is not None:
+                for i in (0, last):
+                    for quality, params in variants:
+                        segment_paths[quality][i] = self._cached_segment(
+                            clips[i], art_pack, schedule.clip_filter(i), params
+                        )
+                body = body[1:last]
+                logger.debug(f"Segment cache: {self.segment_cache.stats()}")
+
+            if self.config.get('RENDER_MODE') == 'parallel':
+                rendered = self._render_segments_parallel(
+                    clips, body, schedule, output_params, segment_dir
+                )
+            else:
+                body_path = os.path.join(segment_dir, 'body.mp4')
+                pipeline = self._start_pipeline(output_params)
+                try:
+                    writer_params = self._setup_video_writer(output_params, body_path)
+                except Exception:
+                    self._stop_pipeline(pipeline)
+                    raise
+                try:
+                    writer_params['pipeline'] = pipeline
+                    transitions = self._transition_engine(schedule, writer_params)
+                    for i in body:
+                        self._process_clip(clips, i, schedule, writer_params, transitions)
+                    with self.profiler.stage('encode'):
+                        writer_params['writer'].release()
+                except Exception:
+                    writer_params['writer'].abort()
+                    raise
+                finally:
+                    self._stop_pipeline(pipeline)
+                rendered = {body[0]: body_path}
+
+            # Join segments without re-encoding video, muxing music in the same step
+            for quality, _ in variants:
+                for i, path in rendered.items():
+                    segment_paths[quality][i] = rendition_path(path, quality)
+                with self.profiler.stage('mux'):
+                    concat_segments(
+                        [segment_paths[quality][i] for i in sorted(segment_paths[quality])],
+                        rendition_path(output_path, quality),
+                        music_file
+                    )
+
+            final_info = self.get_video_info(output_path)
+            logger.info(f"Montage created successfully! Duration: {final_info['duration']:.2f}s")
+            return final_info['duration']
+
+        except Exception as e:
+            logger.error(f"Error creating montage: {str(e)}")
+            self._remove_outputs()
+            raise
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+    def _remove_outputs(self) -> None:
+        """Delete whatever was written of the current montage's outputs."""
+        for path in self.outputs.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _rendition_params(
         self,
         first_clip: str,
-        output_path: str
-    ) -> Dict:
-        """Setup video writer with parameters from first clip."""
-        cap = cv2.VideoCapture(first_clip)
-        params = {
-            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-            'fps': cap.get(cv2.CAP_PROP_FPS),
-            'clip_duration': cap.get(cv2.CAP_PROP_FRAME_COUNT) / cap.get(cv2.CAP_PROP_FPS),
-            'writer': cv2.VideoWriter(
-                output_path,
-                cv2.VideoWriter_fourcc(*'XVID'),
-                cap.get(cv2.CAP_PROP_FPS),
-                (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                 int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        output_params: Dict,
+        renditions: Optional[List[str]]
+    ) -> List[Dict]:
+        """Size, frame rate and encoder of each extra rendition.
+
+        Renditions are made from the main output's frames, so their size and
+        frame rate are capped at the main output's.
+        """
+        result = []
+        for quality in dict.fromkeys(renditions or []):
+            if quality == output_params['quality'] or quality not in self.config['EXPORT_PRESETS']:
+                continue
+            params = self._get_output_params(first_clip, quality)
+            if params['height'] > output_params['height']:
+                params['width'], params['height'] = output_params['width'], output_params['height']
+            result.append({
+                'quality': quality,
+                'width': params['width'],
+                'height': params['height'],
+                'fps': min(params['fps'], output_params['fps']),
+                'encoder': params['encoder']
+            })
+        return result
+
+    @staticmethod
+    def _output_variants(output_params: Dict) -> List[Tuple[Optional[str], Dict]]:
+        """(quality, standalone output params) for the main output, then each rendition.
+
+        The main output's quality is None, matching rendition_path.
+        """
+        main = {key: value for key, value in output_params.items() if key != 'renditions'}
+        variants = [(None, main)]
+        for rendition in output_params.get('renditions', []):
+            params = {key: value for key, value in rendition.items() if key != 'quality'}
+            params['quality'] = rendition['quality']
+            variants.append((rendition['quality'], params))
+        return variants
+
+    def _render_segments_parallel(
+        self,
+        clips: List[str],
+        indices: List[int],
+        schedule: TransitionSchedule,
+        output_params: Dict,
+        segment_dir: str
+    ) -> Dict[int, str]:
+        """Render each of the given clips to its own segment in a process pool."""
+        settings = {key: value for key, value in self.config.items() if key.isupper()}
+
+        tasks = []
+        for i in indices:
+            tasks.append({
+                'config': settings,
+                'schedule': schedule,
+                'output_params': output_params,
+                'clips': clips,
+                'index': i,
+                'segment_path': os.path.join(segment_dir, f'segment_{i:03d}.mp4'),
+                'profile': self.profiler.enabled
+            })
+
+        workers = min(len(tasks), self.config.get('SEGMENT_WORKERS') or os.cpu_count() or 1)
+        logger.info(f"Rendering {len(tasks)} segments with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for report in executor.map(_render_segment, tasks):
+                if report is not None:
+                    self.profiler.merge(report)
+        return {task['index']: task['segment_path'] for task in tasks}
+
+    def _cached_segment(
+        self,
+        video_file: str,
+        art_pack: str,
+        filter_name: Optional[str],
+        output_params: Dict
+    ) -> str:
+        """Return the pre-rendered segment for a clip, rendering it on a miss."""
+        key = self.segment_cache.key(
+            video_file, art_pack, filter_name, output_params,
+            self.config.get('FILTERS', {}).get(filter_name)
+        )
+        with self.profiler.stage('segment_cache'):
+            return self.segment_cache.get_or_render(
+                key,
+                lambda path: self._render_clip_segment(video_file, filter_name, output_params, path)
+            )
+
+    def _render_clip_segment(
+        self,
+        video_file: str,
+        filter_name: Optional[str],
+        output_params: Dict,
+        segment_path: str
+    ) -> int:
+        """Render one clip on its own to a video-only segment."""
+        frame_count = self._output_frame_count(video_file, output_params['fps'])
+        planner = TimelinePlanner(self.config['TRANSITION_DURATION'])
+        schedule = planner.plan([frame_count], output_params['fps'], [filter_name])
+
+        writer_params = self._setup_video_writer(output_params, segment_path)
+        try:
+            frames = self._process_clip(
+                [video_file], 0, schedule, writer_params, self._transition_engine(schedule, writer_params)
             )
+            with self.profiler.stage('encode'):
+                writer_params['writer'].release()
+            return frames
+        except Exception:
+            writer_params['writer'].abort()
+            raise
+
+    def warm_segment_cache(
+        self,
+        intro_file: str,
+        outro_file: str,
+        art_packs: Optional[List[str]] = None,
+        export_qualities: Optional[List[str]] = None
+    ) -> int:
+        """Pre-render intro and outro for each art pack and return how many were rendered.
+
+        Output settings follow the intro, as they do for any montage built from
+        it. The outro's filter depends on how many clips precede it, so every
+        clip count create_montage accepts is covered. Previews never use the
+        cache, so their preset is left out unless asked for.
+        """
+        if self.segment_cache is None:
+            return 0
+
+        if export_qualities is None:
+            preview_quality = self.config.get('PREVIEW_QUALITY', 'preview')
+            export_qualities = [q for q in self.config['EXPORT_PRESETS'] if q != preview_quality]
+
+        misses = self.segment_cache.misses
+        for export_quality in export_qualities:
+            output_params = self._get_output_params(intro_file, export_quality)
+            for art_pack in art_packs or list(self.config['ART_PACKS']):
+                pack_filters = self.config['ART_PACKS'][art_pack]['filters']
+                self._cached_segment(intro_file, art_pack, pack_filters[0], output_params)
+                for clip_count in range(3, 7):
+                    outro_filter = pack_filters[(clip_count + 1) % len(pack_filters)]
+                    self._cached_segment(outro_file, art_pack, outro_filter, output_params)
+
+        rendered = self.segment_cache.misses - misses
+        logger.info(f"Warmed segment cache: {rendered} segments rendered")
+        return rendered
+
+    def _get_output_params(self, first_clip: str, export_quality: Optional[str] = None) -> Dict:
+        """Output size, frame rate and encoder settings for an export quality.
+
+        Size follows the first clip's aspect ratio, scaled down to the preset
+        height but never up, and so does frame rate where the preset caps it.
+        Clips are decoded straight to this size and rate.
+        """
+        presets = self.config['EXPORT_PRESETS']
+        preset = presets.get(export_quality) or presets[self.config['DEFAULT_EXPORT_QUALITY']]
+
+        cap = cv2.VideoCapture(first_clip)
+        try:
+            source_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            source_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+        finally:
+            cap.release()
+
+        if preset.get('max_fps'):
+            fps = min(fps, preset['max_fps'])
+
+        height = min(preset['height'], source_height)
+        width = round(source_width * height / source_height)
+        return {
+            'quality': export_quality if export_quality in presets else self.config['DEFAULT_EXPORT_QUALITY'],
+            # yuv420p output needs even dimensions
+            'width': width & ~1,
+            'height': height & ~1,
+            'fps': fps,
+            # Segments joined with stream copy must share encoder settings
+            'encoder': {
+                'codec': 'libx264',
+                'preset': preset['preset'],
+                'crf': preset['crf'],
+                'maxrate': preset['maxrate']
+            }
         }
-        cap.release()
+
+    def _setup_video_writer(
+        self,
+        output_params: Dict,
+        output_path: str,
+        music_file: Optional[str] = None
+    ) -> Dict:
+        """Setup FFmpeg pipe writer for the given output parameters and renditions."""
+        params = dict(output_params)
+        output_options = None
+        if params.get('preview'):
+            output_options = hls_options(output_path, self.config.get('PREVIEW_SEGMENT_SECONDS', 2.0))
+        params['writer'] = FFmpegWriter(
+            output_path,
+            params['width'],
+            params['height'],
+            params['fps'],
+            audio_path=music_file,
+            renditions=[
+                dict(rendition, path=rendition_path(output_path, rendition['quality']))
+                for rendition in params.get('renditions', [])
+            ],
+            output_options=output_options,
+            **params['encoder']
+        ).open()
         return params
 
+    def _start_pipeline(self, output_params: Dict) -> Optional[FramePipeline]:
+        """Frame pipeline for the clips rendered through one writer, if FRAME_PIPELINE_WORKERS asks for one."""
+        workers = self.config.get('FRAME_PIPELINE_WORKERS', 0)
+        if not workers:
+            return None
+        return FramePipeline(
+            self.config,
+            output_params['width'],
+            output_params['height'],
+            workers,
+            slots=self.config.get('FRAME_PIPELINE_SLOTS') or None,
+            preview=bool(output_params.get('preview')),
+            profiler=self.profiler
+        )
+
+    @staticmethod
+    def _stop_pipeline(pipeline: Optional[FramePipeline]) -> None:
+        if pipeline is not None:
+            pipeline.close()
+
+    @staticmethod
+    def _transition_engine(schedule: TransitionSchedule, writer_params: Dict) -> TransitionEngine:
+        """Transition engine for the clips rendered through one writer."""
+        return TransitionEngine(
+            writer_params['width'],
+            writer_params['height'],
+            schedule.transition_frames,
+            schedule.transition_type
+        )
+
     def _process_clip(
         self,
-        video_file: str,
+        clips: List[str],
         index: int,
-        current_time: float,
+        schedule: TransitionSchedule,
         writer_params: Dict,
-        prev_frames: List[np.ndarray]
-    ) -> None:
-        """Process individual video clip."""
+        transitions: TransitionEngine
+    ) -> int:
+        """Process individual video clip and return the number of frames written.
+
+        The clip's first frames are blended over the tail of the clip before
+        it, which transitions holds when that clip went through the same
+        writer and is decoded again here otherwise. When the next clip
+        transitions in, this clip's own tail is left in transitions for it.
+
+        With a frame pipeline in writer_params, decoding and filtering run in
+        its processes and frames arrive here filtered, in order.
+        """
+        video_file = clips[index]
         logger.info(f"Processing: {video_file}")
-        cap = cv2.VideoCapture(video_file)
         frame_count = 0
+        profiler = self.profiler
+        start = time.perf_counter()
         
-        filter_name = ['warm', 'cool', 'cinematic'][index % 3]
+        filter_name = schedule.clip_filter(index)
         logger.debug(f"Applying filter: {filter_name}")
+
+        length = schedule.clip_frames(index)
+        keep_tail = index + 1 < schedule.num_clips and schedule.transitions_in(index + 1)
+        tail = schedule.clip_tail_frames(index) if keep_tail else 0
+        blend = schedule.transitions_in(index)
+        if blend and not transitions.has_tail(index - 1):
+            self._load_tail(clips, index - 1, schedule, writer_params, transitions)
+        blend = blend and transitions.has_tail(index - 1)
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame = self._process_frame(
-                frame,
-                frame_count,
-                current_time,
-                writer_params,
-                filter_name,
-                prev_frames
+        # Decode ahead, already scaled to the output size, starting at the
+        # clip's in-point and stopping once its cut and tail are filled
+        pipeline = writer_params.get('pipeline')
+        clip_start = schedule.clip_in_point(index) / writer_params['fps']
+        if pipeline is not None:
+            source = pipeline.clip(
+                video_file, writer_params['fps'], filter_name, start=clip_start, max_frames=length + tail
             )
-            
-            writer_params['writer'].write(frame)
-            frame_count += 1
-            
-            if frame_count % 100 == 0:
-                logger.debug(f"Processed {frame_count} frames...")
-        
-        cap.release()
-        logger.info(f"Completed {video_file}: {frame_count} frames")
+        else:
+            source = FrameSource(
+                video_file,
+                writer_params['width'],
+                writer_params['height'],
+                fps=writer_params['fps'],
+                prefetch=self.config.get('DECODE_PREFETCH', 8),
+                start=clip_start,
+                max_frames=length + tail
+            )
+        with source:
+            frames = iter(source)
+            while True:
+                # Time spent waiting here is decoding the prefetch could not hide
+                with profiler.stage('decode'):
+                    frame = next(frames, None)
+                if frame is None:
+                    break
 
-    def _process_frame(
+                if pipeline is None:
+                    frame = self._process_frame(frame, writer_params, filter_name)
+
+                # Frames past the cut are only shown blended under the next clip
+                if frame_count >= length:
+                    with profiler.stage('transition'):
+                        transitions.store(frame)
+                    frame_count += 1
+                    continue
+
+                alpha = schedule.transition_alpha(index, frame_count) if blend else None
+                if alpha is not None:
+                    with profiler.stage('transition'):
+                        frame = transitions.blend(frame, frame_count, alpha)
+                
+                with profiler.stage('encode'):
+                    writer_params['writer'].write(frame)
+                if keep_tail and frame_count == length - 1:
+                    transitions.begin_tail(index)
+                    transitions.store(frame)
+                frame_count += 1
+
+        frame_count = min(frame_count, length)
+        elapsed = time.perf_counter() - start
+        profiler.record_clip(video_file, index, frame_count, elapsed)
+        logger.info(f"Completed {video_file}: {frame_count} frames in {elapsed:.2f}s "
+                    f"({frame_count / max(elapsed, 1e-9):.1f} fps)")
+        return frame_count
+
+    def _load_tail(
         self,
-        frame: np.ndarray,
-        frame_count: int,
-        current_time: float,
+        clips: List[str],
+        clip: int,
+        schedule: TransitionSchedule,
         writer_params: Dict,
-        filter_name: str,
-        prev_frames: List[np.ndarray]
-    ) -> np.ndarray:
-        """Process individual frame with filters and transitions."""
-        if frame.shape[:2] != (writer_params['height'], writer_params['width']):
-            frame = cv2.resize(frame, (writer_params['width'], writer_params['height']))
-        
-        frame = self.filter_processor.process_frame(frame, filter_name)
-        
-        frame_time = current_time + (frame_count / writer_params['fps'])
-        nearest_beat = self.audio_processor.get_nearest_beat(frame_time)
-        
-        if nearest_beat is not None and prev_frames:
-            beat_distance = abs(frame_time - nearest_beat)
-            if beat_distance < (self.config['TRANSITION_DURATION'] / 2):
-                frame = self._apply_transition(
-                    frame,
-                    prev_frames,
-                    frame_count,
-                    beat_distance
-                )
-        
-        return frame
+        transitions: TransitionEngine
+    ) -> None:
+        """Decode a clip's last shown frame and its tail into transitions.
+
+        Used when the clip was rendered to another segment or in another process.
+        """
+        fps = writer_params['fps']
+        last_shown = schedule.clip_in_point(clip) + schedule.clip_frames(clip) - 1
+        filter_name = schedule.clip_filter(clip)
+        transitions.begin_tail(clip)
+        with self.profiler.stage('transition'):
+            with FrameSource(
+                clips[clip],
+                writer_params['width'],
+                writer_params['height'],
+                fps=fps,
+                prefetch=self.config.get('DECODE_PREFETCH', 8),
+                start=last_shown / fps,
+                max_frames=1 + schedule.clip_tail_frames(clip)
+            ) as source:
+                for frame in source:
+                    transitions.store(self._process_frame(frame, writer_params, filter_name))
+        logger.debug(f"Loaded {transitions.count} tail frames of {clips[clip]}")
 
-    def _apply_transition(
+    def _process_frame(
         self,
         frame: np.ndarray,
-        prev_frames: List[np.ndarray],
-        frame_count: int,
-        beat_distance: float
+        writer_params: Dict,
+        filter_name: Optional[str]
     ) -> np.ndarray:
-        """Apply transition effect between frames."""
-        alpha = 1.0 - (beat_distance / (self.config['TRANSITION_DURATION'] / 2))
-        frame_idx = min(len(prev_frames) - 1, frame_count)
-        
-        if frame_idx < len(prev_frames):
-            return cv2.addWeighted(
-                prev_frames[frame_idx],
-                1.0 - alpha,
-                frame,
-                alpha,
-                0
-            )
-        return frame
-
-    def _add_audio(
-        self,
-        video_path: str,
-        audio_path: str,
-        output_path: str
-    ) -> None:
-        """Add background audio to video using FFmpeg."""
-        logger.info("Adding background audio...")
-        cmd = [
-            'ffmpeg', '-y',
-            '-i', video_path,
-            '-i', audio_path,
-            '-c:v', 'libx264',
-            '-preset', 'ultrafast',
-            '-c:a', 'aac',
-            '-shortest',
-            output_path
-        ]
+        """Process individual frame with its filter."""
+        if frame.shape[:2] != (writer_params['height'], writer_params['width']):
+            with self.profiler.stage('resize'):
+                frame = cv2.resize(frame, (writer_params['width'], writer_params['height']))
         
-        subprocess.run(cmd, check=True)
+        filter_processor = self.preview_filter_processor if writer_params.get('preview') else self.filter_processor
+        with self.profiler.stage('filter'):
+            return filter_processor.process_frame(frame, filter_name)
@@ -0,0 +1,84 @@
+from flask import Blueprint, jsonify, current_app, redirect
+import os
+import logging
+from jobs import DONE, FAILED
+from storage import send_montage
+from workspace import Workspace
+
+logger = logging.getLogger(__name__)
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the state of a render job."""
+    job = current_app.extensions['job_queue'].get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'montage_id': job['montage_id'],
+        'status': job['status'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'error': job['error'],
+        'profile': (job['result'] or {}).get('profile')
+    })
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Download the output of a finished render job.
+
+    Montage renders and exports send their file; previews redirect to
+    their playlist while the workspace holding it still exists.
+    """
+    job = current_app.extensions['job_queue'].get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+
+    if job['status'] == FAILED:
+        return jsonify({
+            'success': False,
+            'status': job['status'],
+            'error': job['error']
+        }), 500
+
+    if job['status'] != DONE:
+        return jsonify({
+            'success': False,
+            'status': job['status'],
+            'error': 'Job has not finished yet'
+        }), 409
+
+    if job['kind'] == 'render_preview':
+        result = job['result']
+        if not Workspace(result['montage_id']).exists():
+            return jsonify({
+                'success': False,
+                'error': 'Preview is no longer available, its montage was committed or expired'
+            }), 409
+        return redirect(f"/api/previews/{result['montage_id']}/{result['preview_id']}/index.m3u8")
+
+    if job['kind'] not in ('render_montage', 'export_montage'):
+        return jsonify({
+            'success': False,
+            'error': 'Job produces no file'
+        }), 404
+
+    try:
+        output_path = job['result']['output_path']
+        return send_montage(output_path, os.path.basename(output_path))
+    except Exception as e:
+        logger.error(f"Error sending result for job {job_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to send job result'
+        }), 500
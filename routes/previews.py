@@ -0,0 +1,106 @@
+from flask import Blueprint, jsonify, request, send_from_directory
+import logging
+import os
+import config
+from jobs import JobConflictError, QueueFullError
+from routes.uploads import enqueue_montage, enqueue_preview, job_conflict
+from storage import MONTAGE_ID_PATTERN
+from workspace import Workspace
+
+logger = logging.getLogger(__name__)
+previews_bp = Blueprint('previews', __name__)
+
+PREVIEW_MIMETYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t'
+}
+
+
+def _error(message: str, status: int):
+    return jsonify({
+        'success': False,
+        'error': message
+    }), status
+
+
+def _workspace(montage_id: str):
+    """Workspace of a montage id from the URL, or None if the id is not valid."""
+    if not MONTAGE_ID_PATTERN.match(montage_id):
+        return None
+    return Workspace(montage_id)
+
+
+@previews_bp.route('/<montage_id>', methods=['POST'])
+def create_preview(montage_id):
+    """Preview an uploaded montage again, typically with another art pack."""
+    workspace = _workspace(montage_id)
+    if workspace is None or not workspace.exists():
+        return _error('Montage not found', 404)
+
+    art_pack = (request.get_json(silent=True) or {}).get('art_pack')
+    if not art_pack or art_pack not in config.ART_PACKS:
+        return _error('Please select a valid Art Pack', 400)
+
+    try:
+        return enqueue_preview(montage_id, art_pack)
+    except QueueFullError as e:
+        logger.warning(str(e))
+        return _error(str(e), 503)
+    except JobConflictError as e:
+        return job_conflict(str(e), e.job_id)
+
+
+@previews_bp.route('/<montage_id>/commit', methods=['POST'])
+def commit_preview(montage_id):
+    """Queue the full-quality render of a previewed montage.
+
+    Refused with 409 while a preview or render of the montage is pending:
+    the render removes the workspace once it is done.
+    """
+    workspace = _workspace(montage_id)
+    if workspace is None or not workspace.exists():
+        return _error('Montage not found', 404)
+
+    data = request.get_json(silent=True) or {}
+    art_pack = data.get('art_pack')
+    if not art_pack or art_pack not in config.ART_PACKS:
+        return _error('Please select a valid Art Pack', 400)
+
+    export_quality = data.get('export_quality', config.DEFAULT_EXPORT_QUALITY)
+    if export_quality not in config.EXPORT_PRESETS:
+        export_quality = config.DEFAULT_EXPORT_QUALITY
+    renditions = [q for q in data.get('renditions') or [] if q in config.EXPORT_PRESETS]
+
+    try:
+        return enqueue_montage(
+            montage_id,
+            workspace.clip_files(),
+            workspace.music_file(),
+            art_pack,
+            export_quality,
+            renditions
+        )
+    except QueueFullError as e:
+        logger.warning(str(e))
+        return _error(str(e), 503)
+    except JobConflictError as e:
+        return job_conflict(str(e), e.job_id)
+
+
+@previews_bp.route('/<montage_id>/<preview_id>/<filename>', methods=['GET'])
+def preview_file(montage_id, preview_id, filename):
+    """Serve the playlist and segments of a preview, including while it renders."""
+    mimetype = PREVIEW_MIMETYPES.get(os.path.splitext(filename)[1])
+    if mimetype is None:
+        return _error('Not found', 404)
+
+    workspace = _workspace(montage_id)
+    if workspace is None:
+        return _error('Not found', 404)
+    path = os.path.relpath(os.path.join(workspace.preview_dir(preview_id), filename), workspace.root)
+    # send_from_directory rejects paths escaping the workspace root
+    response = send_from_directory(os.path.abspath(workspace.root), path, mimetype=mimetype)
+    if filename.endswith('.m3u8'):
+        # The playlist grows until the preview is done
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,6 +1,9 @@
-import os
 from flask import Blueprint, jsonify, request, current_app, url_for
 import logging
+from typing import Any, Dict, Optional
+import config
+from jobs import DONE, QueueFullError, export_montage as export_montage_job
+from storage import MontageStorage, send_montage
 
 logger = logging.getLogger(__name__)
 share_bp = Blueprint('share', __name__)
@@ -21,24 +24,59 @@ def get_share_link(montage_id):
             'error': 'Failed to generate share link'
         }), 500
 
+def _finished_montage(montage_id: str) -> Optional[Dict[str, Any]]:
+    """Metadata of a montage that has been rendered, or None."""
+    montage = current_app.extensions['montage_index'].get(montage_id)
+    if montage is None or montage['status'] != DONE:
+        return None
+    return montage
+
+def _renditions(montage: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    """Stream and download URLs of the renditions already rendered for a montage."""
+    return {
+        quality: {
+            'stream_url': url_for('share.stream_montage', montage_id=montage['id'], quality=quality),
+            'download_url': url_for('share.download_montage', montage_id=montage['id'], quality=quality)
+        }
+        for quality in montage['renditions']
+    }
+
+def _summary(montage: Dict[str, Any]) -> Dict[str, Any]:
+    """Public description of a finished montage."""
+    return {
+        'montage_id': montage['id'],
+        'art_pack': montage['art_pack'],
+        'export_quality': montage['export_quality'],
+        'duration': montage['duration'],
+        'created_at': montage['created_at'],
+        'montage_url': url_for('share.stream_montage', montage_id=montage['id']),
+        'download_url': url_for('share.download_montage', montage_id=montage['id']),
+        'renditions': _renditions(montage)
+    }
+
+@share_bp.route('/montages', methods=['GET'])
+def list_montages():
+    """List finished montages, newest first, paging with ?before=<created_at>."""
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    before = request.args.get('before', type=float)
+    montages = current_app.extensions['montage_index'].list(DONE, before, limit)
+    return jsonify({
+        'success': True,
+        'montages': [_summary(montage) for montage in montages]
+    })
+
 @share_bp.route('/montage/<montage_id>', methods=['GET'])
 def view_montage(montage_id):
-    """View a shared montage."""
+    """View a shared montage and the renditions available for it."""
     try:
-        # In a real implementation, we would fetch the montage details from a database
-        # For now, we'll just check if the file exists
-        montage_path = os.path.join(current_app.root_path, 'uploads', f'montage_{montage_id}.mp4')
-        
-        if not os.path.exists(montage_path):
+        montage = _finished_montage(montage_id)
+        if montage is None:
             return jsonify({
                 'success': False,
                 'error': 'Montage not found'
             }), 404
 
-        return jsonify({
-            'success': True,
-            'montage_url': url_for('static', filename=f'montages/montage_{montage_id}.mp4')
-        })
+        return jsonify(dict(_summary(montage), success=True))
     except Exception as e:
         logger.error(f"Error accessing montage: {str(e)}")
         return jsonify({
@@ -46,27 +84,91 @@ def view_montage(montage_id):
             'error': 'Failed to access montage'
         }), 500
 
+def _send(montage_id: str, as_attachment: bool):
+    """Serve a montage, or the rendition named by ?quality=."""
+    quality = request.args.get('quality')
+    if quality is not None and quality not in config.EXPORT_PRESETS:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown export quality: {quality}'
+        }), 400
+
+    montage = _finished_montage(montage_id)
+    if quality == (montage or {}).get('export_quality'):
+        quality = None  # the main file
+    if montage is None or (quality is not None and quality not in montage['renditions']):
+        return jsonify({
+            'success': False,
+            'error': 'Montage not found'
+        }), 404
+
+    download_name = f"montage_{quality or montage['export_quality']}.mp4" if as_attachment else None
+    try:
+        return send_montage(MontageStorage().path(montage_id, quality), download_name)
+    except FileNotFoundError:
+        logger.error(f"Montage {montage_id} is indexed but missing from storage")
+        return jsonify({
+            'success': False,
+            'error': 'Montage not found'
+        }), 404
+
+@share_bp.route('/stream/<montage_id>', methods=['GET'])
+def stream_montage(montage_id):
+    """Play a montage in the browser, seeking with byte ranges."""
+    return _send(montage_id, as_attachment=False)
+
+@share_bp.route('/download/<montage_id>', methods=['GET'])
+def download_montage(montage_id):
+    """Download a montage, or the rendition named by ?quality=."""
+    return _send(montage_id, as_attachment=True)
+
 @share_bp.route('/export/<montage_id>', methods=['POST'])
 def export_montage(montage_id):
-    """Export a montage with specified quality settings."""
+    """Queue a re-encode of a montage at the requested export quality."""
     try:
-        quality = request.json.get('quality', 'high')
-        
-        quality_settings = {
-            'high': {'resolution': '1920x1080', 'bitrate': '8M'},
-            'medium': {'resolution': '1280x720', 'bitrate': '4M'},
-            'low': {'resolution': '854x480', 'bitrate': '2M'}
-        }
-        
-        settings = quality_settings.get(quality, quality_settings['high'])
-        
-        # Here we would process the video with the specified quality settings
-        # For now, we'll just return success
+        quality = (request.get_json(silent=True) or {}).get('quality', config.DEFAULT_EXPORT_QUALITY)
+        if quality not in config.EXPORT_PRESETS:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown export quality: {quality}'
+            }), 400
+
+        montage = _finished_montage(montage_id)
+        if montage is None:
+            return jsonify({
+                'success': False,
+                'error': 'Montage not found'
+            }), 404
+
+        # Renditions made alongside the montage are served as they are
+        if quality == montage['export_quality'] or quality in montage['renditions']:
+            return jsonify({
+                'success': True,
+                'status': 'done',
+                'download_url': url_for('share.download_montage', montage_id=montage_id, quality=quality),
+                'settings': config.EXPORT_PRESETS[quality]
+            })
+
+        job_id = current_app.extensions['job_queue'].submit(export_montage_job, {
+            'montage_id': montage_id,
+            'export_quality': quality
+        })
+        logger.info(f"Export of montage {montage_id} at {quality} queued as job {job_id}")
+
         return jsonify({
             'success': True,
-            'message': f'Montage exported with {quality} quality',
-            'settings': settings
-        })
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/jobs/{job_id}',
+            'result_url': f'/api/jobs/{job_id}/result',
+            'settings': config.EXPORT_PRESETS[quality]
+        }), 202
+    except QueueFullError as e:
+        logger.warning(str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         logger.error(f"Error exporting montage: {str(e)}")
         return jsonify({
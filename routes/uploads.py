@@ -0,0 +1,295 @@
+from flask import Blueprint, jsonify, request, current_app
+import logging
+import os
+import uuid
+from typing import List, Optional
+import config
+from jobs import JobConflictError, QueueFullError, render_montage, render_preview
+from processors.content_cache import file_digest
+from uploads import InvalidUploadError, UploadSession
+from utils import allowed_file
+from storage import MONTAGE_ID_PATTERN
+from workspace import Workspace, QuotaExceededError, check_quota, maybe_collect_garbage
+
+logger = logging.getLogger(__name__)
+uploads_bp = Blueprint('uploads', __name__)
+
+
+def enqueue_montage(
+    montage_id: str,
+    clip_paths: List[str],
+    music_path: str,
+    art_pack: str,
+    export_quality: str,
+    renditions: Optional[List[str]] = None,
+    upload_seconds: Optional[float] = None,
+    job_id: Optional[str] = None
+):
+    """Queue the render of a montage whose inputs are in its workspace.
+
+    upload_seconds is how long saving the upload took, reported in the job's profile.
+    job_id, if given, is the id to queue the job under. Raises
+    JobConflictError while another job of the montage is pending, since
+    the render removes the workspace that job reads from.
+    """
+    job_queue = current_app.extensions['job_queue']
+    # Checked before the index is touched, so a pending render keeps its entry
+    conflict = job_queue.conflicting_job(montage_id, exclusive=True)
+    if conflict is not None:
+        raise JobConflictError(f"Montage {montage_id} already has a {conflict['status']} job", conflict['id'])
+
+    montage_index = current_app.extensions['montage_index']
+    montage_index.add(montage_id, art_pack, export_quality, file_digest(music_path))
+    try:
+        job_id = job_queue.submit(render_montage, {
+            'montage_id': montage_id,
+            'clip_files': clip_paths,
+            'intro_file': config.INTRO_FILE,
+            'outro_file': config.OUTRO_FILE,
+            'music_file': music_path,
+            'art_pack': art_pack,
+            'export_quality': export_quality,
+            'renditions': renditions or [],
+            'upload_seconds': upload_seconds
+        }, job_id=job_id, exclusive=True)
+    except QueueFullError:
+        montage_index.delete(montage_id)
+        raise
+
+    logger.info(f"Montage {montage_id} queued as job {job_id}")
+
+    # Generate share link
+    share_url = request.host_url.rstrip('/') + f'/api/share/montage/{montage_id}'
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/jobs/{job_id}',
+        'result_url': f'/api/jobs/{job_id}/result',
+        'montage_id': montage_id,
+        'share_url': share_url,
+        'download_url': f'/api/share/export/{montage_id}'
+    }), 202
+
+
+def enqueue_preview(montage_id: str, art_pack: str, job_id: Optional[str] = None):
+    """Queue a preview render of the montage whose inputs are in its workspace.
+
+    The playlist URL is returned right away. It answers 404 until the first
+    segment has been written, then grows while the preview renders. Raises
+    JobConflictError while the montage's full render is pending.
+    """
+    workspace = Workspace(montage_id)
+    preview_id = uuid.uuid4().hex[:12]
+    preview_dir = workspace.preview_dir(preview_id)
+    os.makedirs(preview_dir, exist_ok=True)
+
+    job_id = current_app.extensions['job_queue'].submit(render_preview, {
+        'montage_id': montage_id,
+        'intro_file': config.INTRO_FILE,
+        'outro_file': config.OUTRO_FILE,
+        'playlist_path': os.path.join(preview_dir, 'index.m3u8'),
+        'art_pack': art_pack
+    }, job_id=job_id)
+
+    logger.info(f"Preview {preview_id} of montage {montage_id} queued as job {job_id}")
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/jobs/{job_id}',
+        'montage_id': montage_id,
+        'preview_id': preview_id,
+        'playlist_url': f'/api/previews/{montage_id}/{preview_id}/index.m3u8',
+        'commit_url': f'/api/previews/{montage_id}/commit'
+    }), 202
+
+
+def _error(message: str, status: int):
+    return jsonify({
+        'success': False,
+        'error': message
+    }), status
+
+
+def job_conflict(message: str, job_id: str):
+    """409 response pointing at the pending job a request conflicts with."""
+    return jsonify({
+        'success': False,
+        'error': message,
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}'
+    }), 409
+
+
+def _load_session(upload_id: str):
+    if not MONTAGE_ID_PATTERN.match(upload_id):
+        return None
+    workspace = Workspace(upload_id)
+    if not workspace.exists():
+        return None
+    return UploadSession.load(workspace)
+
+
+@uploads_bp.route('', methods=['POST'])
+def init_upload():
+    """Start a resumable upload.
+
+    Expects JSON with art_pack, optional export_quality and renditions, and
+    files: a list of {name, size, kind} where kind is 'clip' or 'music'.
+    """
+    data = request.get_json(silent=True) or {}
+    art_pack = data.get('art_pack')
+    if not art_pack or art_pack not in config.ART_PACKS:
+        return _error('Please select a valid Art Pack', 400)
+
+    export_quality = data.get('export_quality', config.DEFAULT_EXPORT_QUALITY)
+    if export_quality not in config.EXPORT_PRESETS:
+        export_quality = config.DEFAULT_EXPORT_QUALITY
+    renditions = [q for q in data.get('renditions') or [] if q in config.EXPORT_PRESETS]
+
+    files = data.get('files') or []
+    try:
+        files = [
+            {'name': str(f['name']), 'size': int(f['size']), 'kind': f['kind']}
+            for f in files
+        ]
+    except (KeyError, TypeError, ValueError):
+        return _error('Each file needs a name, size and kind', 400)
+
+    clips = [f for f in files if f['kind'] == 'clip']
+    music = [f for f in files if f['kind'] == 'music']
+    if not (3 <= len(clips) <= 6) or len(music) != 1 or len(clips) + len(music) != len(files):
+        return _error('Please upload between 3 and 6 video clips and one music file', 400)
+    if not all(allowed_file(f['name']) and f['size'] > 0 for f in files):
+        return _error('Unsupported file type or empty file', 400)
+
+    total_size = sum(f['size'] for f in files)
+    if total_size > config.MAX_CONTENT_LENGTH:
+        return _error('Upload is too large', 413)
+
+    try:
+        maybe_collect_garbage(current_app.extensions['job_queue'].pending_montages())
+        check_quota(total_size)
+    except QuotaExceededError as e:
+        logger.warning(str(e))
+        return _error('Server storage is full, please try again later', 507)
+
+    upload_id = str(uuid.uuid4())
+    workspace = Workspace(upload_id).create()
+    try:
+        session = UploadSession.create(workspace, files, art_pack, export_quality, renditions)
+    except OSError as e:
+        logger.error(f"Error creating upload {upload_id}: {str(e)}")
+        workspace.cleanup()
+        return _error('Failed to create upload', 500)
+
+    logger.info(f"Started upload {upload_id} with {len(files)} files, {total_size} bytes")
+    return jsonify({
+        'success': True,
+        'upload_id': upload_id,
+        'chunk_size': config.UPLOAD_CHUNK_BYTES,
+        'files': session.status()
+    }), 201
+
+
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Report which byte ranges of each file have been received."""
+    session = _load_session(upload_id)
+    if session is None:
+        return _error('Upload not found', 404)
+
+    return jsonify({
+        'success': True,
+        'upload_id': upload_id,
+        'complete': session.complete(),
+        'files': session.status()
+    })
+
+
+@uploads_bp.route('/<upload_id>/files/<int:index>', methods=['PUT'])
+def put_chunk(upload_id, index):
+    """Write the request body into a file at the offset given by ?offset=."""
+    session = _load_session(upload_id)
+    if session is None:
+        return _error('Upload not found', 404)
+    if not 0 <= index < len(session.manifest['files']):
+        return _error('File not found', 404)
+    if session.manifest.get('finalized'):
+        return _error('Upload is already finalized', 409)
+
+    offset = request.args.get('offset', type=int)
+    length = request.content_length
+    if offset is None or not length:
+        return _error('Chunk needs an offset and a Content-Length', 400)
+
+    try:
+        session.write_chunk(index, offset, request.stream, length)
+    except ValueError as e:
+        return _error(str(e), 416)
+    except InvalidUploadError as e:
+        logger.warning(f"Rejected chunk for upload {upload_id}: {str(e)}")
+        return _error(str(e), 415)
+
+    status = session.status()[index]
+    return jsonify({
+        'success': True,
+        'received': status['received'],
+        'missing': status['missing']
+    })
+
+
+@uploads_bp.route('/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Verify a completed upload and queue its montage render, or a preview with {"preview": true}."""
+    session = _load_session(upload_id)
+    if session is None:
+        return _error('Upload not found', 404)
+    if not session.complete():
+        return jsonify({
+            'success': False,
+            'error': 'Upload is incomplete',
+            'files': session.status()
+        }), 409
+
+    # Claimed under the manifest lock, so only one finalize queues a job
+    job_id = str(uuid.uuid4())
+    existing_job = session.claim(job_id)
+    if existing_job is not None:
+        return job_conflict('Upload is already finalized', existing_job)
+
+    try:
+        paths = session.finalize()
+        if (request.get_json(silent=True) or {}).get('preview'):
+            return enqueue_preview(upload_id, session.manifest['art_pack'], job_id)
+        return enqueue_montage(
+            upload_id,
+            paths['clip'],
+            paths['music'][0],
+            session.manifest['art_pack'],
+            session.manifest['export_quality'],
+            session.manifest.get('renditions'),
+            job_id=job_id
+        )
+    except InvalidUploadError as e:
+        logger.warning(f"Rejected upload {upload_id}: {str(e)}")
+        session.workspace.cleanup()
+        return _error(str(e), 415)
+    except QueueFullError as e:
+        # Keep the workspace so the client can finalize again later
+        logger.warning(str(e))
+        session.release()
+        return _error(str(e), 503)
+    except JobConflictError as e:
+        logger.warning(str(e))
+        session.release()
+        return job_conflict(str(e), e.job_id)
+    except Exception as e:
+        logger.error(f"Error finalizing upload {upload_id}: {str(e)}")
+        # Only a job that was actually queued may keep the claim
+        if current_app.extensions['job_queue'].get(job_id) is None:
+            session.release()
+        return _error('Failed to finalize upload', 500)
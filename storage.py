@@ -0,0 +1,108 @@
+import os
+import re
+import logging
+from typing import Dict, Optional
+from flask import Response, current_app, send_file
+import config
+from processors.ffmpeg_writer import rendition_path
+
+logger = logging.getLogger(__name__)
+
+# Montage ids are generated UUIDs; anything else never maps to a file
+MONTAGE_ID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+class MontageStorage:
+    """Finished montages, stored once per id with their renditions alongside.
+
+    Every montage lives at one canonical path below the storage root, so the
+    render jobs, share routes and a fronting web server all agree on where it is.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or config.MONTAGE_FOLDER)
+
+    def path(self, montage_id: str, quality: Optional[str] = None) -> str:
+        """Canonical path of a montage, or of one of its renditions."""
+        if not MONTAGE_ID_PATTERN.match(montage_id):
+            raise ValueError(f"Invalid montage id: {montage_id}")
+        return rendition_path(os.path.join(self.root, f'montage_{montage_id}.mp4'), quality)
+
+    def exists(self, montage_id: str, quality: Optional[str] = None) -> bool:
+        """Whether a montage, or the given rendition, has been rendered."""
+        try:
+            return os.path.isfile(self.path(montage_id, quality))
+        except ValueError:
+            return False
+
+    def renditions(self, montage_id: str) -> Dict[str, str]:
+        """Paths of the renditions already rendered for a montage."""
+        return {
+            quality: self.path(montage_id, quality)
+            for quality in config.EXPORT_PRESETS
+            if self.exists(montage_id, quality)
+        }
+
+    def remove(self, montage_id: str) -> None:
+        """Delete a montage and all of its renditions."""
+        for path in [self.path(montage_id)] + list(self.renditions(montage_id).values()):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        logger.debug(f"Removed montage {montage_id}")
+
+    def staging_path(self, montage_id: str) -> str:
+        """Where a montage is rendered before it is published.
+
+        Outputs are only moved to their canonical paths once complete, so a
+        half-written file is never served. Staging shares the storage
+        filesystem, which keeps publishing an atomic rename.
+        """
+        staging_dir = os.path.join(self.root, 'staging')
+        os.makedirs(staging_dir, exist_ok=True)
+        return os.path.join(staging_dir, os.path.basename(self.path(montage_id)))
+
+    def publish(self, staged_paths: Dict[str, str]) -> Dict[str, str]:
+        """Move staged outputs, keyed by quality, to their canonical paths."""
+        published = {}
+        for quality, staged_path in staged_paths.items():
+            path = os.path.join(self.root, os.path.basename(staged_path))
+            os.replace(staged_path, path)
+            published[quality] = path
+        logger.debug(f"Published {sorted(published)} to {self.root}")
+        return published
+
+    def relative_path(self, path: str) -> str:
+        """Path of a stored file relative to the storage root, as seen by a proxy."""
+        return os.path.relpath(path, self.root)
+
+
+def send_montage(path: str, download_name: Optional[str] = None) -> Response:
+    """Serve a stored montage with byte ranges and cache validators.
+
+    With MONTAGE_ACCEL_REDIRECT set, only headers are sent for files in the
+    storage root and nginx streams them from its internal location. With
+    USE_X_SENDFILE, Werkzeug hands the file to the web server through
+    X-Sendfile. Otherwise the file is served from Python, still answering
+    Range and conditional requests.
+    """
+    storage = MontageStorage()
+    path = os.path.abspath(path)
+    accel_prefix = config.MONTAGE_ACCEL_REDIRECT
+    if accel_prefix and path.startswith(storage.root + os.sep):
+        response = current_app.response_class(mimetype='video/mp4')
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{storage.relative_path(path)}"
+        if download_name:
+            response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        return response
+
+    return send_file(
+        path,
+        mimetype='video/mp4',
+        as_attachment=download_name is not None,
+        download_name=download_name,
+        conditional=True,
+        etag=True,
+        max_age=config.MONTAGE_MAX_AGE
+    )
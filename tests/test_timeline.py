@@ -0,0 +1,92 @@
+"""Checks of the montage timeline plan that need no media."""
+import numpy as np
+from processors.timeline import TimelinePlanner
+
+FPS = 30.0
+BODY_DURATION = 20.0
+
+
+def _planner() -> TimelinePlanner:
+    return TimelinePlanner(transition_duration=0.5, min_shot_duration=1.0)
+
+
+def _beats(interval: float = 0.5, until: float = 120.0) -> np.ndarray:
+    return np.arange(0.0, until, interval)
+
+
+def test_plan_cuts_lands_every_cut_on_a_beat():
+    counts = [60, 900, 900, 900, 90]
+    beats = _beats()
+    in_points, lengths = _planner().plan_cuts(beats, counts, FPS, BODY_DURATION)
+
+    beat_frames = set(np.round(beats * FPS).astype(int))
+    cuts = counts[0] + np.cumsum(lengths[1:-1])
+    assert all(int(cut) in beat_frames for cut in cuts)
+    # The body fills its duration to within half a beat
+    assert abs(int(lengths[1:-1].sum()) - BODY_DURATION * FPS) <= 0.5 * 0.5 * FPS
+
+
+def test_plan_cuts_keeps_intro_and_outro_whole():
+    counts = [60, 900, 900, 900, 90]
+    in_points, lengths = _planner().plan_cuts(_beats(), counts, FPS, BODY_DURATION)
+
+    assert (lengths[0], lengths[-1]) == (60, 90)
+    assert (in_points[0], in_points[-1]) == (0, 0)
+    assert all(0 <= i and i + n <= c for i, n, c in zip(in_points, lengths, counts))
+
+
+def test_fair_shares_gives_short_clips_all_they_have():
+    available = np.array([30, 600, 600])
+    shares = TimelinePlanner._fair_shares(available, 900)
+
+    assert shares[0] == 30
+    # The rest is split evenly between the clips that can take it
+    assert np.allclose(shares[1:], (900 - 30) / 2)
+    assert np.all(shares <= available)
+
+
+def test_fair_shares_never_exceeds_what_is_available():
+    available = np.array([30, 40, 50])
+    shares = TimelinePlanner._fair_shares(available, 900)
+
+    assert np.allclose(shares, available)
+
+
+def _plan(counts, source_frames):
+    in_points = [0] * len(counts)
+    return _planner().plan(counts, FPS, ['warm'] * len(counts), in_points, source_frames)
+
+
+def test_tail_of_each_clip_matches_the_transition_into_the_next():
+    counts = [60, 90, 90, 90, 60]
+    schedule = _plan(counts, [c + 100 for c in counts])
+
+    for clip in range(1, schedule.num_clips - 1):
+        start, end = schedule.clip_range(clip)
+        head = int(schedule.transition[start:end].sum())
+        assert head == 15
+        assert schedule.clip_tail_frames(clip - 1) == head
+
+
+def test_tail_never_reads_past_the_source():
+    counts = [60, 90, 90, 90, 60]
+    # Spare source frames: none for the intro, 5 for the first body clip, none for the second
+    source_frames = [60, 95, 90, 200, 60]
+    schedule = _plan(counts, source_frames)
+
+    for clip in range(schedule.num_clips):
+        end = schedule.clip_in_point(clip) + schedule.clip_frames(clip) + schedule.clip_tail_frames(clip)
+        assert end <= source_frames[clip]
+    assert [schedule.clip_tail_frames(c) for c in range(4)] == [0, 5, 0, 0]
+
+
+def test_intro_and_outro_never_transition():
+    counts = [60, 90, 90, 90, 60]
+    schedule = _plan(counts, [c + 100 for c in counts])
+
+    for clip in (0, schedule.num_clips - 1):
+        start, end = schedule.clip_range(clip)
+        assert not schedule.transition[start:end].any()
+        assert not schedule.transitions_in(clip)
+    # The outro cuts in hard, so nothing past the last body clip is decoded
+    assert schedule.clip_tail_frames(schedule.num_clips - 2) == 0
@@ -0,0 +1,355 @@
+import os
+import json
+import fcntl
+import logging
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from flask import Request
+from werkzeug.utils import secure_filename
+from utils import allowed_file
+from workspace import Workspace
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 16  # Leading bytes needed to recognize a container
+PROBE_TIMEOUT = 30.0  # Seconds allowed for probing a completed upload
+
+# Containers accepted for each allowed extension, and the stream they must carry
+VIDEO_CONTAINERS = {'isobmff', 'avi'}
+UPLOAD_RULES = {
+    'mp4': (VIDEO_CONTAINERS, 'video'),
+    'mov': (VIDEO_CONTAINERS, 'video'),
+    'avi': (VIDEO_CONTAINERS, 'video'),
+    'mp3': ({'mp3'}, 'audio')
+}
+
+# Top-level box types an MP4/MOV file may start with
+ISOBMFF_BOXES = {b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'}
+
+
+class InvalidUploadError(RuntimeError):
+    """Raised when an uploaded file is not a readable media file of its type.
+
+    Not a ValueError, so Werkzeug's form parser lets it abort the request
+    instead of silently dropping the form.
+    """
+
+
+def sniff_container(header: bytes) -> Optional[str]:
+    """Identify the container format from a file's leading bytes."""
+    if len(header) >= 8 and header[4:8] in ISOBMFF_BOXES:
+        return 'isobmff'
+    if len(header) >= 12 and header[:4] == b'RIFF' and header[8:12] == b'AVI ':
+        return 'avi'
+    if header[:3] == b'ID3' or (len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return None
+
+
+def probe_media(path: str) -> Dict[str, bool]:
+    """Report which stream types FFmpeg finds in a file."""
+    result = subprocess.run(
+        ['ffmpeg', '-hide_banner', '-nostdin', '-i', path],
+        capture_output=True,
+        text=True,
+        errors='replace',
+        timeout=PROBE_TIMEOUT
+    )
+    # Without an output FFmpeg exits non-zero, but still prints the input streams
+    streams = [line for line in result.stderr.splitlines() if line.lstrip().startswith('Stream #')]
+    return {
+        'video': any(': Video:' in line for line in streams),
+        'audio': any(': Audio:' in line for line in streams)
+    }
+
+
+class UploadStream:
+    """File part written straight to disk and validated while it arrives.
+
+    The container is checked as soon as the first bytes are in, so a wrong
+    file type aborts the request before the rest of the body is read. Once
+    the part is complete, FFmpeg confirms it holds the expected stream.
+    """
+
+    def __init__(self, directory: str, filename: str):
+        self.filename = filename
+        extension = filename.rsplit('.', 1)[1].lower()
+        self.containers, self.stream_type = UPLOAD_RULES[extension]
+        fd, self.name = tempfile.mkstemp(dir=directory, suffix='.part')
+        self.file = os.fdopen(fd, 'wb+')
+        self.size = 0
+        self.container: Optional[str] = None
+        self.completed = False
+        self._header = b''
+
+    def write(self, data: bytes) -> int:
+        if self.container is None and len(self._header) < SNIFF_BYTES:
+            self._header += bytes(data[:SNIFF_BYTES - len(self._header)])
+            if len(self._header) >= SNIFF_BYTES:
+                self._sniff()
+        self.size += len(data)
+        return self.file.write(data)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        # Werkzeug rewinds each file part once it has been fully received
+        if offset == 0 and whence == os.SEEK_SET and not self.completed:
+            self._complete()
+        return self.file.seek(offset, whence)
+
+    def _sniff(self) -> None:
+        self.container = sniff_container(self._header)
+        if self.container not in self.containers:
+            self._reject(f"{self.filename} is not a valid {self.stream_type} file")
+        logger.debug(f"Receiving {self.filename} as {self.container}")
+
+    def _complete(self) -> None:
+        self.completed = True
+        if self.container is None:
+            self._sniff()
+        self.file.flush()
+        streams = probe_media(self.name)
+        if not streams[self.stream_type]:
+            self._reject(f"{self.filename} has no readable {self.stream_type} stream")
+        logger.debug(f"Received {self.filename}: {self.size} bytes")
+
+    def _reject(self, message: str) -> None:
+        self.close()
+        logger.warning(f"Rejected upload: {message}")
+        raise InvalidUploadError(message)
+
+    def move_to(self, path: str) -> None:
+        """Move the received file into place without copying it."""
+        self.file.close()
+        os.replace(self.name, path)
+        self.name = path
+
+    def close(self) -> None:
+        self.file.close()
+        if os.path.exists(self.name) and self.name.endswith('.part'):
+            os.remove(self.name)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class StreamingUploadRequest(Request):
+    """Request that streams file parts into upload_directory when it is set.
+
+    Views set upload_directory before touching request.files. Without it,
+    Werkzeug's default temporary files are used.
+    """
+
+    upload_directory: Optional[str] = None
+
+    def _get_file_stream(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None
+    ):
+        if self.upload_directory is None or not filename:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        if not allowed_file(filename):
+            logger.warning(f"Rejected upload: {filename} has an unsupported extension")
+            raise InvalidUploadError(f"{filename} has an unsupported file type")
+        return UploadStream(self.upload_directory, filename)
+
+
+def merge_ranges(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Add the half-open byte range [start, end) to a sorted list of disjoint ranges."""
+    merged = []
+    for low, high in sorted(ranges + [[start, end]]):
+        if merged and low <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return merged
+
+
+class UploadSession:
+    """Resumable upload of a montage's clips and music into its workspace.
+
+    Each file is preallocated at its final path inside the workspace, and
+    chunks are written in place at their offsets, so nothing is assembled or
+    copied once the last chunk arrives. The manifest of received byte ranges
+    is kept in the workspace as JSON, guarded by a file lock so any app
+    worker can accept any chunk.
+    """
+
+    MANIFEST = 'upload.json'
+
+    def __init__(self, workspace: Workspace, manifest: Dict):
+        self.workspace = workspace
+        self.manifest = manifest
+
+    @classmethod
+    def create(
+        cls,
+        workspace: Workspace,
+        files: List[Dict],
+        art_pack: str,
+        export_quality: str,
+        renditions: Optional[List[str]] = None
+    ) -> 'UploadSession':
+        """Start a session for files, each a dict with name, size and kind ('clip' or 'music')."""
+        entries = []
+        clip_index = 0
+        for file in files:
+            if file['kind'] == 'clip':
+                path = os.path.join(
+                    workspace.clips_dir, secure_filename(f"{clip_index:02d}_{file['name']}")
+                )
+                clip_index += 1
+            else:
+                path = os.path.join(workspace.assets_dir, 'background.mp3')
+            with open(path, 'wb') as f:
+                f.truncate(file['size'])
+            entries.append({
+                'name': file['name'],
+                'kind': file['kind'],
+                'size': file['size'],
+                'path': path,
+                'received': []
+            })
+
+        session = cls(workspace, {
+            'art_pack': art_pack,
+            'export_quality': export_quality,
+            'renditions': renditions or [],
+            'files': entries
+        })
+        with session._locked():
+            session._save()
+        return session
+
+    @classmethod
+    def load(cls, workspace: Workspace) -> Optional['UploadSession']:
+        """Load the session stored in a workspace, or None."""
+        try:
+            with open(os.path.join(workspace.path, cls.MANIFEST)) as f:
+                return cls(workspace, json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(os.path.join(self.workspace.path, 'upload.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _reload(self) -> None:
+        with open(os.path.join(self.workspace.path, self.MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+    def _save(self) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.workspace.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, os.path.join(self.workspace.path, self.MANIFEST))
+
+    def write_chunk(self, index: int, offset: int, stream, length: int, buffer_size: int = 64 * 1024) -> None:
+        """Write length bytes read from stream into file index at offset."""
+        entry = self.manifest['files'][index]
+        if offset < 0 or offset + length > entry['size']:
+            raise ValueError(f"Chunk {offset}-{offset + length} is outside {entry['name']}")
+
+        written = 0
+        fd = os.open(entry['path'], os.O_WRONLY)
+        try:
+            while written < length:
+                data = stream.read(min(buffer_size, length - written))
+                if not data:
+                    break
+                if offset == 0 and written == 0:
+                    self._check_header(entry, data)
+                os.pwrite(fd, data, offset + written)
+                written += len(data)
+        finally:
+            os.close(fd)
+
+        # Only the bytes actually received count, so a dropped chunk can resume
+        if written:
+            with self._locked():
+                self._reload()
+                entry = self.manifest['files'][index]
+                entry['received'] = merge_ranges(entry['received'], offset, offset + written)
+                self._save()
+
+    @staticmethod
+    def _check_header(entry: Dict, data: bytes) -> None:
+        containers, stream_type = UPLOAD_RULES[entry['name'].rsplit('.', 1)[1].lower()]
+        if len(data) >= SNIFF_BYTES and sniff_container(data[:SNIFF_BYTES]) not in containers:
+            raise InvalidUploadError(f"{entry['name']} is not a valid {stream_type} file")
+
+    def missing(self, index: int) -> List[List[int]]:
+        """Byte ranges of file index that have not been received."""
+        entry = self.manifest['files'][index]
+        gaps = []
+        position = 0
+        for low, high in entry['received']:
+            if low > position:
+                gaps.append([position, low])
+            position = max(position, high)
+        if position < entry['size']:
+            gaps.append([position, entry['size']])
+        return gaps
+
+    def complete(self) -> bool:
+        """Whether every file has been fully received."""
+        return all(not self.missing(i) for i in range(len(self.manifest['files'])))
+
+    def finalize(self) -> Dict[str, List[str]]:
+        """Probe the assembled files and return their paths by kind."""
+        if not self.complete():
+            raise InvalidUploadError("Upload is incomplete")
+
+        paths = {'clip': [], 'music': []}
+        for entry in self.manifest['files']:
+            _, stream_type = UPLOAD_RULES[entry['name'].rsplit('.', 1)[1].lower()]
+            if not probe_media(entry['path'])[stream_type]:
+                raise InvalidUploadError(f"{entry['name']} has no readable {stream_type} stream")
+            paths[entry['kind']].append(entry['path'])
+        return paths
+
+    def claim(self, job_id: str) -> Optional[str]:
+        """Record job_id as the job queued from this upload.
+
+        Returns None once recorded, or the id of the job an earlier finalize
+        already queued, so a repeated finalize never queues a second render.
+        """
+        with self._locked():
+            self._reload()
+            if self.manifest.get('finalized'):
+                return self.manifest['job_id']
+            self.manifest['finalized'] = True
+            self.manifest['job_id'] = job_id
+            self._save()
+        return None
+
+    def release(self) -> None:
+        """Undo claim after its job could not be queued, so finalize can be retried."""
+        with self._locked():
+            self._reload()
+            self.manifest['finalized'] = False
+            self.manifest['job_id'] = None
+            self._save()
+
+    def status(self) -> List[Dict]:
+        """Size, received and missing ranges of every file."""
+        return [
+            {
+                'index': i,
+                'name': entry['name'],
+                'kind': entry['kind'],
+                'size': entry['size'],
+                'received': entry['received'],
+                'missing': self.missing(i)
+            }
+            for i, entry in enumerate(self.manifest['files'])
+        ]
@@ -4,7 +4,6 @@ from typing import List
 from werkzeug.utils import secure_filename
 from config import ALLOWED_EXTENSIONS
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 def allowed_file(filename: str) -> bool:
@@ -32,7 +31,12 @@ def save_uploaded_file(file, directory: str, filename: str = None) -> str:
     file_path = os.path.join(directory, secure_name)
     
     try:
-        file.save(file_path)
+        move_to = getattr(file.stream, 'move_to', None)
+        if move_to is not None:
+            # Already streamed to disk by the upload request, just move it
+            move_to(file_path)
+        else:
+            file.save(file_path)
         logger.debug(f"Saved file: {file_path}")
         return file_path
     except Exception as e:
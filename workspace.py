@@ -0,0 +1,150 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from typing import Collection, List, Optional
+import config
+from storage import MONTAGE_ID_PATTERN
+
+logger = logging.getLogger(__name__)
+
+_gc_lock = threading.Lock()
+_last_gc = 0.0
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised when the workspace root has no room for another upload."""
+
+
+class Workspace:
+    """Scratch directory holding the inputs of a single montage render."""
+
+    def __init__(self, montage_id: str, root: Optional[str] = None):
+        # Ids arrive in URLs and job payloads; only generated UUIDs name a workspace
+        if not MONTAGE_ID_PATTERN.match(montage_id):
+            raise ValueError(f"Invalid montage id: {montage_id}")
+        self.montage_id = montage_id
+        self.root = root or config.WORKSPACE_FOLDER
+        self.path = os.path.join(self.root, montage_id)
+        self.clips_dir = os.path.join(self.path, 'clips')
+        self.assets_dir = os.path.join(self.path, 'assets')
+        self.incoming_dir = os.path.join(self.path, 'incoming')
+
+    def create(self) -> 'Workspace':
+        """Create the workspace directories."""
+        for directory in [self.clips_dir, self.assets_dir, self.incoming_dir]:
+            os.makedirs(directory, exist_ok=True)
+        logger.debug(f"Created workspace: {self.path}")
+        return self
+
+    def clip_files(self) -> List[str]:
+        """Uploaded clips in upload order."""
+        return [os.path.join(self.clips_dir, name) for name in sorted(os.listdir(self.clips_dir))]
+
+    def music_file(self) -> str:
+        """Uploaded background music."""
+        return os.path.join(self.assets_dir, 'background.mp3')
+
+    def preview_dir(self, preview_id: str) -> str:
+        """Directory holding the HLS output of one preview render."""
+        return os.path.join(self.path, 'previews', preview_id)
+
+    def exists(self) -> bool:
+        """Check whether the workspace is still on disk."""
+        return os.path.isdir(self.path)
+
+    def touch(self) -> None:
+        """Mark the workspace as in use, restarting its garbage collection TTL."""
+        os.utime(self.path)
+
+    def usage(self) -> int:
+        """Total bytes stored in this workspace."""
+        return directory_size(self.path)
+
+    def cleanup(self) -> None:
+        """Remove the workspace and everything in it."""
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(self.path)
+        if os.path.dirname(path) != root:
+            logger.error(f"Refusing to remove {path}, which is not a workspace below {root}")
+            return
+        shutil.rmtree(path, ignore_errors=True)
+        logger.debug(f"Removed workspace: {self.path}")
+
+
+def directory_size(directory: str) -> int:
+    """Sum the size of all files below a directory."""
+    total = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def total_usage(root: Optional[str] = None) -> int:
+    """Total bytes used by all workspaces."""
+    return directory_size(root or config.WORKSPACE_FOLDER)
+
+
+def check_quota(incoming_bytes: int = 0, root: Optional[str] = None) -> None:
+    """Raise if storing incoming_bytes would exceed the workspace quota."""
+    quota = config.WORKSPACE_QUOTA_BYTES
+    if not quota:
+        return
+    used = total_usage(root)
+    if used + incoming_bytes > quota:
+        raise QuotaExceededError(
+            f"Workspace quota exceeded: {used + incoming_bytes} of {quota} bytes"
+        )
+
+
+def collect_garbage(
+    ttl: Optional[float] = None,
+    root: Optional[str] = None,
+    keep: Collection[str] = ()
+) -> int:
+    """Remove workspaces that have not been touched within ttl seconds.
+
+    Workspaces named in keep, those of queued or running jobs, are never
+    removed however old they are.
+    """
+    root = root or config.WORKSPACE_FOLDER
+    ttl = config.WORKSPACE_TTL if ttl is None else ttl
+    cutoff = time.time() - ttl
+    removed = 0
+
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+
+    for entry in entries:
+        try:
+            if entry.name in keep:
+                continue
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except OSError as e:
+            logger.warning(f"Error collecting workspace {entry.path}: {str(e)}")
+
+    if removed:
+        logger.info(f"Collected {removed} expired workspaces")
+    return removed
+
+
+def maybe_collect_garbage(keep: Collection[str] = (), interval: float = 300.0) -> None:
+    """Run collect_garbage, sparing the workspaces in keep, at most once per interval seconds."""
+    global _last_gc
+    now = time.time()
+    if now - _last_gc < interval or not _gc_lock.acquire(blocking=False):
+        return
+    try:
+        _last_gc = now
+        collect_garbage(keep=keep)
+    finally:
+        _gc_lock.release()